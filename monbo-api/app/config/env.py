@@ -29,3 +29,98 @@ if raw_overlap_threshold_percentage is not None:
         raise
 else:
     OVERLAP_THRESHOLD_PERCENTAGE = 0
+
+
+def get_int_env(name: str, default: int, minimum: int = 0) -> int:
+    """
+    Read an integer environment variable, falling back to a default value.
+
+    Args:
+        name: Name of the environment variable
+        default: Value returned when the variable is not set
+        minimum: Smallest accepted value
+
+    Returns:
+        int: The parsed value
+
+    Raises:
+        ValueError: If the value is not a valid integer or is below the minimum
+    """
+    raw_value = os.getenv(name)
+    if raw_value is None or raw_value == "":
+        return default
+    try:
+        value = int(raw_value)
+    except ValueError:
+        raise ValueError(f"{name} must be a valid integer, got '{raw_value}'")
+    if value < minimum:
+        raise ValueError(f"{name} must be greater than or equal to {minimum}")
+    return value
+
+
+def get_int_list_env(name: str) -> list[int]:
+    """
+    Read a comma separated list of integers from an environment variable.
+
+    Raises:
+        ValueError: If an item is not a valid integer
+    """
+    raw_value = os.getenv(name) or ""
+    try:
+        return [int(item) for item in raw_value.split(",") if item.strip()]
+    except ValueError:
+        raise ValueError(
+            f"{name} must be a comma separated list of integers, got '{raw_value}'"
+        )
+
+
+# Number of worker processes used by the deforestation analysis engine and the
+# polygon overlap validation. A value of 1 runs them inline in the request
+# thread.
+ANALYSIS_MAX_WORKERS = get_int_env(
+    "ANALYSIS_MAX_WORKERS", min(4, os.cpu_count() or 1), minimum=1
+)
+
+# Number of farms sent to a worker process in a single task
+ANALYSIS_CHUNK_SIZE = get_int_env("ANALYSIS_CHUNK_SIZE", 500, minimum=1)
+
+# Seconds an unused raster handle is kept open by the raster registry
+RASTER_REGISTRY_IDLE_SECONDS = get_int_env("RASTER_REGISTRY_IDLE_SECONDS", 300)
+
+# SQLite database of the deforestation result cache. An empty value keeps the
+# cache in memory only
+RESULT_CACHE_PATH = os.getenv(
+    "RESULT_CACHE_PATH", ".cache/deforestation_results.sqlite3"
+)
+
+# Number of deforestation results kept in the in-memory tier of the cache
+RESULT_CACHE_MEMORY_SIZE = get_int_env("RESULT_CACHE_MEMORY_SIZE", 100_000)
+
+# Maximum number of analysis jobs waiting to be executed
+ANALYSIS_JOB_QUEUE_SIZE = get_int_env("ANALYSIS_JOB_QUEUE_SIZE", 16, minimum=1)
+
+# Seconds the results of a finished analysis job are kept available
+ANALYSIS_JOB_TTL_SECONDS = get_int_env("ANALYSIS_JOB_TTL_SECONDS", 3600)
+
+# Ids of the maps whose deforestation mask is kept in memory, run-length
+# encoded, by every analysis worker process
+RUN_LENGTH_MAP_IDS = get_int_list_env("RUN_LENGTH_MAP_IDS")
+
+# Number of CRS and coordinate transformers kept by every process
+PROJECTION_CACHE_SIZE = get_int_env("PROJECTION_CACHE_SIZE", 256)
+
+# Number of candidate pairs of overlapping farms sent to a worker process in a
+# single polygon validation task
+VALIDATION_CHUNK_SIZE = get_int_env("VALIDATION_CHUNK_SIZE", 20_000, minimum=1)
+
+# SQLite database of the farm registry used by the polygon validation. An empty
+# value disables the registry
+FARM_REGISTRY_PATH = os.getenv("FARM_REGISTRY_PATH", "")
+
+# SQLite database of the rendered tile cache. An empty value keeps the cache in
+# memory only
+TILE_CACHE_PATH = os.getenv("TILE_CACHE_PATH", ".cache/tiles.sqlite3")
+
+# Maximum total size in bytes of the rendered tiles kept in the in-memory tier
+# of the tile cache
+TILE_CACHE_MEMORY_BYTES = get_int_env("TILE_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
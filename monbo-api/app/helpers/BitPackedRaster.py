@@ -0,0 +1,333 @@
+import json
+import os
+import struct
+import threading
+import numpy as np
+from affine import Affine
+from rasterio import windows
+from rasterio.crs import CRS
+from rasterio.io import DatasetReader
+from rasterio.windows import Window
+from app.config.logger import get_logger
+from app.utils.maps import get_raster_fingerprint
+from app.utils.overviews import get_overview_factors
+from app.utils.projections import get_transformer
+
+# Get logger for this module
+logger = get_logger("helpers.BitPackedRaster")
+
+MAGIC = b"MONBOBIT"
+VERSION = 2
+# Pixel rows start at a page boundary, so the file maps cleanly in memory
+DATA_ALIGNMENT = 4096
+# Number of pixel rows of a level reduced at once when writing the overviews
+OVERVIEW_CHUNK_ROWS = 2048
+
+# Rasters opened by the current process, by raster path
+_rasters: dict[str, tuple[tuple, "BitPackedRaster | None"]] = {}
+_rasters_lock = threading.Lock()
+
+
+class BitPackedRaster:
+    """
+    Deforestation mask (value 1) of a raster stored with 1 bit per pixel.
+
+    The file holds a small JSON header (size, geotransform, CRS, block shape
+    and fingerprint of the source GeoTIFF) followed by the pixel rows, each
+    packed into `ceil(width / 8)` bytes, most significant bit first. It is
+    opened with `numpy.memmap`, so every process reading it shares the same
+    pages of the OS page cache and nothing is decompressed.
+
+    The full resolution rows are followed by overviews halving the resolution
+    at every level, down to a single tile. Every overview pixel is set when any
+    pixel of the full resolution mask it covers is (ANY resampling), so the
+    deforestation stays visible in the tiles of low zoom levels, which sample
+    the overview matching their resolution.
+
+    The reader exposes the parts of the `DatasetReader` interface used by the
+    analysis (`read`, `window_transform`, `block_shapes`...), and returns
+    `read` values of 1 for deforested pixels and 0 otherwise.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            magic, version, header_size = struct.unpack("<8sHI", f.read(14))
+            if magic != MAGIC or version not in (1, VERSION):
+                raise ValueError(f"'{path}' is not a bit-packed raster")
+            header = json.loads(f.read(header_size))
+
+        self.path = path
+        self.width = header["width"]
+        self.height = header["height"]
+        self.transform = Affine(*header["transform"])
+        self.crs = CRS.from_wkt(header["crs"])
+        self.block_shapes = [tuple(header["block_shape"])]
+        self.fingerprint = header["fingerprint"]
+        self.bits = np.memmap(
+            path,
+            dtype=np.uint8,
+            mode="r",
+            offset=header["data_offset"],
+            shape=(self.height, (self.width + 7) // 8),
+        )
+        # (bits, width, height) of every overview level, from the finest
+        self.overviews = [
+            (
+                np.memmap(
+                    path,
+                    dtype=np.uint8,
+                    mode="r",
+                    offset=header["data_offset"] + level["offset"],
+                    shape=(level["height"], (level["width"] + 7) // 8),
+                ),
+                level["width"],
+                level["height"],
+            )
+            for level in header.get("overviews", [])
+        ]
+
+    @staticmethod
+    def write(src: DatasetReader, path: str, fingerprint: str, band: int = 1):
+        """
+        Write the bit-packed mask of a raster, reading it one block row at a
+        time, and its overviews. The file is written next to its final path and
+        moved in place once complete.
+        """
+        # Overview levels, at offsets relative to the full resolution rows
+        overviews = []
+        offset = src.height * ((src.width + 7) // 8)
+        width, height = src.width, src.height
+        for _ in get_overview_factors(src.width, src.height):
+            width, height = -(-width // 2), -(-height // 2)
+            offset = -(-offset // DATA_ALIGNMENT) * DATA_ALIGNMENT
+            overviews.append({"width": width, "height": height, "offset": offset})
+            offset += height * ((width + 7) // 8)
+
+        header = {
+            "width": src.width,
+            "height": src.height,
+            "transform": list(src.transform)[:6],
+            "crs": src.crs.to_wkt(),
+            "block_shape": list(src.block_shapes[band - 1]),
+            "fingerprint": fingerprint,
+            "overviews": overviews,
+        }
+        # The data offset is part of the header: leave room for its entry
+        header_size = 14 + len(json.dumps(header)) + 64
+        data_offset = -(-header_size // DATA_ALIGNMENT) * DATA_ALIGNMENT
+        header = json.dumps({**header, "data_offset": data_offset}).encode()
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(struct.pack("<8sHI", MAGIC, VERSION, len(header)))
+            f.write(header)
+            f.write(b"\0" * (data_offset - f.tell()))
+            block_height = src.block_shapes[band - 1][0]
+            for row_off in range(0, src.height, block_height):
+                height = min(block_height, src.height - row_off)
+                data = src.read(band, window=Window(0, row_off, src.width, height))
+                f.write(np.packbits(np.equal(data, 1), axis=1).tobytes())
+
+            # Every overview level is reduced from the previous one
+            previous = (data_offset, src.width, src.height)
+            for level in overviews:
+                f.write(b"\0" * (data_offset + level["offset"] - f.tell()))
+                f.flush()
+                offset, width, height = previous
+                bits = np.memmap(
+                    temporary_path,
+                    dtype=np.uint8,
+                    mode="r",
+                    offset=offset,
+                    shape=(height, (width + 7) // 8),
+                )
+                for row_off in range(0, height, OVERVIEW_CHUNK_ROWS):
+                    packed = bits[row_off : row_off + OVERVIEW_CHUNK_ROWS]
+                    f.write(_reduce_any(packed, width).tobytes())
+                del bits
+                previous = (
+                    data_offset + level["offset"],
+                    level["width"],
+                    level["height"],
+                )
+        os.replace(temporary_path, path)
+
+    def read_mask(self, window: Window) -> np.ndarray:
+        """Unpack the boolean mask of a window (within the raster extent)."""
+        (row_start, row_stop), (col_start, col_stop) = window.toranges()
+        row_start, col_start = int(row_start), int(col_start)
+        row_stop, col_stop = int(row_stop), int(col_stop)
+        packed = self.bits[row_start:row_stop, col_start // 8 : -(-col_stop // 8)]
+        bit_offset = col_start % 8
+        unpacked = np.unpackbits(
+            packed, axis=1, count=bit_offset + col_stop - col_start
+        )
+        return unpacked[:, bit_offset:].view(bool)
+
+    def read(self, band: int = 1, window: Window | None = None) -> np.ndarray:
+        """Read a window as uint8 values: 1 where deforested, 0 elsewhere."""
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+        return self.read_mask(window).view(np.uint8)
+
+    def window_transform(self, window: Window) -> Affine:
+        return windows.transform(window, self.transform)
+
+    def sample(
+        self, rows: np.ndarray, cols: np.ndarray, level: int | None = None
+    ) -> np.ndarray:
+        """
+        Deforestation of the pixels at (rows, cols); False outside the raster.
+
+        Args:
+            rows, cols: Pixel coordinates, in the grid of the sampled level
+            level: Index of the overview level to sample, or None for the full
+                resolution mask
+        """
+        if level is None:
+            bits, width, height = self.bits, self.width, self.height
+        else:
+            bits, width, height = self.overviews[level]
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        rows, cols = rows[inside], cols[inside]
+        values = np.zeros(inside.shape, dtype=bool)
+        values[inside] = (bits[rows, cols >> 3] >> (7 - (cols & 7))) & 1
+        return values
+
+    def get_overview_level(self, cols: np.ndarray, rows: np.ndarray) -> int | None:
+        """
+        Choose the overview level to sample a grid from: the coarsest level
+        whose pixels are not larger than the pixels of the grid.
+
+        Args:
+            cols, rows: Fractional full resolution pixel coordinates of the
+                centers of the grid pixels, as arrays of shape (height, width)
+
+        Returns:
+            int | None: Index of the overview level, or None for the full
+            resolution mask
+        """
+        height, width = cols.shape
+        if not self.overviews or width < 2 or height < 2:
+            return None
+        # Full resolution pixels per grid pixel, at the center of the grid
+        row, col = height // 2, width // 2
+        scale = min(
+            np.hypot(
+                cols[row, col + 1] - cols[row, col], rows[row, col + 1] - rows[row, col]
+            ),
+            np.hypot(
+                cols[row + 1, col] - cols[row, col], rows[row + 1, col] - rows[row, col]
+            ),
+        )
+        if not np.isfinite(scale) or scale < 2:
+            return None
+        # The pixels of level i cover 2 ** (i + 1) full resolution pixels
+        return min(int(np.log2(scale)) - 1, len(self.overviews) - 1)
+
+    def sample_grid(
+        self,
+        bounds: tuple[float, float, float, float],
+        crs: str,
+        size: tuple[int, int],
+    ) -> np.ndarray:
+        """
+        Nearest-neighbour sample the mask over a regular grid, from the overview
+        level matching the resolution of the grid.
+
+        Args:
+            bounds: (left, bottom, right, top) of the grid in `crs`
+            crs: Coordinate reference system of the grid
+            size: (width, height) of the grid in pixels
+
+        Returns:
+            np.ndarray: Boolean array of shape (height, width)
+        """
+        left, bottom, right, top = bounds
+        width, height = size
+        xs = left + (np.arange(width) + 0.5) * (right - left) / width
+        ys = top - (np.arange(height) + 0.5) * (top - bottom) / height
+        xs, ys = np.meshgrid(xs, ys)
+
+        xs, ys = get_transformer(crs, self.crs).transform(xs, ys)
+
+        inverse = ~self.transform
+        cols = xs * inverse.a + ys * inverse.b + inverse.c
+        rows = xs * inverse.d + ys * inverse.e + inverse.f
+        level = self.get_overview_level(cols, rows)
+        if level is not None:
+            cols, rows = cols / 2 ** (level + 1), rows / 2 ** (level + 1)
+        cols, rows = np.floor(cols), np.floor(rows)
+        valid = np.isfinite(cols) & np.isfinite(rows)
+        cols = np.where(valid, cols, -1).astype(np.int64)
+        rows = np.where(valid, rows, -1).astype(np.int64)
+        return self.sample(rows, cols, level)
+
+
+def _reduce_any(packed: np.ndarray, width: int) -> np.ndarray:
+    """
+    Halve the resolution of bit-packed mask rows: every output pixel is set when
+    any pixel of its 2x2 block is.
+    """
+    mask = np.unpackbits(packed, axis=1, count=width).view(bool)
+    mask = np.pad(mask, ((0, mask.shape[0] % 2), (0, width % 2)))
+    mask = mask[0::2] | mask[1::2]
+    return np.packbits(mask[:, 0::2] | mask[:, 1::2], axis=1)
+
+
+def get_bitpacked_raster_path(raster_path: str) -> str:
+    return f"{raster_path}.bits"
+
+
+def get_bitpacked_stamp(raster_path: str) -> int | None:
+    """
+    Modification time of the bit-packed mask of a raster, or None if it was not
+    written. Changes whenever the mask is written again.
+    """
+    try:
+        return os.stat(get_bitpacked_raster_path(raster_path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_bitpacked_raster(src: DatasetReader, raster_path: str) -> str:
+    """
+    Write the bit-packed mask of a raster next to the raster file.
+
+    Returns:
+        str: Path of the bit-packed file
+    """
+    path = get_bitpacked_raster_path(raster_path)
+    BitPackedRaster.write(src, path, get_raster_fingerprint(raster_path))
+    return path
+
+
+def get_bitpacked_raster(raster_path: str) -> BitPackedRaster | None:
+    """
+    Return the bit-packed mask of a raster, mapping it on first use.
+
+    Returns:
+        BitPackedRaster | None: The mask, or None if it was not written or is
+        outdated (the raster file changed after it was written)
+    """
+    fingerprint = get_raster_fingerprint(raster_path)
+    path = get_bitpacked_raster_path(raster_path)
+    stamp = (fingerprint, get_bitpacked_stamp(raster_path))
+    with _rasters_lock:
+        loaded = _rasters.get(raster_path)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+        raster = None
+        if stamp[1] is not None:
+            try:
+                raster = BitPackedRaster(path)
+            except Exception as e:
+                logger.warning("Cannot open bit-packed raster '%s': %s", path, e)
+            if raster is not None and raster.fingerprint != fingerprint:
+                logger.warning("Ignoring outdated bit-packed raster '%s'", path)
+                raster = None
+        # The previous mapping is left to the garbage collector, as other
+        # threads may still be reading from it
+        _rasters[raster_path] = (stamp, raster)
+        return raster
@@ -1,10 +1,10 @@
 from typing import Tuple, Union, Final
 from app.config.logger import get_logger
 import math
-from pyproj import CRS, Transformer
-from shapely.ops import transform
+import numpy as np
+import shapely
+from pyproj import CRS
 from shapely.geometry import Polygon, Point
-from app.utils.image_generation.constants import GeographicConstants
 
 
 # Get logger for this module
@@ -14,16 +14,21 @@ logger = get_logger("helpers.GeometryCalculator")
 class GeometryCalculator:
     """Base class for geometry calculations used by multiple modules"""
 
-    # Constants for area calculation
-    SMALL_AREA_THRESHOLD: Final[float] = 0.1  # degrees
-    HIGH_LATITUDE_THRESHOLD: Final[float] = 60  # degrees
-    LARGE_AREA_THRESHOLD: Final[float] = 1.0  # degrees
-    ERROR_THRESHOLD: Final[float] = 5.0  # percent
-
-    # Define CRS at class level
+    # WGS84 ellipsoid
     WGS84_CRS: Final[CRS] = CRS("EPSG:4326")
-    GLOBAL_CRS: Final[CRS] = CRS.from_proj4(
-        "+proj=aea +lat_1=30 +lat_2=60 +lon_0=0 +lat_0=0"
+    WGS84_SEMI_MAJOR_AXIS: Final[float] = 6378137.0  # meters
+    WGS84_FLATTENING: Final[float] = 1 / 298.257223563
+    WGS84_ECCENTRICITY: Final[float] = math.sqrt(
+        WGS84_FLATTENING * (2 - WGS84_FLATTENING)
+    )
+
+    # Authalic sphere: the sphere with the same surface area as the ellipsoid,
+    # with the authalic latitude factor q at the pole
+    WGS84_Q_POLE: Final[float] = 1 - (1 - WGS84_ECCENTRICITY**2) / (
+        2 * WGS84_ECCENTRICITY
+    ) * math.log((1 - WGS84_ECCENTRICITY) / (1 + WGS84_ECCENTRICITY))
+    WGS84_AUTHALIC_RADIUS: Final[float] = WGS84_SEMI_MAJOR_AXIS * math.sqrt(
+        WGS84_Q_POLE / 2
     )
 
     @staticmethod
@@ -57,209 +62,172 @@ class GeometryCalculator:
         return center_lat, center_lon
 
     @staticmethod
-    def _calculate_small_area(
-        width_deg: float,
-        height_deg: float,
-        center_lat: float,
-    ) -> float:
+    def _get_authalic_latitudes(latitudes: np.ndarray) -> np.ndarray:
         """
-        Calculate area for small polygons using a simplified formula (haversine).
-
-        This method is most accurate for small areas (< 0.1 degrees) and provides
-        a fast approximation. For larger areas, consider using projection-based methods.
-        The calculation uses the METERS_PER_DEGREE constant (111,320 meters/degree at
-        equator) and adjusts for latitude using cosine correction.
-
-        Args:
-            width_deg: Width of the polygon in degrees longitude
-            height_deg: Height of the polygon in degrees latitude
-            center_lat: Center latitude of the polygon, used for cosine correction
-
-        Returns:
-            float: Area in square meters, rounded to 2 decimal places
-
-        Note:
-            This is an approximation that works well for small areas near the equator.
-            For high latitudes (> 60°) or large areas (> 1°), use projection-based
-            methods for better accuracy.
+        Convert geodetic latitudes (radians) of the WGS84 ellipsoid to authalic
+        latitudes (radians): latitudes on the sphere of the same surface area
+        that preserve the area between any two parallels.
         """
-        width_meters = (
-            GeographicConstants.METERS_PER_DEGREE
-            * math.cos(math.radians(center_lat))
-            * width_deg
+        e = GeometryCalculator.WGS84_ECCENTRICITY
+        sin_lat = np.sin(latitudes)
+        q = (1 - e**2) * (
+            sin_lat / (1 - (e * sin_lat) ** 2)
+            - np.log((1 - e * sin_lat) / (1 + e * sin_lat)) / (2 * e)
         )
-        height_meters = GeographicConstants.METERS_PER_DEGREE * height_deg
-        return round(width_meters * height_meters, 2)
+        return np.arcsin(np.clip(q / GeometryCalculator.WGS84_Q_POLE, -1, 1))
 
     @staticmethod
-    def _calculate_area_with_local_projection(
-        polygon: Polygon,
-        bounds: Tuple[float, float, float, float],
-    ) -> float:
-        """Calculate area using a local projection optimized for the polygon's location.
+    def calculate_polygon_areas(polygons) -> np.ndarray:
+        """
+        Calculate the area of many polygons at once.
 
-        This method creates a local Albers Equal Area projection centered on the
-        polygon's location to calculate its area accurately. This is especially useful
-        for polygons at high latitudes where global projections may introduce
-        significant distortion.
+        Every polygon is projected to a sinusoidal projection of the WGS84
+        authalic sphere centered on its own central meridian. The projection is
+        equal-area, so the planar area of the projected polygon is its area on
+        the ellipsoid (up to edges being straight in the projection instead of
+        geodesics, negligible at farm scale). All the coordinates are projected
+        with a single vectorized pass, without building pyproj transformers.
 
         Args:
-            polygon: The shapely Polygon object to calculate area for
-            bounds: Tuple of (lon_min, lat_min, lon_max, lat_max) defining the
-                   bounding box of the polygon
+            polygons: Array-like of shapely polygons (or multipolygons) in WGS84
+                (EPSG:4326). Missing entries (None) are allowed
 
         Returns:
-            float: The area of the polygon in square meters, rounded to 2 decimal places
-
-        Note:
-            The method uses the Albers Equal Area projection which preserves areas while
-            minimizing distortion by setting the standard parallels to the polygon's
-            minimum and maximum latitudes.
+            np.ndarray: Area of every polygon in square meters, rounded to 2
+            decimal places. -1 for invalid polygons, 0 for empty polygons and
+            NaN for missing entries
         """
-        lon_min, lat_min, lon_max, lat_max = bounds
-        local_crs = CRS.from_proj4(
-            f"+proj=aea +lat_1={lat_min} +lat_2={lat_max} "
-            f"+lon_0={(lon_min + lon_max) / 2} +lat_0={(lat_min + lat_max) / 2}"
-        )
-        transformer = Transformer.from_crs(
-            GeometryCalculator.WGS84_CRS, local_crs, always_xy=True
-        )
-        projected_polygon = transform(transformer.transform, polygon)
-        return round(projected_polygon.area, 2)
+        geometries = np.asarray(polygons, dtype=object).ravel()
+        areas = np.full(len(geometries), np.nan)
+        present = ~shapely.is_missing(geometries)
+        valid = shapely.is_valid(geometries)
+        areas[present & ~valid] = -1
+        empty = valid & shapely.is_empty(geometries)
+        areas[empty] = 0
+
+        measured = np.flatnonzero(valid & ~empty)
+        if len(measured) == 0:
+            return areas
+
+        geometries = geometries[measured]
+        bounds = shapely.bounds(geometries)
+        central_meridians = (bounds[:, 0] + bounds[:, 2]) / 2
+        _, indexes = shapely.get_coordinates(geometries, return_index=True)
+
+        def project(coords: np.ndarray) -> np.ndarray:
+            longitudes = coords[:, 0] - central_meridians[indexes]
+            longitudes = np.radians((longitudes + 180) % 360 - 180)
+            latitudes = GeometryCalculator._get_authalic_latitudes(
+                np.radians(coords[:, 1])
+            )
+            radius = GeometryCalculator.WGS84_AUTHALIC_RADIUS
+            return np.column_stack(
+                [radius * longitudes * np.cos(latitudes), radius * latitudes]
+            )
 
-    @staticmethod
-    def _calculate_area_with_global_projection(polygon: Polygon) -> float:
-        """Calculate area using a global projection for mid/low latitude areas.
+        projected = shapely.transform(geometries, project)
+        areas[measured] = np.round(shapely.area(projected), 2)
+        return areas
 
-        This method uses an Albers Equal Area projection with standard parallels at 30°N
-        and 60°N, which provides good area preservation for most mid-latitude regions.
+    @staticmethod
+    def calculate_polygon_area(polygon: Polygon) -> float:
+        """
+        Calculate the area of a given polygon on the WGS84 ellipsoid.
 
         Args:
-            polygon: The shapely Polygon object to calculate area for
+            polygon (Polygon): The polygon for which to calculate the area
 
         Returns:
-            float: The area of the polygon in square meters, rounded to 2 decimal places
+            float: The area in square meters, rounded to 2 decimal places. -1 for
+            an invalid polygon and 0 for an empty one
 
-        Note:
-            This projection works best for areas between 30°N and 60°N latitude.
-            For areas outside this range, consider using
-            _calculate_area_with_local_projection() for better accuracy.
+        See `calculate_polygon_areas` to compute the area of many polygons at
+        once, which is much faster than calling this method for every polygon.
         """
-        transformer = Transformer.from_crs(
-            GeometryCalculator.WGS84_CRS,
-            GeometryCalculator.GLOBAL_CRS,
-            always_xy=True,
-        )
-        projected_polygon = transform(transformer.transform, polygon)
-        return round(projected_polygon.area, 2)
+        return float(GeometryCalculator.calculate_polygon_areas([polygon])[0])
 
     @staticmethod
-    def _check_area_accuracy(
-        polygon: Polygon,
-        calculated_area: float,
-        center_lat: float,
-        bounds: Tuple[float, float, float, float],
-    ) -> None:
+    def get_area_scales(latitudes: np.ndarray) -> np.ndarray:
         """
-        Check the accuracy of the area calculation and log warnings if necessary.
-        Only performs the check for large areas to avoid performance impact.
+        Area in square meters of a square degree (1° of longitude by 1° of
+        latitude) at every latitude, on the WGS84 authalic sphere used by
+        `calculate_polygon_areas`.
 
         Args:
-            polygon: The shapely Polygon object to check accuracy for
-            calculated_area: The previously calculated area to compare against
-            center_lat: The center latitude of the polygon
-
-        Note:
-            This method uses a local Albers Equal Area projection as the ground truth
-            and logs a warning if the percent error exceeds ERROR_THRESHOLD (5%).
-            The warning includes the error percentage and polygon location.
+            latitudes: Geodetic latitudes in degrees
+
+        Returns:
+            np.ndarray: Square meters per square degree at every latitude
         """
-        # Calculate area using local projection for comparison
-        bounds = polygon.bounds
-        lon_min, lat_min, lon_max, lat_max = bounds
-        local_crs = CRS.from_proj4(
-            f"+proj=aea +lat_1={lat_min} +lat_2={lat_max} "
-            f"+lon_0={(lon_min + lon_max) / 2} +lat_0={(lat_min + lat_max) / 2}"
+        e = GeometryCalculator.WGS84_ECCENTRICITY
+        latitudes = np.radians(latitudes)
+        # Derivative of the authalic latitude factor q with the latitude
+        dq = (
+            2 * (1 - e**2) * np.cos(latitudes) / (1 - (e * np.sin(latitudes)) ** 2) ** 2
         )
-        transformer = Transformer.from_crs(
-            GeometryCalculator.WGS84_CRS, local_crs, always_xy=True
+        return (
+            GeometryCalculator.WGS84_AUTHALIC_RADIUS**2
+            * dq
+            / GeometryCalculator.WGS84_Q_POLE
+            * np.radians(1) ** 2
         )
-        local_projected = transform(transformer.transform, polygon)
-        local_area = local_projected.area
-
-        # Calculate percent error
-        percent_error = abs((calculated_area - local_area) / local_area * 100)
-
-        if percent_error > GeometryCalculator.ERROR_THRESHOLD:
-            logger.warning(
-                f"Large area calculation might have significant error: "
-                f"{percent_error:.1f}% for polygon at {center_lat:.1f}°N"
-            )
 
     @staticmethod
-    def calculate_polygon_area(polygon: Polygon) -> float:
+    def calculate_circle_areas(circles: np.ndarray) -> np.ndarray:
         """
-        Calculate the area of a given polygon using optimized methods
-        based on size and location.
+        Calculate the area of many circles of point farms at once, in closed
+        form.
 
         Args:
-            polygon (Polygon): The polygon for which to calculate the area
+            circles: Array of shape (n, 3) with the longitude, latitude and
+                radius (in degrees) of every circle
 
         Returns:
-            float: The area in square meters, rounded to 2 decimal places
+            np.ndarray: Area of every circle in square meters, rounded to 2
+            decimal places
+        """
+        circles = np.asarray(circles, dtype=float).reshape(-1, 3)
+        areas = np.pi * circles[:, 2] ** 2
+        return np.round(areas * GeometryCalculator.get_area_scales(circles[:, 1]), 2)
 
-        The method uses different calculation strategies based on:
-        1. Size of the polygon (small vs large)
-        2. Latitude of the polygon (high vs mid/low)
-        3. Potential error in the calculation
+    @staticmethod
+    def calculate_circle_overlap_areas(
+        first: np.ndarray, second: np.ndarray
+    ) -> np.ndarray:
         """
-        # Validate polygon
-        if not polygon.is_valid:
-            return -1
-            # raise ValueError("Invalid polygon provided")
-
-        if polygon.is_empty:
-            return 0
-
-        # Get polygon bounds and calculate dimensions
-        bounds = polygon.bounds
-        lon_min, lat_min, lon_max, lat_max = bounds
-        width_deg = lon_max - lon_min
-        height_deg = lat_max - lat_min
-        center_lat = (lat_min + lat_max) / 2
-
-        # Strategy 1: Fast calculation for small areas
-        if (
-            width_deg < GeometryCalculator.SMALL_AREA_THRESHOLD
-            and height_deg < GeometryCalculator.SMALL_AREA_THRESHOLD
-        ):
-            return GeometryCalculator._calculate_small_area(
-                width_deg, height_deg, center_lat
-            )
+        Calculate the area of the intersection of many pairs of circles at once,
+        in closed form.
 
-        # Strategy 2: High latitude or large area - use local projection
-        if (
-            abs(center_lat) > GeometryCalculator.HIGH_LATITUDE_THRESHOLD
-            or width_deg > GeometryCalculator.LARGE_AREA_THRESHOLD
-            or height_deg > GeometryCalculator.LARGE_AREA_THRESHOLD
-        ):
-            return GeometryCalculator._calculate_area_with_local_projection(
-                polygon, bounds
-            )
+        Args:
+            first: Array of shape (n, 3) with the longitude, latitude and radius
+                (in degrees) of the first circle of every pair
+            second: Array of shape (n, 3) with the second circle of every pair
 
-        # Strategy 3: Mid/low latitude and medium area - use global projection
-        area = GeometryCalculator._calculate_area_with_global_projection(polygon)
-
-        # Check for potential large errors
-        if (
-            width_deg > GeometryCalculator.LARGE_AREA_THRESHOLD
-            or height_deg > GeometryCalculator.LARGE_AREA_THRESHOLD
-        ):
-            GeometryCalculator._check_area_accuracy(
-                polygon,
-                area,
-                center_lat,
-                bounds,
+        Returns:
+            np.ndarray: Area of the intersection of every pair in square meters,
+            rounded to 2 decimal places
+        """
+        first = np.asarray(first, dtype=float).reshape(-1, 3)
+        second = np.asarray(second, dtype=float).reshape(-1, 3)
+        r1, r2 = first[:, 2], second[:, 2]
+        d = np.hypot(first[:, 0] - second[:, 0], first[:, 1] - second[:, 1])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Area of the lens between the two circles
+            lens = (
+                r1**2 * np.arccos(np.clip((d**2 + r1**2 - r2**2) / (2 * d * r1), -1, 1))
+                + r2**2
+                * np.arccos(np.clip((d**2 + r2**2 - r1**2) / (2 * d * r2), -1, 1))
+                - 0.5
+                * np.sqrt(
+                    np.clip((r1 + r2 - d) * (d + r1 - r2) * (d - r1 + r2), 0, None)
+                    * (d + r1 + r2)
+                )
             )
-
-        return area
+        areas = np.where(
+            d >= r1 + r2,
+            0.0,
+            np.where(d <= np.abs(r1 - r2), np.pi * np.minimum(r1, r2) ** 2, lens),
+        )
+        latitudes = (first[:, 1] + second[:, 1]) / 2
+        return np.round(areas * GeometryCalculator.get_area_scales(latitudes), 2)
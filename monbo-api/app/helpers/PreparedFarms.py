@@ -0,0 +1,219 @@
+from functools import cached_property
+import numpy as np
+import shapely
+from app.helpers.GeometryCalculator import GeometryCalculator
+from app.models.farms import FarmPolygonDetailData
+from app.utils.image_generation.GeoHelper import GeoHelper
+from app.utils.polygons import get_farm_polygon
+from app.utils.projections import get_crs, transform_geometries
+
+# Coordinates are rounded to this number of decimals (~1 cm) before
+# fingerprinting, so the same polygon drawn again yields the same fingerprint
+FINGERPRINT_COORDINATES_DECIMALS = 7
+
+# Values computed lazily for every farm, carried by subsets and concatenations
+CACHED_PROPERTIES = (
+    "valid",
+    "is_circle",
+    "bounds",
+    "areas",
+    "polygon_areas",
+    "fingerprints",
+)
+
+
+class PreparedFarms:
+    """
+    Farm geometries of a request, built once and shared by every consumer.
+
+    Holds the WGS84 polygon of every farm (None when it cannot be built), and
+    computes lazily, at most once, their areas, bounds, fingerprints and copies
+    projected to any CRS. Consumers of the same request (every map of an
+    analysis, the overlap validation...) reuse them instead of rebuilding the
+    polygons.
+
+    Point farms are also kept as circles (center and radius), so their areas,
+    overlaps and pixels can be computed in closed form instead of from the
+    polygon approximating the circle.
+
+    Instances are picklable, so chunks of them (see `subset`) can be sent to
+    the worker processes with everything computed so far.
+
+    Args:
+        ids: Id of every farm
+        geometries: Polygon of every farm in WGS84 (EPSG:4326), or None
+        errors: Error message of every farm without a polygon, by index
+        circles: Array of shape (n, 3) with the longitude, latitude and radius
+            (in degrees) of every point farm, NaN for the other farms
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        geometries: np.ndarray,
+        errors: dict[int, str] | None = None,
+        circles: np.ndarray | None = None,
+    ):
+        self.ids = ids
+        self.geometries = geometries
+        self.errors = errors or {}
+        if circles is None:
+            circles = np.full((len(geometries), 3), np.nan)
+        self.circles = circles
+        self._projections: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_farms(cls, farms: list[FarmPolygonDetailData]) -> "PreparedFarms":
+        """Build the polygons of the farms of a request."""
+        geometries = np.empty(len(farms), dtype=object)
+        circles = np.full((len(farms), 3), np.nan)
+        errors = {}
+        for i, farm in enumerate(farms):
+            try:
+                geometries[i] = get_farm_polygon(farm)
+            except Exception as e:
+                errors[i] = str(e)
+                continue
+            if farm.type == "point":
+                center = farm.details.center
+                radius_degrees, _ = GeoHelper.meters_to_degrees(
+                    farm.details.radius, center.lat
+                )
+                circles[i] = (center.lng, center.lat, radius_degrees)
+        return cls([farm.id for farm in farms], geometries, errors, circles)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    @cached_property
+    def is_circle(self) -> np.ndarray:
+        """Whether every farm is kept as a circle."""
+        return ~np.isnan(self.circles[:, 2]) & self.valid
+
+    @cached_property
+    def valid(self) -> np.ndarray:
+        """Whether the polygon of every farm could be built."""
+        return np.not_equal(self.geometries, None)
+
+    @cached_property
+    def bounds(self) -> np.ndarray:
+        """Array of shape (n, 4) with the WGS84 bounds of every polygon."""
+        return shapely.bounds(self.geometries)
+
+    @cached_property
+    def areas(self) -> np.ndarray:
+        """
+        Area of every farm in square meters, computed with a single
+        `GeometryCalculator.calculate_polygon_areas` call for the polygons and
+        in closed form for the circles. NaN for the farms without a polygon.
+        """
+        is_circle = self.is_circle
+        areas = np.full(len(self), np.nan)
+        areas[~is_circle] = GeometryCalculator.calculate_polygon_areas(
+            self.geometries[~is_circle]
+        )
+        areas[is_circle] = GeometryCalculator.calculate_circle_areas(
+            self.circles[is_circle]
+        )
+        return areas
+
+    @cached_property
+    def polygon_areas(self) -> np.ndarray:
+        """
+        Area of the polygon of every farm in square meters: the same as `areas`,
+        except for the circles, which get the area of the polygon approximating
+        them. Overlaps computed from the polygons are divided by these areas.
+        """
+        is_circle = self.is_circle
+        areas = self.areas.copy()
+        areas[is_circle] = GeometryCalculator.calculate_polygon_areas(
+            self.geometries[is_circle]
+        )
+        return areas
+
+    @cached_property
+    def fingerprints(self) -> np.ndarray:
+        """
+        Fingerprint of every polygon: the WKB of the polygon with its
+        coordinates rounded, repeated vertices removed and its rings normalized
+        (orientation and starting vertex). Equal for the same polygon drawn
+        again. None for the farms without a polygon.
+        """
+        fingerprints = np.full(len(self), None, dtype=object)
+        valid = self.valid
+        if valid.any():
+            geometries = shapely.transform(
+                self.geometries[valid],
+                lambda coords: np.round(coords, FINGERPRINT_COORDINATES_DECIMALS),
+            )
+            geometries = shapely.normalize(shapely.remove_repeated_points(geometries))
+            fingerprints[valid] = shapely.to_wkb(geometries)
+        return fingerprints
+
+    def prepare(self, crs_list: list = ()) -> None:
+        """
+        Compute upfront what the consumers of the farms use: prepare the
+        polygons (to speed up repeated spatial predicates), compute their areas
+        and project them to every CRS of `crs_list`.
+        """
+        shapely.prepare(self.geometries)
+        self.areas
+        for crs in crs_list:
+            self.projected(crs)
+
+    def projected(self, crs) -> np.ndarray:
+        """
+        Return the polygons projected to a CRS, projecting them on first use.
+
+        Args:
+            crs: Target CRS, in any form accepted by pyproj (e.g. "EPSG:3857" or
+                the `crs` of a rasterio dataset)
+
+        Returns:
+            np.ndarray: Projected polygon of every farm, or None
+        """
+        key = get_crs(crs).to_wkt()
+        projected = self._projections.get(key)
+        if projected is None:
+            projected = np.empty(len(self), dtype=object)
+            valid = self.valid
+            if valid.any():
+                projected[valid] = transform_geometries(
+                    self.geometries[valid], "EPSG:4326", crs
+                )
+            self._projections[key] = projected
+        return projected
+
+    def subset(self, indexes: list[int]) -> "PreparedFarms":
+        """Return the farms at the given indexes, with everything computed so far."""
+        subset = PreparedFarms(
+            [self.ids[i] for i in indexes],
+            self.geometries[indexes],
+            {j: self.errors[i] for j, i in enumerate(indexes) if i in self.errors},
+            self.circles[indexes],
+        )
+        for name in CACHED_PROPERTIES:
+            if name in self.__dict__:
+                subset.__dict__[name] = self.__dict__[name][indexes]
+        subset._projections = {
+            key: projected[indexes] for key, projected in self._projections.items()
+        }
+        return subset
+
+    def concatenate(self, other: "PreparedFarms") -> "PreparedFarms":
+        """Return these farms followed by the farms of `other`."""
+        concatenated = PreparedFarms(
+            self.ids + other.ids,
+            np.concatenate([self.geometries, other.geometries]),
+            {
+                **self.errors,
+                **{len(self) + i: error for i, error in other.errors.items()},
+            },
+            np.concatenate([self.circles, other.circles]),
+        )
+        for name in CACHED_PROPERTIES:
+            if name in self.__dict__ and name in other.__dict__:
+                concatenated.__dict__[name] = np.concatenate(
+                    [self.__dict__[name], other.__dict__[name]]
+                )
+        return concatenated
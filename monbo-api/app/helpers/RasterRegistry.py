@@ -0,0 +1,273 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from rasterio import open as rasterio_open
+from rasterio.io import DatasetReader
+from rasterio.vrt import WarpedVRT
+from app.config.env import RASTER_REGISTRY_IDLE_SECONDS
+from app.config.logger import get_logger
+from app.helpers.WebMercatorRaster import (
+    WEB_MERCATOR_CRS,
+    get_web_mercator_stamp,
+    open_web_mercator_raster,
+)
+from app.utils.maps import get_map_raster_path_by_id, get_raster_fingerprint
+from app.utils.overviews import get_overview_level
+
+# Get logger for this module
+logger = get_logger("helpers.RasterRegistry")
+
+
+class RasterHandle:
+    """
+    An open raster dataset, plus its Web Mercator copy, its overviews and the
+    warped VRTs built on top of them.
+
+    A handle is used by a single thread at a time: it is leased from the
+    registry with `RasterRegistry.acquire` and given back with
+    `RasterRegistry.release`.
+    """
+
+    def __init__(self, map_id: int, raster_path: str, fingerprint: str):
+        self.map_id = map_id
+        self.raster_path = raster_path
+        self.fingerprint = fingerprint
+        self.web_mercator_stamp = get_web_mercator_stamp(raster_path)
+        self.last_used = time.monotonic()
+        self.src: DatasetReader = rasterio_open(raster_path)
+        self._web_mercator: DatasetReader | None = None
+        self._web_mercator_checked = False
+        self._datasets: dict[tuple[str, int], DatasetReader] = {}
+        self._vrts: dict[tuple[str, int | None], WarpedVRT] = {}
+
+    def _open(self, path: str, level: int) -> DatasetReader:
+        """Return an overview of a raster file, opened once."""
+        dataset = self._datasets.get((path, level))
+        if dataset is None:
+            dataset = rasterio_open(path, overview_level=level)
+            self._datasets[(path, level)] = dataset
+        return dataset
+
+    def overview(self, level: int | None = None) -> DatasetReader:
+        """
+        Return an overview of the dataset, opened once.
+
+        Args:
+            level: Index of the overview (see `get_overview_level`), or None for
+                the full resolution dataset
+        """
+        return self.src if level is None else self._open(self.raster_path, level)
+
+    def web_mercator(self) -> DatasetReader | None:
+        """
+        Return the Web Mercator copy of the raster (see
+        `write_web_mercator_raster`), opened once.
+
+        Returns:
+            DatasetReader | None: The copy, or None if it was not written or is
+            outdated
+        """
+        if not self._web_mercator_checked:
+            self._web_mercator_checked = True
+            if self.web_mercator_stamp is not None:
+                self._web_mercator = open_web_mercator_raster(self.raster_path)
+        return self._web_mercator
+
+    def warped(
+        self,
+        target_crs: str = WEB_MERCATOR_CRS,
+        bounds: tuple[float, float, float, float] | None = None,
+        size: tuple[int, int] | None = None,
+    ) -> DatasetReader | WarpedVRT:
+        """
+        Return the dataset in the target CRS: its Web Mercator copy when it was
+        written, or a warped VRT built once otherwise.
+
+        Args:
+            target_crs: Target coordinate reference system
+            bounds: (left, bottom, right, top) in the target CRS of the grid to
+                read
+            size: (width, height) of the grid to read in pixels. When given with
+                `bounds`, the dataset returned is the overview matching the
+                resolution of the grid
+        """
+        if target_crs == WEB_MERCATOR_CRS:
+            web_mercator = self.web_mercator()
+            if web_mercator is not None:
+                level = self._get_level(web_mercator, target_crs, bounds, size)
+                if level is None:
+                    return web_mercator
+                return self._open(web_mercator.name, level)
+
+        level = self._get_level(self.src, target_crs, bounds, size)
+        vrt = self._vrts.get((target_crs, level))
+        if vrt is None:
+            vrt = WarpedVRT(self.overview(level), crs=target_crs)
+            self._vrts[(target_crs, level)] = vrt
+        return vrt
+
+    @staticmethod
+    def _get_level(dataset, crs, bounds, size) -> int | None:
+        if bounds is None or size is None:
+            return None
+        return get_overview_level(dataset, bounds, crs, size)
+
+    def close(self) -> None:
+        for vrt in self._vrts.values():
+            vrt.close()
+        self._vrts.clear()
+        for dataset in self._datasets.values():
+            dataset.close()
+        self._datasets.clear()
+        if self._web_mercator is not None:
+            self._web_mercator.close()
+            self._web_mercator = None
+        self.src.close()
+
+
+class RasterRegistry:
+    """
+    Process-wide pool of open raster datasets, keyed by map id.
+
+    Opening a GeoTIFF (and building a WarpedVRT on top of it) re-parses the file
+    headers every time, so handles are kept open and reused across requests.
+    Every handle is leased to one thread at a time; concurrent users of the same
+    map get distinct handles. Handles unused for `idle_seconds` are closed, and
+    handles of a raster whose file (or Web Mercator copy) changed on disk are
+    discarded so the new file is opened on the next lease.
+
+    Args:
+        idle_seconds: Seconds an unused handle is kept open
+    """
+
+    def __init__(self, idle_seconds: int = RASTER_REGISTRY_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._idle: dict[int, list[RasterHandle]] = {}
+        self._paths: dict[int, str] = {}
+        self._last_sweep = time.monotonic()
+
+    def acquire(self, map_id: int, raster_path: str | None = None) -> RasterHandle:
+        """
+        Lease an open handle of a map raster.
+
+        Args:
+            map_id: Id of the map
+            raster_path: Path of the raster file. Resolved from the maps index
+                when not provided
+
+        Returns:
+            RasterHandle: A handle for the exclusive use of the caller
+
+        Raises:
+            FileNotFoundError: If the map or its raster file does not exist
+        """
+        if raster_path is None:
+            raster_path = self.get_raster_path(map_id)
+        fingerprint = get_raster_fingerprint(raster_path)
+        web_mercator_stamp = get_web_mercator_stamp(raster_path)
+
+        stale = []
+        handle = None
+        with self._lock:
+            self._paths[map_id] = raster_path
+            idle = self._idle.get(map_id, [])
+            while idle:
+                candidate = idle.pop()
+                if (
+                    candidate.fingerprint == fingerprint
+                    and candidate.raster_path == raster_path
+                    and candidate.web_mercator_stamp == web_mercator_stamp
+                ):
+                    handle = candidate
+                    break
+                stale.append(candidate)
+            stale.extend(self._sweep())
+
+        self._close(stale)
+        if handle is None:
+            logger.debug("Opening raster of map %s at '%s'", map_id, raster_path)
+            handle = RasterHandle(map_id, raster_path, fingerprint)
+        return handle
+
+    def get_raster_path(self, map_id: int) -> str:
+        """
+        Resolve the raster file path of a map, remembering it for later calls.
+
+        Raises:
+            FileNotFoundError: If the map or its raster file does not exist
+        """
+        with self._lock:
+            raster_path = self._paths.get(map_id)
+        if raster_path is None:
+            raster_path = get_map_raster_path_by_id(map_id)
+            with self._lock:
+                self._paths[map_id] = raster_path
+        return raster_path
+
+    def release(self, handle: RasterHandle) -> None:
+        """Give back a leased handle so it can be reused by other requests."""
+        handle.last_used = time.monotonic()
+        try:
+            changed = (
+                get_raster_fingerprint(handle.raster_path) != handle.fingerprint
+                or get_web_mercator_stamp(handle.raster_path)
+                != handle.web_mercator_stamp
+            )
+        except OSError:
+            changed = True
+
+        with self._lock:
+            if changed or handle.src.closed:
+                stale = [handle]
+            else:
+                self._idle.setdefault(handle.map_id, []).append(handle)
+                stale = []
+            stale.extend(self._sweep())
+        self._close(stale)
+
+    @contextmanager
+    def dataset(
+        self, map_id: int, raster_path: str | None = None
+    ) -> Iterator[DatasetReader]:
+        """Context manager leasing the dataset of a map raster."""
+        handle = self.acquire(map_id, raster_path)
+        try:
+            yield handle.src
+        finally:
+            self.release(handle)
+
+    def close_all(self) -> None:
+        """Close every idle handle. Leased handles are closed when released."""
+        with self._lock:
+            stale = [handle for idle in self._idle.values() for handle in idle]
+            self._idle.clear()
+            self._paths.clear()
+        self._close(stale)
+
+    def _sweep(self) -> list[RasterHandle]:
+        """Pop the handles idle for too long. Must be called holding the lock."""
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.idle_seconds, 10):
+            return []
+        self._last_sweep = now
+
+        expired = []
+        for map_id, idle in self._idle.items():
+            fresh = [h for h in idle if now - h.last_used < self.idle_seconds]
+            expired.extend(h for h in idle if now - h.last_used >= self.idle_seconds)
+            self._idle[map_id] = fresh
+        return expired
+
+    @staticmethod
+    def _close(handles: list[RasterHandle]) -> None:
+        for handle in handles:
+            try:
+                handle.close()
+            except Exception as e:
+                logger.warning("Error closing raster '%s': %s", handle.raster_path, e)
+
+
+# Shared registry of the current process
+raster_registry = RasterRegistry()
@@ -0,0 +1,108 @@
+import os
+from rasterio import open as rasterio_open
+from rasterio.enums import Resampling
+from rasterio.io import DatasetReader
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from app.config.logger import get_logger
+from app.utils.maps import get_raster_fingerprint
+from app.utils.overviews import build_raster_overviews
+
+# Get logger for this module
+logger = get_logger("helpers.WebMercatorRaster")
+
+WEB_MERCATOR_CRS = "EPSG:3857"
+# Block size of the Web Mercator copies, the size of a map tile
+BLOCK_SIZE = 256
+
+
+def get_web_mercator_raster_path(raster_path: str) -> str:
+    return f"{raster_path}.3857.tif"
+
+
+def get_web_mercator_stamp(raster_path: str) -> int | None:
+    """
+    Modification time of the Web Mercator copy of a raster, or None if it was
+    not written. Changes whenever the copy is written again.
+    """
+    try:
+        return os.stat(get_web_mercator_raster_path(raster_path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_web_mercator_raster(raster_path: str) -> str:
+    """
+    Write the copy of a raster warped to Web Mercator (EPSG:3857) next to the
+    raster file, so tiles and images are read without reprojecting on every
+    request.
+
+    The copy is warped with nearest resampling (keeping the pixel values), is
+    tiled and compressed like the map layers, has its own overviews (see
+    `build_raster_overviews`) and is tagged with the fingerprint of the raster
+    it was warped from. It is written next to its final path and moved in
+    place once complete.
+
+    Returns:
+        str: Path of the Web Mercator copy
+    """
+    path = get_web_mercator_raster_path(raster_path)
+    temporary_path = f"{path}.partial"
+    fingerprint = get_raster_fingerprint(raster_path)
+    with (
+        rasterio_open(raster_path) as src,
+        WarpedVRT(src, crs=WEB_MERCATOR_CRS, resampling=Resampling.nearest) as vrt,
+    ):
+        profile = {
+            "driver": "GTiff",
+            "width": vrt.width,
+            "height": vrt.height,
+            "count": 1,
+            "dtype": src.dtypes[0],
+            "crs": vrt.crs,
+            "transform": vrt.transform,
+            "nodata": src.nodata,
+            "tiled": True,
+            "blockxsize": BLOCK_SIZE,
+            "blockysize": BLOCK_SIZE,
+            "compress": "lzw",
+        }
+        with rasterio_open(temporary_path, "w", **profile) as dst:
+            # Warp one row of blocks at a time
+            for row_off in range(0, vrt.height, BLOCK_SIZE):
+                window = Window(
+                    0, row_off, vrt.width, min(BLOCK_SIZE, vrt.height - row_off)
+                )
+                dst.write(vrt.read(1, window=window), 1, window=window)
+            dst.update_tags(source_fingerprint=fingerprint)
+    build_raster_overviews(temporary_path)
+
+    # The raster must not have changed while it was warped
+    if get_raster_fingerprint(raster_path) != fingerprint:
+        os.remove(temporary_path)
+        raise RuntimeError(f"Raster '{raster_path}' changed while warping it")
+    os.replace(temporary_path, path)
+    return path
+
+
+def open_web_mercator_raster(raster_path: str) -> DatasetReader | None:
+    """
+    Open the Web Mercator copy of a raster.
+
+    Returns:
+        DatasetReader | None: The copy, or None if it was not written or is
+        outdated (the raster file changed after it was written)
+    """
+    path = get_web_mercator_raster_path(raster_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        dataset = rasterio_open(path)
+    except Exception as e:
+        logger.warning("Cannot open Web Mercator raster '%s': %s", path, e)
+        return None
+    if dataset.tags().get("source_fingerprint") != get_raster_fingerprint(raster_path):
+        logger.warning("Ignoring outdated Web Mercator raster '%s'", path)
+        dataset.close()
+        return None
+    return dataset
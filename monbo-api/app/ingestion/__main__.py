@@ -0,0 +1,101 @@
+import argparse
+from app.config.env import ANALYSIS_MAX_WORKERS
+from app.ingestion.bitpacked import ingest_bitpacked
+from app.ingestion.helpers import get_maps_to_ingest
+from app.ingestion.occupancy import ingest_occupancy
+from app.ingestion.overviews import ingest_overviews
+from app.ingestion.tiles import ingest_tiles
+from app.ingestion.webmercator import ingest_web_mercator
+from app.utils.process_pool import shutdown_process_pool
+
+# Ingestion steps, by command name: (description, function)
+COMMANDS = {
+    "overviews": (
+        "Build the internal overviews of the GeoTIFF, keeping any deforested "
+        "pixel, read by the tiles and images of low zoom levels. Modifies the "
+        "raster file, so run it before the other steps",
+        ingest_overviews,
+    ),
+    "occupancy": (
+        "Build the occupancy pyramid (deforested pixels per raster block) used "
+        "by the analysis to skip regions without deforestation",
+        ingest_occupancy,
+    ),
+    "bitpack": (
+        "Write the deforestation mask with 1 bit per pixel, read through a "
+        "memory map by the analysis and the tiles instead of the GeoTIFF",
+        ingest_bitpacked,
+    ),
+    "webmercator": (
+        "Write a copy of the raster warped to Web Mercator (EPSG:3857), read by "
+        "the tiles and images instead of reprojecting the raster on every request",
+        ingest_web_mercator,
+    ),
+    "tiles": (
+        "Pre-render the map tiles of a range of zoom levels into a tile archive, "
+        "served instead of rendering them on every request",
+        ingest_tiles,
+    ),
+}
+
+# Options of the ingestion steps besides the map ids, by command name:
+# (flag, `add_argument` keyword arguments)
+OPTIONS = {
+    "tiles": [
+        (
+            "--min-zoom",
+            {"type": int, "default": 0, "help": "First zoom level to pre-render"},
+        ),
+        (
+            "--max-zoom",
+            {"type": int, "default": 10, "help": "Last zoom level to pre-render"},
+        ),
+        (
+            "--max-workers",
+            {
+                "type": int,
+                "default": ANALYSIS_MAX_WORKERS,
+                "help": "Number of worker processes rendering the tiles",
+            },
+        ),
+    ],
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Precompute the derived files of the map rasters.
+
+    Run from the API root folder, after adding or replacing a raster in
+    `app/maps/layers/rasters`, e.g. `python -m app.ingestion occupancy`.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m app.ingestion",
+        description="Precompute the derived files of the map rasters",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (description, _) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=description)
+        subparser.add_argument(
+            "--map-id",
+            type=int,
+            action="append",
+            dest="map_ids",
+            help="Id of a map to ingest (can be repeated). Defaults to all maps",
+        )
+        for flag, kwargs in OPTIONS.get(name, []):
+            subparser.add_argument(flag, **kwargs)
+    args = parser.parse_args(argv)
+
+    _, ingest = COMMANDS[args.command]
+    options = vars(args)
+    del options["command"]
+    maps = get_maps_to_ingest(options.pop("map_ids"))
+    try:
+        ingest(maps, **options)
+    finally:
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
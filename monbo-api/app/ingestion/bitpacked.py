@@ -0,0 +1,10 @@
+from rasterio import open as rasterio_open
+from app.helpers.BitPackedRaster import write_bitpacked_raster
+
+
+def ingest_bitpacked(maps: list[tuple[dict, str]]) -> None:
+    """Write the bit-packed deforestation mask of every map raster."""
+    for map_data, raster_path in maps:
+        with rasterio_open(raster_path) as src:
+            path = write_bitpacked_raster(src, raster_path)
+        print(f"Map {map_data['id']}: bit-packed mask written to '{path}'")
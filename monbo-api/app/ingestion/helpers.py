@@ -0,0 +1,34 @@
+from app.utils.json import read_json_file
+from app.utils.maps import get_map_raster_path
+
+
+def get_maps_to_ingest(map_ids: list[int] | None = None) -> list[tuple[dict, str]]:
+    """
+    List the maps of the maps index to ingest, with the path of their raster.
+
+    Args:
+        map_ids: Ids of the maps to ingest. All the maps when not provided
+
+    Returns:
+        list[tuple[dict, str]]: (map entry, raster path) of every map whose
+        raster file exists
+
+    Raises:
+        ValueError: If a requested map id is not in the maps index
+    """
+    maps = read_json_file("app/maps/index.json") or []
+    if map_ids:
+        unknown = set(map_ids) - {map_data["id"] for map_data in maps}
+        if unknown:
+            raise ValueError(f"Unknown map ids: {sorted(unknown)}")
+        maps = [map_data for map_data in maps if map_data["id"] in map_ids]
+
+    selected = []
+    for map_data in maps:
+        try:
+            selected.append(
+                (map_data, get_map_raster_path(map_data["raster_filename"]))
+            )
+        except FileNotFoundError as e:
+            print(f"Skipping map {map_data['id']}: {e}")
+    return selected
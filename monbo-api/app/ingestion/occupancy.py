@@ -0,0 +1,10 @@
+from rasterio import open as rasterio_open
+from app.modules.deforestation_analysis.occupancy import build_occupancy_pyramid
+
+
+def ingest_occupancy(maps: list[tuple[dict, str]]) -> None:
+    """Build the occupancy pyramid of every map raster."""
+    for map_data, raster_path in maps:
+        with rasterio_open(raster_path) as src:
+            path = build_occupancy_pyramid(src, raster_path)
+        print(f"Map {map_data['id']}: occupancy pyramid written to '{path}'")
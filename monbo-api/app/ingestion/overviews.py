@@ -0,0 +1,11 @@
+from app.utils.overviews import build_raster_overviews
+
+
+def ingest_overviews(maps: list[tuple[dict, str]]) -> None:
+    """Build the internal overviews of every map raster."""
+    for map_data, raster_path in maps:
+        factors = build_raster_overviews(raster_path)
+        print(
+            f"Map {map_data['id']}: overviews {factors or 'not needed'} built in "
+            f"'{raster_path}'"
+        )
@@ -0,0 +1,15 @@
+from app.modules.deforestation_analysis.tile_archive import write_tile_archive
+
+
+def ingest_tiles(
+    maps: list[tuple[dict, str]], min_zoom: int, max_zoom: int, max_workers: int
+) -> None:
+    """Pre-render the tile pyramid of every map raster over a zoom range."""
+    for map_data, raster_path in maps:
+        path = write_tile_archive(
+            map_data, raster_path, min_zoom, max_zoom, max_workers
+        )
+        print(
+            f"Map {map_data['id']}: tiles of zoom levels {min_zoom}-{max_zoom} "
+            f"written to '{path}'"
+        )
@@ -0,0 +1,8 @@
+from app.helpers.WebMercatorRaster import write_web_mercator_raster
+
+
+def ingest_web_mercator(maps: list[tuple[dict, str]]) -> None:
+    """Write the Web Mercator copy of every map raster."""
+    for map_data, raster_path in maps:
+        path = write_web_mercator_raster(raster_path)
+        print(f"Map {map_data['id']}: Web Mercator copy written to '{path}'")
@@ -1,5 +1,6 @@
 import json
 import os
+from contextlib import asynccontextmanager
 from urllib.parse import unquote
 
 from app.modules import (
@@ -12,14 +13,34 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from app.config.logger import configure_logging
+from app.helpers.RasterRegistry import raster_registry
+from app.modules.deforestation_analysis.cache import result_cache
+from app.modules.deforestation_analysis.jobs import job_manager
+from app.modules.deforestation_analysis.occupancy import load_occupancy_pyramids
+from app.modules.deforestation_analysis.tile_cache import tile_cache
+from app.modules.polygons_validation.registry import farm_registry
+from app.utils.process_pool import shutdown_process_pool
+from app.utils.projections import get_projection_cache_stats
 import logging
 
-
 # Configure the logger
 configure_logging(level=logging.INFO)  # Adjust level as needed
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_occupancy_pyramids()
+    yield
+    # Stop the analysis worker processes together with the server
+    job_manager.shutdown()
+    shutdown_process_pool()
+    raster_registry.close_all()
+    result_cache.close()
+    tile_cache.close()
+    farm_registry.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -57,6 +78,21 @@ async def health_check():
     return {"version": "0.1.0", "status": "OK"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Counters of the caches of the API process.
+
+    Returns:
+        dict: Hit and miss counters of every cache
+    """
+    return {
+        "analysisResultCache": result_cache.stats(),
+        "projectionCache": get_projection_cache_stats(),
+        "tileCache": tile_cache.stats(),
+    }
+
+
 @app.get("/download-geojson")
 async def download_geojson(content: str | None = None):
     if content:
@@ -1,6 +1,5 @@
 from typing import Literal, Optional
 from pydantic import BaseModel
-from shapely.geometry import Polygon
 from .polygons import Coordinates, PointDetails, PolygonDetails
 
 
@@ -64,9 +63,3 @@ class FarmPolygonDetailData(BaseModel):
     id: str
     type: Literal["polygon", "point"]
     details: PolygonDetails | PointDetails | None
-
-
-class FarmPolygonDetailDataWithPolygon(FarmPolygonDetailData):
-    polygon: Polygon
-
-    model_config = {"arbitrary_types_allowed": True}
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import Point, Polygon
+from app.config.env import RESULT_CACHE_MEMORY_SIZE, RESULT_CACHE_PATH
+from app.config.logger import get_logger
+from app.models.farms import FarmPolygonDetailData
+from app.utils.cache import LRUCache
+from app.utils.maps import get_raster_fingerprint
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.cache")
+
+# Bump when the way deforestation ratios are computed changes, so results
+# cached by previous versions are not served anymore
+CACHE_VERSION = 3
+
+# Coordinates are rounded to this number of decimals (~0.1 mm) before hashing
+COORDINATES_DECIMALS = 9
+
+# Maximum number of keys per SQLite query
+QUERY_BATCH_SIZE = 500
+
+
+def get_farm_geometry_hash(farm: FarmPolygonDetailData) -> str | None:
+    """
+    Hash the normalized geometry of a farm.
+
+    Polygon rings are normalized (orientation and starting vertex) and all the
+    coordinates are rounded, so the same farm drawn again yields the same hash.
+
+    Returns:
+        str | None: Hex digest of the geometry, or None if the farm geometry is
+        not valid
+    """
+    try:
+        if farm.type == "point":
+            center = farm.details.center
+            geometry = Point(center.lng, center.lat)
+            suffix = f"|{round(farm.details.radius, 3)}".encode()
+        else:
+            geometry = Polygon([(c.lng, c.lat) for c in farm.details.path])
+            suffix = b""
+    except Exception:
+        return None
+
+    geometry = shapely.transform(
+        geometry, lambda coords: np.round(coords, COORDINATES_DECIMALS)
+    )
+    geometry = shapely.normalize(geometry)
+    return hashlib.sha256(shapely.to_wkb(geometry) + suffix).hexdigest()
+
+
+def get_result_fingerprint(map_data: dict, raster_path: str) -> str:
+    """
+    Fingerprint of everything a cached result of a map depends on besides the
+    farm geometry: the raster file, the map pixel size and the cache version.
+    """
+    return (
+        f"v{CACHE_VERSION}:{get_raster_fingerprint(raster_path)}"
+        f":{map_data['pixel_size']}"
+    )
+
+
+class ResultCache:
+    """
+    Two-tier cache of per-farm deforestation ratios.
+
+    Results are addressed by (map id, map fingerprint, farm geometry hash). An
+    in-memory LRU tier sits in front of an SQLite database that survives
+    restarts. When the fingerprint of a map changes (e.g. its raster file was
+    replaced) the results of the previous fingerprint are not served anymore
+    and are deleted from the database.
+
+    Args:
+        path: Path of the SQLite database. An empty value keeps the cache in
+            memory only
+        memory_size: Maximum number of results kept in memory
+    """
+
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_PATH,
+        memory_size: int = RESULT_CACHE_MEMORY_SIZE,
+    ):
+        self.path = path
+        self.memory = LRUCache(memory_size)
+        self.disk_hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+        self._fingerprints: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """Open the database on first use. Must be called holding the lock."""
+        if self._connection is None and self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "map_id INTEGER NOT NULL, "
+                    "geometry_hash TEXT NOT NULL, "
+                    "fingerprint TEXT NOT NULL, "
+                    "value REAL NOT NULL, "
+                    "PRIMARY KEY (map_id, geometry_hash))"
+                )
+                connection.commit()
+                self._connection = connection
+            except sqlite3.Error as e:
+                logger.warning("Result cache database disabled: %s", e)
+                self.path = ""
+        return self._connection
+
+    def _invalidate(self, connection: sqlite3.Connection, map_id: int, fingerprint):
+        """Delete the results of a map computed against another fingerprint."""
+        if self._fingerprints.get(map_id) == fingerprint:
+            return
+        deleted = connection.execute(
+            "DELETE FROM results WHERE map_id = ? AND fingerprint <> ?",
+            (map_id, fingerprint),
+        ).rowcount
+        connection.commit()
+        if deleted:
+            logger.info("Invalidated %d cached results of map %s", deleted, map_id)
+        self._fingerprints[map_id] = fingerprint
+
+    def get_many(
+        self, map_id: int, fingerprint: str, geometry_hashes: list[str]
+    ) -> dict[str, float]:
+        """
+        Look up the cached results of many farms of a map.
+
+        Returns:
+            dict[str, float]: Cached ratio by geometry hash, for the hits only
+        """
+        results = {}
+        missing = []
+        for geometry_hash in dict.fromkeys(geometry_hashes):
+            value = self.memory.get((map_id, fingerprint, geometry_hash))
+            if value is None:
+                missing.append(geometry_hash)
+            else:
+                results[geometry_hash] = value
+
+        if missing:
+            with self._lock:
+                connection = self._connect()
+                if connection is not None:
+                    try:
+                        self._invalidate(connection, map_id, fingerprint)
+                        for i in range(0, len(missing), QUERY_BATCH_SIZE):
+                            batch = missing[i : i + QUERY_BATCH_SIZE]
+                            rows = connection.execute(
+                                "SELECT geometry_hash, value FROM results "
+                                "WHERE map_id = ? AND fingerprint = ? "
+                                f"AND geometry_hash IN ({','.join('?' * len(batch))})",
+                                (map_id, fingerprint, *batch),
+                            ).fetchall()
+                            for geometry_hash, value in rows:
+                                results[geometry_hash] = value
+                                self.disk_hits += 1
+                                self.memory.put(
+                                    (map_id, fingerprint, geometry_hash), value
+                                )
+                    except sqlite3.Error as e:
+                        logger.warning("Error reading the result cache: %s", e)
+                self.misses += len(missing) - sum(h in results for h in missing)
+        return results
+
+    def put_many(self, map_id: int, fingerprint: str, values: dict[str, float]):
+        """Store the results of many farms of a map, by geometry hash."""
+        for geometry_hash, value in values.items():
+            self.memory.put((map_id, fingerprint, geometry_hash), value)
+
+        with self._lock:
+            connection = self._connect()
+            if connection is None or not values:
+                return
+            try:
+                self._invalidate(connection, map_id, fingerprint)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO results "
+                    "(map_id, geometry_hash, fingerprint, value) VALUES (?, ?, ?, ?)",
+                    [(map_id, h, fingerprint, v) for h, v in values.items()],
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error writing the result cache: %s", e)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        return {
+            "memoryHits": memory["hits"],
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "memoryEntries": memory["entries"],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._fingerprints.clear()
+
+
+# Shared result cache of the API process
+result_cache = ResultCache()
@@ -0,0 +1,391 @@
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import ExitStack
+from typing import Callable, Iterator
+import numpy as np
+from app.config.env import (
+    ANALYSIS_CHUNK_SIZE,
+    ANALYSIS_MAX_WORKERS,
+    RUN_LENGTH_MAP_IDS,
+)
+from app.config.logger import get_logger
+from app.helpers.BitPackedRaster import get_bitpacked_raster
+from app.helpers.PreparedFarms import PreparedFarms
+from app.helpers.RasterRegistry import raster_registry
+from app.modules.deforestation_analysis.cache import (
+    ResultCache,
+    get_farm_geometry_hash,
+    get_result_fingerprint,
+    result_cache,
+)
+from app.models.farms import FarmPolygonDetailData
+from app.modules.deforestation_analysis.helpers import (
+    get_deforestation_ratio_from_count,
+    get_pixel_area,
+)
+from app.modules.deforestation_analysis.occupancy import get_occupancy_pyramid
+from app.modules.deforestation_analysis.read_planner import ReadStats
+from app.modules.deforestation_analysis.run_length import get_run_length_raster
+from app.modules.deforestation_analysis.zonal import (
+    count_deforested_pixels_stack,
+    get_grid_key,
+)
+from app.utils.maps import get_map_raster_path
+from app.utils.process_pool import get_process_pool
+from app.utils.spatial import get_hilbert_order
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.engine")
+
+
+def _empty_results(farms: PreparedFarms) -> list[dict]:
+    return [{"farmId": farm_id, "value": None} for farm_id in farms.ids]
+
+
+def analyze_farms_chunk(
+    maps: list[tuple[dict, str]],
+    farms: PreparedFarms,
+) -> tuple[list[list[dict]], ReadStats]:
+    """
+    Compute the deforestation ratio of a chunk of farms against one or more
+    grid-aligned maps.
+
+    This is the unit of work executed by the pool workers. The farm polygons,
+    areas and projections come prepared from the request, and the deforested
+    pixels of the whole chunk are counted with a single zonal statistics pass
+    that reads every map from the same windows. Errors are isolated per farm: a
+    farm that fails, or that does not overlap the raster, gets a None value
+    without affecting the others.
+
+    Args:
+        maps (list[tuple[dict, str]]): Map entry from the maps index and path to
+            the map raster file of every map. Maps must share the same pixel
+            grid (see `get_grid_key`)
+        farms (PreparedFarms): Farms to analyze
+
+    Returns:
+        tuple[list[list[dict]], ReadStats]: For every map, one {"farmId",
+        "value"} result per farm, in input order, and the counters of the
+        raster reads done
+    """
+    stats = ReadStats()
+    map_ids = [map_data["id"] for map_data, _ in maps]
+
+    try:
+        with ExitStack() as stack:
+            # Every worker process keeps the rasters open between tasks
+            sources = [
+                stack.enter_context(raster_registry.dataset(map_id, raster_path))
+                for map_id, (_, raster_path) in zip(map_ids, maps)
+            ]
+            if len(maps) == 1 and map_ids[0] in RUN_LENGTH_MAP_IDS:
+                # Hot maps are counted from their runs, without reading blocks
+                raster = get_run_length_raster(sources[0], maps[0][1])
+                chunk_counts = [raster.count_deforested_pixels(farms)]
+                stats.farms += int(farms.valid.sum())
+            else:
+                # The bit-packed masks, when ingested, are read without
+                # decompression
+                chunk_counts = count_deforested_pixels_stack(
+                    farms,
+                    [
+                        get_bitpacked_raster(raster_path) or src
+                        for src, (_, raster_path) in zip(sources, maps)
+                    ],
+                    stats,
+                    [get_occupancy_pyramid(raster_path) for _, raster_path in maps],
+                )
+    except Exception as e:
+        print(f"Error analyzing maps {map_ids}: {e}")
+        return [_empty_results(farms) for _ in maps], stats
+
+    results = []
+    for (map_data, _), counts in zip(maps, chunk_counts):
+        pixel_area = get_pixel_area(map_data)
+        map_results = []
+        for farm_id, area, count in zip(farms.ids, farms.areas.tolist(), counts):
+            if np.isnan(area):
+                map_results.append({"farmId": farm_id, "value": None})
+                continue
+            try:
+                if count is None:
+                    raise ValueError("Input shapes do not overlap raster.")
+                deforestation_ratio = get_deforestation_ratio_from_count(
+                    count, area, pixel_area
+                )
+                map_results.append({"farmId": farm_id, "value": deforestation_ratio})
+            except Exception as e:
+                print(f"Error processing farm {farm_id} for map {map_data['id']}: {e}")
+                map_results.append({"farmId": farm_id, "value": None})
+        results.append(map_results)
+    return results, stats
+
+
+def _group_grid_aligned_maps(
+    planned_maps: list[tuple],
+) -> list[tuple[str | None, list[tuple]]]:
+    """
+    Group planned maps (tuples starting with the map entry and raster path) that
+    share the same pixel grid, so they are analyzed together from the same
+    reads. Run-length encoded maps and maps that cannot be opened are kept on
+    their own.
+
+    Returns:
+        list[tuple[str | None, list[tuple]]]: The CRS (as WKT) of every group,
+        if known, and its planned maps
+    """
+    groups: dict[tuple, list[tuple]] = {}
+    for planned in planned_maps:
+        map_data, raster_path = planned[0], planned[1]
+        key: tuple = (None, map_data["id"])
+        if map_data["id"] not in RUN_LENGTH_MAP_IDS:
+            try:
+                with raster_registry.dataset(map_data["id"], raster_path) as src:
+                    key = get_grid_key(src)
+            except Exception as e:
+                print(f"Error opening map {map_data['id']}: {e}")
+        groups.setdefault(key, []).append(planned)
+    return [(key[0], group) for key, group in groups.items()]
+
+
+def _iter_chunk_results(
+    requested_maps: list[dict],
+    farms: list[FarmPolygonDetailData],
+    max_workers: int,
+    chunk_size: int,
+    cache: ResultCache | None,
+) -> Iterator[tuple[int, list[int], list[float | None]]]:
+    """
+    Run the analysis and yield the results of every chunk of farms of every map
+    as soon as they are available, as (map id, farm indexes, values) tuples.
+
+    Maps sharing the same pixel grid are analyzed together: every task counts a
+    chunk of farms in all of them. Results in the cache are yielded first. At
+    most two tasks per worker are in flight at any time, so finished results do
+    not pile up in memory while the caller consumes them.
+    """
+    geometry_hashes = [
+        get_farm_geometry_hash(farm) if cache else None for farm in farms
+    ]
+
+    # Open every map and look up its cached results
+    planned_maps = []
+    for map_data in requested_maps:
+        try:
+            raster_path = get_map_raster_path(map_data["raster_filename"])
+            fingerprint = get_result_fingerprint(map_data, raster_path)
+        except Exception as e:
+            print(f"Error opening map {map_data['id']}: {e}")
+            for i in range(0, len(farms), chunk_size):
+                indexes = list(range(i, min(i + chunk_size, len(farms))))
+                yield map_data["id"], indexes, [None] * len(indexes)
+            continue
+
+        cached = {}
+        if cache:
+            cached = cache.get_many(
+                map_data["id"], fingerprint, [h for h in geometry_hashes if h]
+            )
+        planned_maps.append((map_data, raster_path, fingerprint, cached))
+
+    # Farms are chunked along the Hilbert curve of their bounds, so every task
+    # covers a compact area and neighbouring farms read their raster blocks in
+    # the same task
+    prepared = PreparedFarms.from_farms(farms)
+    spatial_ranks = np.empty(len(farms), dtype=np.int64)
+    spatial_ranks[get_hilbert_order(prepared.bounds)] = np.arange(len(farms))
+
+    # Plan the tasks of every group of maps: the indexes of the farms not in
+    # the cache of at least one of them
+    tasks = []
+    crs_list = []
+    for crs, group in _group_grid_aligned_maps(planned_maps):
+        if crs is not None:
+            crs_list.append(crs)
+        missing = [
+            i
+            for i, h in enumerate(geometry_hashes)
+            if any(h not in cached for *_, cached in group)
+        ]
+        missing.sort(key=spatial_ranks.__getitem__)
+        missing_indexes = set(missing)
+        for map_data, _, _, cached in group:
+            hits = [
+                i
+                for i, h in enumerate(geometry_hashes)
+                if h in cached and i not in missing_indexes
+            ]
+            for i in range(0, len(hits), chunk_size):
+                indexes = hits[i : i + chunk_size]
+                yield map_data["id"], indexes, [
+                    cached[geometry_hashes[j]] for j in indexes
+                ]
+
+        for i in range(0, len(missing), chunk_size):
+            tasks.append((group, missing[i : i + chunk_size]))
+
+    # Prepare the farms once for every map: polygons, areas and projections
+    if tasks:
+        prepared.prepare(crs_list)
+        for i, error in sorted(prepared.errors.items()):
+            print(f"Error processing farm {farms[i].id}: {error}")
+
+    def complete(task, outcome):
+        group, indexes = task
+        chunk_results, chunk_stats = outcome
+        stats.merge(chunk_stats)
+        for (map_data, _, fingerprint, _), map_results in zip(group, chunk_results):
+            values = [farm_result["value"] for farm_result in map_results]
+            # Failed farms are not cached, they are retried on the next run
+            computed = {
+                geometry_hashes[i]: value
+                for i, value in zip(indexes, values)
+                if geometry_hashes[i] and value is not None
+            }
+            if cache and computed:
+                cache.put_many(map_data["id"], fingerprint, computed)
+            yield map_data["id"], indexes, values
+
+    def get_arguments(task):
+        group, indexes = task
+        return (
+            [(map_data, raster_path) for map_data, raster_path, *_ in group],
+            prepared.subset(indexes),
+        )
+
+    stats = ReadStats()
+    if max_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield from complete(task, analyze_farms_chunk(*get_arguments(task)))
+    else:
+        pool = get_process_pool(max_workers)
+        queued = iter(tasks)
+        running: dict[Future, tuple] = {}
+        try:
+            while True:
+                while len(running) < 2 * max_workers:
+                    task = next(queued, None)
+                    if task is None:
+                        break
+                    future = pool.submit(analyze_farms_chunk, *get_arguments(task))
+                    running[future] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        map_ids = [planned[0]["id"] for planned in task[0]]
+                        print(f"Error analyzing maps {map_ids}: {e}")
+                        outcome = (
+                            [[{"value": None}] * len(task[1]) for _ in task[0]],
+                            ReadStats(),
+                        )
+                    yield from complete(task, outcome)
+        finally:
+            # The caller stopped consuming the results (e.g. a client disconnect)
+            for future in running:
+                future.cancel()
+
+    logger.info(
+        "Analyzed %d farms (%d without deforestation in the occupancy pyramid): "
+        "%d blocks read (%d without read planning), "
+        "%d bytes decompressed in %d reads",
+        stats.farms + stats.farms_skipped,
+        stats.farms_skipped,
+        stats.blocks_read,
+        stats.blocks_requested,
+        stats.bytes_decompressed,
+        stats.read_calls,
+    )
+
+
+def iter_analysis(
+    requested_maps: list[dict],
+    farms: list[FarmPolygonDetailData],
+    max_workers: int = ANALYSIS_MAX_WORKERS,
+    chunk_size: int = ANALYSIS_CHUNK_SIZE,
+    cache: ResultCache | None = result_cache,
+) -> Iterator[dict]:
+    """
+    Run the deforestation analysis and yield partial results as they complete.
+
+    Every yielded entry holds the results of a chunk of farms of a single map,
+    in the format of `run_analysis` entries. Chunks are yielded in completion
+    order; every (map, farm) pair is yielded exactly once.
+
+    Args:
+        requested_maps (list[dict]): Map entries from the maps index
+        farms (list[FarmPolygonDetailData]): Farms to analyze
+        max_workers (int): Number of worker processes of the pool
+        chunk_size (int): Number of farms per task
+        cache (ResultCache | None): Cache of farm results. None disables it
+
+    Yields:
+        dict: A {"mapId", "farmResults"} entry with the results of a chunk
+    """
+    for map_id, indexes, values in _iter_chunk_results(
+        requested_maps, farms, max_workers, chunk_size, cache
+    ):
+        yield {
+            "mapId": map_id,
+            "farmResults": [
+                {"farmId": farms[i].id, "value": value}
+                for i, value in zip(indexes, values)
+            ],
+        }
+
+
+def run_analysis(
+    requested_maps: list[dict],
+    farms: list[FarmPolygonDetailData],
+    max_workers: int = ANALYSIS_MAX_WORKERS,
+    chunk_size: int = ANALYSIS_CHUNK_SIZE,
+    cache: ResultCache | None = result_cache,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> list[dict]:
+    """
+    Run the deforestation analysis of every farm against every requested map.
+
+    Results already in the cache (same farm geometry, map and raster file) are
+    reused. The remaining farms of every map are split into chunks of
+    `chunk_size` farms and every (map, chunk) pair is executed as an
+    independent task on the process pool. Maps sharing the same pixel grid
+    are analyzed by the same tasks, reading every farm window once for all of
+    them. Small requests (a single task) or `max_workers == 1` run inline.
+
+    Args:
+        requested_maps (list[dict]): Map entries from the maps index
+        farms (list[FarmPolygonDetailData]): Farms to analyze
+        max_workers (int): Number of worker processes of the pool
+        chunk_size (int): Number of farms per task
+        cache (ResultCache | None): Cache of farm results. None disables it
+        on_progress (Callable[[int, int], None] | None): Called with a map id
+            and a number of farms every time the results of that many farms of
+            the map are available
+
+    Returns:
+        list[dict]: One {"mapId", "farmResults"} entry per map, sorted by map id,
+        with the farm results in the same order as the input farms
+    """
+    values = {map_data["id"]: [None] * len(farms) for map_data in requested_maps}
+    for map_id, indexes, chunk_values in _iter_chunk_results(
+        requested_maps, farms, max_workers, chunk_size, cache
+    ):
+        for i, value in zip(indexes, chunk_values):
+            values[map_id][i] = value
+        if on_progress:
+            on_progress(map_id, len(indexes))
+
+    results = [
+        {
+            "mapId": map_id,
+            "farmResults": [
+                {"farmId": farm.id, "value": value}
+                for farm, value in zip(farms, map_values)
+            ],
+        }
+        for map_id, map_values in values.items()
+    ]
+    return sorted(results, key=lambda x: x["mapId"])
@@ -2,12 +2,14 @@ import geopandas as gpd
 import mercantile
 import asyncio
 import numpy as np
+from io import BytesIO
 from fastapi import HTTPException
 from PIL import Image
 from rasterio.enums import Resampling
 from rasterio.errors import WindowError
 from rasterio.mask import mask
-from app.utils.image_generation.RasterDataContext import RasterDataContext
+from app.helpers.BitPackedRaster import get_bitpacked_raster
+from app.helpers.RasterRegistry import raster_registry
 
 
 def get_map_pixels_inside_polygon(polygon, map_asset):
@@ -29,10 +31,16 @@ def get_pixel_area(map_data):
 
 
 def get_deforestation_ratio(pixels, polygon_area, pixel_area):
-    if polygon_area == 0:
-        return 0
     deforested_pixels = np.equal(pixels, 1)
     deforested_pixels_sum = np.sum(deforested_pixels)
+    return get_deforestation_ratio_from_count(
+        deforested_pixels_sum, polygon_area, pixel_area
+    )
+
+
+def get_deforestation_ratio_from_count(deforested_pixels_sum, polygon_area, pixel_area):
+    if polygon_area == 0:
+        return 0
     deforested_area = float(deforested_pixels_sum * pixel_area)
     return min(1.0, deforested_area / polygon_area)
 
@@ -43,58 +51,161 @@ def create_empty_tile():
     return img
 
 
-async def get_tile(tif_path, z, x, y):
-    """Dynamically extract and reproject a tile (PNG) for the specified z/x/y."""
+# Colors of the tile palette: transparent (0) and deforestation red (1)
+TILE_PALETTE = [0, 0, 0, 255, 0, 0]
+
+# Media type of every tile encoding
+TILE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+
+def create_mask_tile(tile_mask):
+    """
+    Create a 256x256 tile painting the True pixels of a mask in red.
+
+    The tile is a paletted image with 2 colors, index 0 being transparent.
+    """
+    img = Image.frombuffer(
+        "P", (256, 256), tile_mask.astype(np.uint8).tobytes(), "raw", "P", 0, 1
+    )
+    img.putpalette(TILE_PALETTE)
+    img.info["transparency"] = 0
+    return img
+
+
+def _encode_tile(img: Image.Image, tile_format: str) -> bytes:
+    img_io = BytesIO()
+    if tile_format == "webp":
+        img.save(img_io, format="WEBP", lossless=True, quality=50, method=4)
+    elif img.mode == "P":
+        # Paletted tiles are written with 1 bit per pixel
+        img.save(img_io, format="PNG", compress_level=1, bits=1)
+    else:
+        img.save(img_io, format="PNG", compress_level=1)
+    return img_io.getvalue()
+
+
+# Encoded fully transparent tile, by format
+EMPTY_TILES = {
+    tile_format: _encode_tile(create_mask_tile(np.zeros((256, 256), bool)), tile_format)
+    for tile_format in TILE_MEDIA_TYPES
+}
+
+
+def encode_tile(img: Image.Image, tile_format: str = "png") -> bytes:
+    """
+    Encode a tile, the same way for dynamic and pre-rendered tiles.
+
+    Args:
+        img: Tile image
+        tile_format: "png" or "webp" (lossless)
+
+    Returns:
+        bytes: Encoded tile. Fully transparent tiles are not encoded: the same
+        precomputed bytes are returned for all of them
+    """
+    if img.getbbox() is None:
+        return EMPTY_TILES[tile_format]
+    return _encode_tile(img, tile_format)
+
+
+def get_tile_format(accept: str | None) -> str:
+    """
+    Choose the encoding of a tile from the Accept header of the request: WebP
+    when the client explicitly accepts it, PNG otherwise.
+    """
+    for media_range in (accept or "").split(","):
+        media_type, *parameters = [part.strip() for part in media_range.split(";")]
+        if media_type.lower() != "image/webp":
+            continue
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    if float(value) <= 0:
+                        return "png"
+                except ValueError:
+                    return "png"
+        return "webp"
+    return "png"
+
+
+def render_tile(map_id, z, x, y, raster_path=None):
+    """
+    Extract and reproject the tile of a map for the specified z/x/y.
+
+    Args:
+        map_id: Id of the map
+        z, x, y: Tile coordinates
+        raster_path: Path of the raster of the map. Resolved from the maps
+            index when not provided
+    """
+    # Get tile bounds in the target CRS
+    bounds = mercantile.xy_bounds(x, y, z)
+
+    # Sample the bit-packed mask of the map directly, when it was ingested
+    if raster_path is None:
+        raster_path = raster_registry.get_raster_path(map_id)
+    bitpacked = get_bitpacked_raster(raster_path)
+    if bitpacked is not None:
+        deforested = bitpacked.sample_grid(
+            (bounds.left, bounds.bottom, bounds.right, bounds.top),
+            "EPSG:3857",
+            (256, 256),
+        )
+        return create_mask_tile(deforested)
+
+    # Lease the GeoTIFF of the map, read from its Web Mercator copy when it was
+    # ingested, and from the overview matching the zoom
+    handle = raster_registry.acquire(map_id, raster_path)
     try:
-        # Open the GeoTIFF
-        async with RasterDataContext(tif_path) as vrt:
-            # Get tile bounds in the target CRS
-            bounds = mercantile.xy_bounds(x, y, z)
-
-            # Check if the tile bounds overlap the GeoTIFF's bounds
-            tif_bounds = vrt.bounds
-            if (
-                bounds.right < tif_bounds.left  # Tile is left of the GeoTIFF
-                or bounds.left > tif_bounds.right  # Tile is right of the GeoTIFF
-                or bounds.top < tif_bounds.bottom  # Tile is below the GeoTIFF
-                or bounds.bottom > tif_bounds.top  # Tile is above the GeoTIFF
-            ):
-                return create_empty_tile()
-
-            # Calculate the raster window for the requested bounds
-            window = vrt.window(
-                bounds.left, bounds.bottom, bounds.right, bounds.top, precision=21
-            )
-
-            # Read the data for the specified window, resampled to 256x256 pixels
-            data = await asyncio.to_thread(
-                vrt.read,
-                out_shape=(vrt.count, 256, 256),
-                window=window,
-                # Nearest neighbor preserves True/False
-                resampling=Resampling.nearest,
-            )
-
-            # Select the first band if there are multiple bands
-            if data.shape[0] > 1:
-                data = data[0]  # Use the first band
-            else:
-                data = data.squeeze()  # Flatten single-band data
-
-            # Convert data to a binary mask (True/False)
-            mask = np.equal(data, 1).astype(np.uint8)  # 1 for True, 0 for False
-
-            # Create an RGBA array
-            rgba_data = np.zeros((256, 256, 4), dtype=np.uint8)
-            rgba_data[..., 0] = mask * 255  # Red channel (255 if True)
-            rgba_data[..., 3] = mask * 255  # Alpha channel (255 if True)
-
-            # Create a PIL Image
-            img = Image.fromarray(rgba_data, mode="RGBA")
-            return img
+        vrt = handle.warped(
+            "EPSG:3857",
+            (bounds.left, bounds.bottom, bounds.right, bounds.top),
+            (256, 256),
+        )
+
+        # Check if the tile bounds overlap the GeoTIFF's bounds
+        tif_bounds = vrt.bounds
+        if (
+            bounds.right < tif_bounds.left  # Tile is left of the GeoTIFF
+            or bounds.left > tif_bounds.right  # Tile is right of the GeoTIFF
+            or bounds.top < tif_bounds.bottom  # Tile is below the GeoTIFF
+            or bounds.bottom > tif_bounds.top  # Tile is above the GeoTIFF
+        ):
+            return create_empty_tile()
+
+        # Calculate the raster window for the requested bounds
+        window = vrt.window(
+            bounds.left, bounds.bottom, bounds.right, bounds.top, precision=21
+        )
+
+        # Read the data for the specified window, resampled to 256x256 pixels
+        data = vrt.read(
+            out_shape=(vrt.count, 256, 256),
+            window=window,
+            # Nearest neighbor preserves True/False
+            resampling=Resampling.nearest,
+        )
     except WindowError:
         # If the window calculation fails, return an empty tile
         return create_empty_tile()
+    finally:
+        raster_registry.release(handle)
+
+    # Select the first band if there are multiple bands
+    if data.shape[0] > 1:
+        data = data[0]  # Use the first band
+    else:
+        data = data.squeeze()  # Flatten single-band data
+
+    # Convert data to a binary mask (True/False)
+    return create_mask_tile(np.equal(data, 1))
+
+
+async def get_tile(map_id, z, x, y):
+    """Dynamically extract and reproject a tile (PNG) for the specified z/x/y."""
+    try:
+        return await asyncio.to_thread(render_tile, map_id, z, x, y)
     except Exception as e:
         print(f"Error generating tile: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,214 @@
+import asyncio
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from app.config.env import ANALYSIS_JOB_QUEUE_SIZE, ANALYSIS_JOB_TTL_SECONDS
+from app.config.logger import get_logger
+from app.models.farms import FarmPolygonDetailData
+from app.modules.deforestation_analysis.engine import run_analysis
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.jobs")
+
+
+class JobQueueFullError(Exception):
+    """Raised when an analysis job is submitted while the job queue is full."""
+
+    pass
+
+
+@dataclass
+class AnalysisJob:
+    """An analysis request executed in the background, and its progress."""
+
+    id: str
+    requested_maps: list[dict]
+    farms: list[FarmPolygonDetailData] | None
+    status: str = "queued"
+    # Farms with results available, by map id
+    farms_done: dict[int, int] = field(default_factory=dict)
+    farms_total: int = 0
+    results: list[dict] | None = None
+    error: str | None = None
+    finished_at: float | None = None
+    # Incremented on every change, to let listeners wait for updates
+    version: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Event loop and event of every listener waiting for the next change
+    listeners: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = field(
+        default_factory=list
+    )
+
+    def _notify(self) -> None:
+        """Record a change and wake up the listeners. Must hold `lock`."""
+        self.version += 1
+        for loop, event in self.listeners:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The event loop of the listener was closed
+                pass
+        self.listeners.clear()
+
+    def update(self, **changes) -> None:
+        with self.lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self._notify()
+
+    def add_progress(self, map_id: int, farms_count: int) -> None:
+        with self.lock:
+            self.farms_done[map_id] = self.farms_done.get(map_id, 0) + farms_count
+            self._notify()
+
+    async def wait_for_update(self, version: int | None, timeout: float) -> int:
+        """
+        Wait until the job changes after `version`, or the timeout expires.
+
+        The wait happens in the event loop of the caller: no thread is blocked
+        while waiting, however many listeners there are.
+
+        Returns:
+            int: The current version of the job
+        """
+        event = asyncio.Event()
+        listener = (asyncio.get_running_loop(), event)
+        with self.lock:
+            if self.version != version:
+                return self.version
+            self.listeners.append(listener)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.lock:
+                if listener in self.listeners:
+                    self.listeners.remove(listener)
+        return self.version
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                "jobId": self.id,
+                "status": self.status,
+                "progress": [
+                    {
+                        "mapId": map_data["id"],
+                        "farmsDone": self.farms_done.get(map_data["id"], 0),
+                        "farmsTotal": self.farms_total,
+                    }
+                    for map_data in self.requested_maps
+                ],
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs analysis jobs one after another on a background thread.
+
+    Jobs wait in a bounded queue; submitting a job while the queue is full
+    fails instead of piling up work. Finished jobs are kept for `ttl_seconds`
+    so their results can be fetched.
+
+    Jobs live in the memory of the API process: with several server worker
+    processes, a job is only visible from the process that accepted it.
+
+    Args:
+        max_queued: Maximum number of jobs waiting to be executed
+        ttl_seconds: Seconds the results of a finished job are kept
+    """
+
+    def __init__(
+        self,
+        max_queued: int = ANALYSIS_JOB_QUEUE_SIZE,
+        ttl_seconds: int = ANALYSIS_JOB_TTL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._queue: queue.Queue[AnalysisJob | None] = queue.Queue(max_queued)
+        self._jobs: dict[str, AnalysisJob] = {}
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def submit(
+        self, requested_maps: list[dict], farms: list[FarmPolygonDetailData]
+    ) -> AnalysisJob:
+        """
+        Queue the analysis of farms against the requested maps.
+
+        Raises:
+            JobQueueFullError: If too many jobs are already waiting
+        """
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            requested_maps=requested_maps,
+            farms=farms,
+            farms_total=len(farms),
+        )
+        with self._lock:
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFullError("Too many analysis jobs are queued")
+            self._jobs[job.id] = job
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="analysis-jobs", daemon=True
+                )
+                self._worker.start()
+        return job
+
+    def get(self, job_id: str) -> AnalysisJob | None:
+        """Return a job by id, or None if it does not exist or has expired."""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        """Stop the worker thread once the job being executed finishes."""
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            # Queued jobs are dropped to make room for the stop signal
+            while True:
+                try:
+                    self._queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    self._queue.get_nowait()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.update(status="running")
+            try:
+                results = run_analysis(
+                    job.requested_maps, job.farms, on_progress=job.add_progress
+                )
+                changes = {"status": "completed", "results": results}
+            except Exception as e:
+                logger.error("Analysis job %s failed: %s", job.id, e)
+                changes = {"status": "failed", "error": str(e)}
+            job.update(farms=None, finished_at=time.monotonic(), **changes)
+
+    def _expire(self) -> None:
+        """Forget the jobs finished more than `ttl_seconds` ago."""
+        now = time.monotonic()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at >= self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Shared job manager of the API process
+job_manager = JobManager()
@@ -1,4 +1,5 @@
 from app.models.farms import FarmPolygonDetailData, InputFarmData
+from typing import Literal
 from pydantic import BaseModel
 
 
@@ -19,3 +20,16 @@ class FarmDeforestation(BaseModel):
 class MapData(BaseModel):
     mapId: int
     farmResults: list[FarmDeforestation]
+
+
+class MapProgress(BaseModel):
+    mapId: int
+    farmsDone: int
+    farmsTotal: int
+
+
+class AnalysisJobStatus(BaseModel):
+    jobId: str
+    status: Literal["queued", "running", "completed", "failed"]
+    progress: list[MapProgress]
+    error: str | None = None
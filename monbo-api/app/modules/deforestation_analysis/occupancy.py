@@ -0,0 +1,202 @@
+import os
+from dataclasses import dataclass
+import numpy as np
+from rasterio.io import DatasetReader
+from rasterio.windows import Window
+from app.config.logger import get_logger
+from app.utils.json import read_json_file
+from app.utils.maps import get_map_raster_path, get_raster_fingerprint
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.occupancy")
+
+# Pyramids loaded by the current process, by raster path, with the raster
+# fingerprint and the modification time of the pyramid file they match
+_pyramids: dict[str, tuple[tuple, "OccupancyPyramid | None"]] = {}
+
+
+@dataclass
+class OccupancyPyramid:
+    """
+    Counts of deforested pixels (value 1) of a raster, per internal block and
+    at coarser levels.
+
+    Level 0 has one cell per block of the raster block grid; every following
+    level halves the resolution, each cell holding the sum of 2x2 cells of the
+    previous level, down to a single cell.
+    """
+
+    # (height, width) in pixels of the raster blocks
+    block_shape: tuple[int, int]
+    # Count grids, from the block grid (level 0) to the coarsest level
+    levels: list[np.ndarray]
+    # Fingerprint of the raster file the pyramid was built from
+    fingerprint: str
+
+    @classmethod
+    def build(cls, src: DatasetReader, fingerprint: str, band: int = 1):
+        """Build the pyramid of a raster, reading it one block row at a time."""
+        block_height, block_width = src.block_shapes[band - 1]
+        rows = -(-src.height // block_height)
+        cols = -(-src.width // block_width)
+        counts = np.zeros((rows, cols), dtype=np.int64)
+        col_starts = np.arange(0, src.width, block_width)
+        for row in range(rows):
+            row_off = row * block_height
+            window = Window(
+                0, row_off, src.width, min(block_height, src.height - row_off)
+            )
+            deforested = np.equal(src.read(band, window=window), 1)
+            counts[row] = np.add.reduceat(deforested.sum(axis=0), col_starts)
+
+        levels = [counts]
+        while levels[-1].shape != (1, 1):
+            previous = levels[-1]
+            padded = np.zeros(
+                (
+                    previous.shape[0] + previous.shape[0] % 2,
+                    previous.shape[1] + previous.shape[1] % 2,
+                ),
+                dtype=np.int64,
+            )
+            padded[: previous.shape[0], : previous.shape[1]] = previous
+            levels.append(
+                padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).sum(
+                    axis=(1, 3)
+                )
+            )
+        return cls((block_height, block_width), levels, fingerprint)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                block_shape=np.array(self.block_shape),
+                fingerprint=np.array(self.fingerprint),
+                **{f"level_{i}": level for i, level in enumerate(self.levels)},
+            )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            levels = []
+            while f"level_{len(levels)}" in data:
+                levels.append(data[f"level_{len(levels)}"])
+            return cls(
+                tuple(int(x) for x in data["block_shape"]),
+                levels,
+                str(data["fingerprint"]),
+            )
+
+    def is_block_empty(self, row: int, col: int) -> bool:
+        return self.levels[0][row, col] == 0
+
+    def count(self, row_start: int, row_stop: int, col_start: int, col_stop: int):
+        """
+        Count the deforested pixels of a range of blocks (stops are exclusive).
+
+        The pyramid is walked from the coarsest level down: empty cells are
+        skipped at once, cells fully inside the range add their count, and only
+        the cells crossing the range border are refined.
+        """
+        rows, cols = self.levels[0].shape
+        row_stop, col_stop = min(row_stop, rows), min(col_stop, cols)
+        if row_start >= row_stop or col_start >= col_stop:
+            return 0
+
+        total = 0
+        top = len(self.levels) - 1
+        cells = [(top, 0, 0)]
+        while cells:
+            level, row, col = cells.pop()
+            value = self.levels[level][row, col]
+            if value == 0:
+                continue
+            scale = 1 << level
+            cell_row_start, cell_col_start = row * scale, col * scale
+            cell_row_stop = min(cell_row_start + scale, rows)
+            cell_col_stop = min(cell_col_start + scale, cols)
+            if (
+                cell_row_stop <= row_start
+                or cell_row_start >= row_stop
+                or cell_col_stop <= col_start
+                or cell_col_start >= col_stop
+            ):
+                continue
+            if (
+                cell_row_start >= row_start
+                and cell_row_stop <= row_stop
+                and cell_col_start >= col_start
+                and cell_col_stop <= col_stop
+            ):
+                total += int(value)
+                continue
+            child_rows, child_cols = self.levels[level - 1].shape
+            for child_row in range(2 * row, min(2 * row + 2, child_rows)):
+                for child_col in range(2 * col, min(2 * col + 2, child_cols)):
+                    cells.append((level - 1, child_row, child_col))
+        return total
+
+    def count_windows(self, block_bounds: np.ndarray) -> np.ndarray:
+        """Count the deforested pixels of many block ranges, given as
+        (row_start, row_stop, col_start, col_stop) rows."""
+        return np.array(
+            [self.count(*bounds) for bounds in block_bounds.tolist()],
+            dtype=np.int64,
+        )
+
+
+def get_occupancy_pyramid_path(raster_path: str) -> str:
+    return f"{raster_path}.occupancy.npz"
+
+
+def build_occupancy_pyramid(src: DatasetReader, raster_path: str) -> str:
+    """
+    Build the occupancy pyramid of a raster and save it next to the raster file.
+
+    Returns:
+        str: Path of the pyramid file
+    """
+    pyramid = OccupancyPyramid.build(src, get_raster_fingerprint(raster_path))
+    path = get_occupancy_pyramid_path(raster_path)
+    pyramid.save(path)
+    return path
+
+
+def get_occupancy_pyramid(raster_path: str) -> OccupancyPyramid | None:
+    """
+    Return the occupancy pyramid of a raster, loading it on first use.
+
+    Returns:
+        OccupancyPyramid | None: The pyramid, or None if it was not built or
+        is outdated (the raster file changed after the pyramid was built)
+    """
+    fingerprint = get_raster_fingerprint(raster_path)
+    path = get_occupancy_pyramid_path(raster_path)
+    stamp = (fingerprint, os.stat(path).st_mtime_ns if os.path.exists(path) else None)
+    loaded = _pyramids.get(raster_path)
+    if loaded is not None and loaded[0] == stamp:
+        return loaded[1]
+
+    pyramid = None
+    if stamp[1] is not None:
+        try:
+            pyramid = OccupancyPyramid.load(path)
+        except Exception as e:
+            logger.warning("Cannot read occupancy pyramid '%s': %s", path, e)
+        if pyramid is not None and pyramid.fingerprint != fingerprint:
+            logger.warning("Ignoring outdated occupancy pyramid '%s'", path)
+            pyramid = None
+    _pyramids[raster_path] = (stamp, pyramid)
+    return pyramid
+
+
+def load_occupancy_pyramids() -> None:
+    """Load the occupancy pyramids of every map of the maps index."""
+    for map_data in read_json_file("app/maps/index.json") or []:
+        try:
+            raster_path = get_map_raster_path(map_data["raster_filename"])
+        except FileNotFoundError:
+            continue
+        if get_occupancy_pyramid(raster_path) is not None:
+            logger.info("Loaded occupancy pyramid of map %s", map_data["id"])
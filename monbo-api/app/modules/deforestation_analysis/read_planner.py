@@ -0,0 +1,287 @@
+from dataclasses import dataclass, field
+import numpy as np
+import shapely
+from rasterio.io import DatasetReader
+from rasterio.windows import Window
+from app.helpers.BitPackedRaster import BitPackedRaster
+from app.modules.deforestation_analysis.occupancy import OccupancyPyramid
+from app.utils.graphs import connected_components
+
+# Upper bound, in pixels, of a coalesced read region. Larger clusters of farms
+# are split into several regions that share their boundary blocks.
+MAX_REGION_PIXELS = 4096 * 4096
+
+
+@dataclass
+class ReadStats:
+    """Counters of the raster reads done while analyzing a request."""
+
+    farms: int = 0
+    # Farms resolved from the occupancy pyramid, without reading the raster
+    farms_skipped: int = 0
+    regions: int = 0
+    read_calls: int = 0
+    blocks_read: int = 0
+    # Blocks that reading every farm window separately would have decompressed
+    blocks_requested: int = 0
+    bytes_decompressed: int = 0
+
+    def merge(self, other: "ReadStats") -> None:
+        self.farms += other.farms
+        self.farms_skipped += other.farms_skipped
+        self.regions += other.regions
+        self.read_calls += other.read_calls
+        self.blocks_read += other.blocks_read
+        self.blocks_requested += other.blocks_requested
+        self.bytes_decompressed += other.bytes_decompressed
+
+
+@dataclass
+class ReadRegion:
+    """A block-aligned raster window read once for a group of farms."""
+
+    # Indexes of the farms served by the region
+    members: np.ndarray
+    # Region bounds in blocks: (row_start, row_stop, col_start, col_stop)
+    block_bounds: tuple[int, int, int, int]
+    # Blocks that reading every member farm window separately would decompress
+    blocks_requested: int = 0
+    # Blocks touched by at least one member farm
+    touched_blocks: set[tuple[int, int]] = field(default_factory=set)
+    # Touched blocks to read: those with deforestation, when an occupancy
+    # pyramid is available
+    blocks: set[tuple[int, int]] = field(default_factory=set)
+
+
+class BlockReadPlanner:
+    """
+    Plans and performs the raster reads of a request on the raster block grid.
+
+    Farms are mapped to the internal (compression) blocks of the GeoTIFF, farms
+    touching the same or adjacent blocks are coalesced into read regions, and
+    every block is decompressed at most once per planner: blocks shared by
+    several regions are kept in memory until the last region using them is
+    released. With an occupancy pyramid, blocks without deforestation are not
+    read at all.
+
+    The analysis uses a planner per chunk of farms, and chunks farms along the
+    Hilbert curve of their bounds, so neighbouring farms share a planner and
+    only the blocks on the edges of the chunks are read by several tasks.
+
+    Args:
+        src: Raster dataset (or its bit-packed mask) to read from
+        band: Band to read. Defaults to the first band
+        pyramid: Occupancy pyramid of the raster, if available
+    """
+
+    def __init__(
+        self,
+        src: DatasetReader | BitPackedRaster,
+        band: int = 1,
+        pyramid: OccupancyPyramid | None = None,
+    ):
+        self.src = src
+        self.band = band
+        self.pyramid = pyramid
+        self.block_height, self.block_width = src.block_shapes[band - 1]
+        self.stats = ReadStats()
+        self._blocks: dict[tuple[int, int], np.ndarray] = {}
+        self._references: dict[tuple[int, int], int] = {}
+
+    def get_block_bounds(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Map pixel windows (row_start, row_stop, col_start, col_stop) to the
+        range of blocks they touch, with exclusive stops.
+        """
+        return np.stack(
+            [
+                windows[:, 0] // self.block_height,
+                -(-windows[:, 1] // self.block_height),
+                windows[:, 2] // self.block_width,
+                -(-windows[:, 3] // self.block_width),
+            ],
+            axis=1,
+        )
+
+    def plan(self, windows: np.ndarray, indexes: np.ndarray) -> list[ReadRegion]:
+        """
+        Group farms into block-aligned read regions.
+
+        Args:
+            windows (np.ndarray): Pixel window of every farm
+            indexes (np.ndarray): Indexes of the farms to plan (farms whose window
+                overlaps the raster)
+
+        Returns:
+            list[ReadRegion]: Read regions, ordered by their position in the raster
+        """
+        if len(indexes) == 0:
+            return []
+
+        block_bounds = self.get_block_bounds(windows[indexes])
+        block_counts = (block_bounds[:, 1] - block_bounds[:, 0]) * (
+            block_bounds[:, 3] - block_bounds[:, 2]
+        )
+
+        # Farms touching the same or adjacent blocks belong to the same cluster
+        boxes = shapely.box(
+            block_bounds[:, 2] - 0.5,
+            block_bounds[:, 0] - 0.5,
+            block_bounds[:, 3] - 0.5,
+            block_bounds[:, 1] - 0.5,
+        )
+        first, second = shapely.STRtree(boxes).query(boxes, predicate="intersects")
+        clusters = connected_components(len(indexes), first, second)
+
+        max_region_blocks = max(
+            1, MAX_REGION_PIXELS // (self.block_height * self.block_width)
+        )
+        tile_blocks = max(1, int(np.sqrt(max_region_blocks)))
+
+        groups = []
+        for cluster in range(int(clusters.max()) + 1):
+            members = np.flatnonzero(clusters == cluster)
+            bounds = block_bounds[members]
+            row_start, col_start = bounds[:, [0, 2]].min(axis=0)
+            row_stop, col_stop = bounds[:, [1, 3]].max(axis=0)
+            if (row_stop - row_start) * (col_stop - col_start) <= max_region_blocks:
+                groups.append(members)
+                continue
+            # Split large clusters by the tile where every farm starts
+            tiles = bounds[:, [0, 2]] // tile_blocks
+            _, tile_ids = np.unique(tiles, axis=0, return_inverse=True)
+            tile_ids = tile_ids.ravel()
+            groups.extend(members[tile_ids == i] for i in range(tile_ids.max() + 1))
+
+        regions = []
+        for members in groups:
+            bounds = block_bounds[members]
+            region = ReadRegion(
+                members=indexes[members],
+                block_bounds=(
+                    int(bounds[:, 0].min()),
+                    int(bounds[:, 1].max()),
+                    int(bounds[:, 2].min()),
+                    int(bounds[:, 3].max()),
+                ),
+                blocks_requested=int(block_counts[members].sum()),
+            )
+            for row_start, row_stop, col_start, col_stop in bounds.tolist():
+                for row in range(row_start, row_stop):
+                    for col in range(col_start, col_stop):
+                        region.touched_blocks.add((row, col))
+            self._add_region(region)
+            regions.append(region)
+
+        regions.sort(key=lambda region: region.block_bounds[::2])
+        return regions
+
+    def share(self, regions: list[ReadRegion]) -> list[ReadRegion]:
+        """
+        Take over the regions planned by another planner over a grid-aligned
+        raster (same pixel grid and block shape), so several rasters are read
+        for the same farms without planning them again.
+
+        Returns:
+            list[ReadRegion]: Copies of the regions, with the blocks to read
+            from this planner's raster
+        """
+        shared = []
+        for region in regions:
+            shared_region = ReadRegion(
+                members=region.members,
+                block_bounds=region.block_bounds,
+                blocks_requested=region.blocks_requested,
+                touched_blocks=region.touched_blocks,
+            )
+            self._add_region(shared_region)
+            shared.append(shared_region)
+        return shared
+
+    def _add_region(self, region: ReadRegion) -> None:
+        """Select the blocks to read of a region and keep them until released."""
+        region.blocks = {
+            (row, col)
+            for row, col in region.touched_blocks
+            if not (self.pyramid and self.pyramid.is_block_empty(row, col))
+        }
+        for block in region.blocks:
+            self._references[block] = self._references.get(block, 0) + 1
+        self.stats.farms += len(region.members)
+        self.stats.regions += 1
+        self.stats.blocks_requested += region.blocks_requested
+
+    def get_region_window(self, region: ReadRegion) -> Window:
+        """Pixel window of a region, clipped to the raster extent."""
+        row_start, row_stop, col_start, col_stop = region.block_bounds
+        row_off = row_start * self.block_height
+        col_off = col_start * self.block_width
+        return Window(
+            col_off,
+            row_off,
+            min(col_stop * self.block_width, self.src.width) - col_off,
+            min(row_stop * self.block_height, self.src.height) - row_off,
+        )
+
+    def _read_blocks(self, row: int, col_start: int, col_stop: int) -> None:
+        """Read a run of adjacent blocks of a block row with a single call."""
+        row_off = row * self.block_height
+        col_off = col_start * self.block_width
+        window = Window(
+            col_off,
+            row_off,
+            min(col_stop * self.block_width, self.src.width) - col_off,
+            min(self.block_height, self.src.height - row_off),
+        )
+        data = self.src.read(self.band, window=window)
+        self.stats.read_calls += 1
+        self.stats.blocks_read += col_stop - col_start
+        self.stats.bytes_decompressed += data.nbytes
+
+        deforested = np.equal(data, 1)
+        for col in range(col_start, col_stop):
+            start = (col - col_start) * self.block_width
+            self._blocks[(row, col)] = deforested[:, start : start + self.block_width]
+
+    def read_region(self, region: ReadRegion) -> np.ndarray:
+        """
+        Read the deforestation mask of a region.
+
+        Only the blocks touched by the region farms are read (or taken from
+        memory when a previous region already read them); the rest of the
+        region is left as False.
+
+        Returns:
+            np.ndarray: Boolean array of the region window, True where the
+            raster value is 1
+        """
+        window = self.get_region_window(region)
+        row_start, _, col_start, _ = region.block_bounds
+
+        rows: dict[int, list[int]] = {}
+        for row, col in region.blocks:
+            if (row, col) not in self._blocks:
+                rows.setdefault(row, []).append(col)
+        for row, cols in rows.items():
+            cols.sort()
+            run_start = cols[0]
+            for previous, col in zip(cols, cols[1:] + [None]):
+                if col != previous + 1:
+                    self._read_blocks(row, run_start, previous + 1)
+                    run_start = col
+
+        deforested = np.zeros((window.height, window.width), dtype=bool)
+        for row, col in region.blocks:
+            block = self._blocks[(row, col)]
+            top = (row - row_start) * self.block_height
+            left = (col - col_start) * self.block_width
+            deforested[top : top + block.shape[0], left : left + block.shape[1]] = block
+        return deforested
+
+    def release(self, region: ReadRegion) -> None:
+        """Free the blocks that are no longer needed by any pending region."""
+        for block in region.blocks:
+            self._references[block] -= 1
+            if self._references[block] == 0:
+                del self._references[block]
+                self._blocks.pop(block, None)
@@ -1,94 +1,162 @@
+import asyncio
+import json
 from datetime import datetime, timedelta
 from io import BytesIO
 from pydantic import BaseModel
 from shapely.geometry import shape
+from app.modules.deforestation_analysis.engine import iter_analysis, run_analysis
 from app.modules.deforestation_analysis.helpers import (
-    get_deforestation_ratio,
-    get_map_pixels_inside_polygon,
-    get_pixel_area,
+    TILE_MEDIA_TYPES,
+    encode_tile,
     get_tile,
+    get_tile_format,
+)
+from app.modules.deforestation_analysis.tile_archive import get_archived_tile
+from app.modules.deforestation_analysis.tile_cache import (
+    get_tile_fingerprint,
+    tile_cache,
+)
+from app.modules.deforestation_analysis.jobs import (
+    AnalysisJob,
+    JobQueueFullError,
+    job_manager,
 )
 from app.modules.maps.helpers import get_all_maps, get_map_by_id
 from app.utils.image_generation.errors import NoRasterDataOverlapError
 from app.utils.image_generation.MapImageGenerator import MapImageGenerator
-from app.helpers.GeometryCalculator import GeometryCalculator
-from app.utils.maps import get_map_raster_path
-from app.utils.polygons import (
-    generate_polygon,
-)
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response
-from rasterio import open as rasterio_open
-from .models import AnalizeBody, MapData
-
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from .models import AnalizeBody, AnalysisJobStatus, MapData
 
 router = APIRouter()
 
 
 @router.post("/analize", response_model=list[MapData])
-def analize(body: AnalizeBody):
+def analize(
+    body: AnalizeBody,
+    stream: bool = Query(
+        False,
+        description=(
+            "Whether to stream the results as NDJSON, one line per completed "
+            "chunk of farms of a map, instead of returning them all at the end"
+        ),
+    ),
+):
     maps = get_all_maps()
 
-    farms = body.farms
     requested_maps = list(filter(lambda x: x["id"] in body.maps, maps))
-    results = []
-
-    for map_data in requested_maps:
-        farmsResults = []
-        try:
-            raster_path = get_map_raster_path(map_data["raster_filename"])
-            with rasterio_open(raster_path) as src:
-                for farm in farms:
-                    try:
-                        coords = (
-                            farm.details.path
-                            if farm.type == "polygon"
-                            else [farm.details.center]
-                        )
-                        radius = farm.details.radius if farm.type == "point" else None
-                        polygon = generate_polygon(coords, radius)
-                        loss_year_data = get_map_pixels_inside_polygon(polygon, src)
-                        pixel_area = get_pixel_area(map_data)
-                        deforestation_ratio = get_deforestation_ratio(
-                            loss_year_data,
-                            GeometryCalculator.calculate_polygon_area(polygon),
-                            pixel_area,
-                        )
-                        farmsResults.append(
-                            {
-                                "farmId": farm.id,
-                                "value": deforestation_ratio,
-                            }
-                        )
-                    except Exception as e:
-                        print(
-                            f"Error processing farm {farm.id} "
-                            f"for map {map_data['id']}: {e}"
-                        )
-                        farmsResults.append({"farmId": farm.id, "value": None})
-        except Exception as e:
-            print(f"Error opening map {map_data['id']}: {e}")
-            farmsResults = [{"farmId": farm.id, "value": None} for farm in farms]
-        finally:
-            results.append({"mapId": map_data["id"], "farmResults": farmsResults})
-
-    return sorted(results, key=lambda x: x["mapId"])
+
+    if stream:
+        lines = (
+            json.dumps(result) + "\n"
+            for result in iter_analysis(requested_maps, body.farms)
+        )
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    return run_analysis(requested_maps, body.farms)
+
+
+@router.post("/analize/jobs", response_model=AnalysisJobStatus, status_code=202)
+def submit_analysis_job(body: AnalizeBody):
+    """Queue an analysis to run in the background and return its job id."""
+    maps = get_all_maps()
+
+    requested_maps = list(filter(lambda x: x["id"] in body.maps, maps))
+
+    try:
+        job = job_manager.submit(requested_maps, body.farms)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.get_status()
+
+
+def get_job_or_404(job_id: str) -> AnalysisJob:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/analize/jobs/{job_id}", response_model=AnalysisJobStatus)
+def get_analysis_job(job_id: str):
+    """Report the status of an analysis job and the farms done per map."""
+    return get_job_or_404(job_id).get_status()
+
+
+@router.get("/analize/jobs/{job_id}/events")
+async def stream_analysis_job_events(job_id: str):
+    """
+    Stream the status of an analysis job as Server-Sent Events.
+
+    An event with the job status is sent on every change, until the job
+    finishes. A comment is sent every 15 seconds without changes to keep the
+    connection alive.
+    """
+    job = get_job_or_404(job_id)
+
+    async def events():
+        version = None
+        while True:
+            if version != job.version:
+                version = job.version
+                status = job.get_status()
+                yield f"data: {json.dumps(status)}\n\n"
+                if status["status"] in ("completed", "failed"):
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            await job.wait_for_update(version, 15)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/analize/jobs/{job_id}/result", response_model=list[MapData])
+def get_analysis_job_result(job_id: str):
+    """Return the results of a completed analysis job."""
+    job = get_job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail="Job not completed")
+    return job.results
 
 
 @router.get("/tiles/{map_id}/dynamic/{z}/{x}/{y}.png")
-async def serve_tile(map_id: int, z: int, x: int, y: int):
-    """Serve a tile for the specified z/x/y."""
+async def serve_tile(
+    map_id: int, z: int, x: int, y: int, accept: str | None = Header(None)
+):
+    """
+    Serve a tile for the specified z/x/y, as lossless WebP when the client
+    accepts it and as PNG otherwise.
+    """
     map = get_map_by_id(map_id)
     if map is None:
         raise HTTPException(status_code=404, detail="Map not found")
 
-    asset_path = get_map_raster_path(map["raster_filename"])
-
     try:
-        img = await get_tile(asset_path, z, x, y)
-        img_io = BytesIO()
-        img.save(img_io, format="PNG", compress_level=1)
-        img_io.seek(0)
+        # Pre-rendered tiles are read from the tile archive of the map (always
+        # PNG). Other tiles are cached once rendered, until the raster file of
+        # the map changes
+        tile_format = "png"
+        content = await asyncio.to_thread(get_archived_tile, map_id, z, x, y)
+        fingerprint = None
+        if content is None:
+            tile_format = get_tile_format(accept)
+            fingerprint = await asyncio.to_thread(get_tile_fingerprint, map_id)
+        if fingerprint is not None:
+            content = await asyncio.to_thread(
+                tile_cache.get, map_id, fingerprint, z, x, y, tile_format
+            )
+        if content is None:
+            content = encode_tile(await get_tile(map_id, z, x, y), tile_format)
+            if fingerprint is not None:
+                await asyncio.to_thread(
+                    tile_cache.put, map_id, fingerprint, z, x, y, content, tile_format
+                )
 
         # Set caching headers (e.g., cache for 1 day)
         headers = {
@@ -97,8 +165,12 @@ async def serve_tile(map_id: int, z: int, x: int, y: int):
             "Expires": (datetime.utcnow() + timedelta(days=1)).strftime(
                 "%a, %d %b %Y %H:%M:%S GMT"
             ),
+            # The encoding depends on the Accept header
+            "Vary": "Accept",
         }
-        return Response(img_io.getvalue(), media_type="image/png", headers=headers)
+        return Response(
+            content, media_type=TILE_MEDIA_TYPES[tile_format], headers=headers
+        )
     except Exception as e:
         print(f"Tile serving error: {e}")
         raise HTTPException(status_code=404, detail="Tile not found")
@@ -116,8 +188,8 @@ async def generate_image(
         True, description="Whether to include satellite imagery as background"
     ),
 ):
-    raster_filename = get_map_by_id(body.mapId)["raster_filename"]
-    raster_path = get_map_raster_path(raster_filename)
+    if get_map_by_id(body.mapId) is None:
+        raise HTTPException(status_code=404, detail="Map not found")
 
     try:
         geom = shape(body.feature["geometry"])
@@ -126,14 +198,14 @@ async def generate_image(
             point_radius_meters = 50  # TODO: get from body when new excel is ready
             img = await MapImageGenerator.generate(
                 geom,
-                raster_path,
+                body.mapId,
                 point_radius_meters,
                 include_satelital_background=include_satelital_background,
             )
         else:  # For Polygon or other geometries
             img = await MapImageGenerator.generate(
                 geom,
-                raster_path,
+                body.mapId,
                 include_satelital_background=include_satelital_background,
             )
     except NoRasterDataOverlapError as e:
@@ -0,0 +1,226 @@
+from dataclasses import dataclass
+import numpy as np
+import shapely
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.io import DatasetReader
+from rasterio.windows import Window
+from shapely.geometry.base import BaseGeometry
+from app.config.logger import get_logger
+from app.helpers.PreparedFarms import PreparedFarms
+from app.modules.deforestation_analysis.zonal import (
+    get_circle_spans,
+    get_pixel_windows,
+    get_raster_circles,
+    project_polygons,
+)
+from app.utils.maps import get_raster_fingerprint
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.run_length")
+
+# Rasters loaded by the current process, by raster path
+_rasters: dict[str, "RunLengthRaster"] = {}
+
+
+@dataclass
+class RunLengthRaster:
+    """
+    Run-length encoded deforestation mask (value 1) of a raster, held in memory.
+
+    Every run of consecutive deforested pixels of a row is stored as the
+    position of its first pixel in the flattened raster (row * width + col).
+    The cumulative run lengths allow counting the deforested pixels of any
+    row span with two binary searches, without decompressing the raster.
+    """
+
+    width: int
+    height: int
+    transform: Affine
+    crs: CRS
+    # Flattened position of the first pixel of every run, in increasing order
+    keys: np.ndarray
+    # Deforested pixels before every run (one more entry than runs)
+    cumulative: np.ndarray
+    # Fingerprint of the raster file the runs were read from
+    fingerprint: str = ""
+
+    @classmethod
+    def from_raster(cls, src: DatasetReader, fingerprint: str = "", band: int = 1):
+        """Encode a raster, reading it one block row at a time."""
+        block_height = src.block_shapes[band - 1][0]
+        keys, lengths = [], []
+        for row_off in range(0, src.height, block_height):
+            height = min(block_height, src.height - row_off)
+            data = src.read(band, window=Window(0, row_off, src.width, height))
+            padded = np.zeros((height, src.width + 2), dtype=np.int8)
+            padded[:, 1:-1] = np.equal(data, 1)
+            edges = np.diff(padded, axis=1)
+            rows, starts = np.nonzero(edges == 1)
+            _, stops = np.nonzero(edges == -1)
+            keys.append((rows + row_off).astype(np.int64) * src.width + starts)
+            lengths.append(stops - starts)
+
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        cumulative = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=cumulative[1:])
+        return cls(
+            src.width, src.height, src.transform, src.crs, keys, cumulative, fingerprint
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.cumulative.nbytes
+
+    def count_before(self, positions: np.ndarray) -> np.ndarray:
+        """Number of deforested pixels before every flattened pixel position."""
+        # Last run starting before every position
+        runs = np.searchsorted(self.keys, positions, side="left") - 1
+        run = runs.clip(0)
+        inside = np.minimum(
+            positions - self.keys[run], self.cumulative[run + 1] - self.cumulative[run]
+        )
+        return np.where(runs >= 0, self.cumulative[run] + inside, 0)
+
+    def count_spans(
+        self, rows: np.ndarray, col_starts: np.ndarray, col_stops: np.ndarray
+    ) -> np.ndarray:
+        """Number of deforested pixels of every row span [col_start, col_stop)."""
+        offsets = rows.astype(np.int64) * self.width
+        return self.count_before(offsets + col_stops) - self.count_before(
+            offsets + col_starts
+        )
+
+    def count_deforested_pixels(
+        self, polygons: list[BaseGeometry] | PreparedFarms
+    ) -> list[int | None]:
+        """
+        Count the deforested pixels inside many polygons, straight from the runs.
+
+        Pixels are selected as with `all_touched=True`: every pixel touched by
+        a polygon is counted. Each polygon is cut into one strip per pixel row;
+        every connected piece of a strip touches the contiguous range of
+        columns between its bounds, and the deforested pixels of the merged
+        column ranges are counted from the runs. Point farms kept as circles
+        are cut into row spans in closed form (see `get_circle_spans`).
+
+        Args:
+            polygons (list[BaseGeometry] | PreparedFarms): Polygons in WGS84
+                (EPSG:4326), or the prepared farms of the request
+
+        Returns:
+            list[int | None]: Deforested pixel count of every polygon, or None when
+            the polygon does not overlap the raster
+        """
+        counts: list[int | None] = [None] * len(polygons)
+        if not polygons:
+            return counts
+
+        geometries = project_polygons(polygons, self.crs)
+        windows = get_pixel_windows(geometries, self)
+        overlapping = np.flatnonzero(windows[:, 1] > windows[:, 0])
+        if len(overlapping) == 0:
+            return counts
+
+        circles = get_raster_circles(polygons, self)
+        if circles is not None:
+            is_circle = ~np.isnan(circles[overlapping, 2])
+            circular = overlapping[is_circle]
+            overlapping = overlapping[~is_circle]
+            if len(circular):
+                indexes, rows, col_starts, col_stops = get_circle_spans(
+                    circles[circular], self.transform, windows[circular]
+                )
+                farm_counts = np.bincount(
+                    indexes,
+                    weights=self.count_spans(rows, col_starts, col_stops),
+                    minlength=len(circular),
+                )
+                for i, count in zip(circular.tolist(), farm_counts.tolist()):
+                    counts[i] = int(count)
+            if len(overlapping) == 0:
+                return counts
+
+        # Geometries in pixel coordinates: pixel (row, col) is [col, col+1] x
+        # [row, row+1]
+        inverse = ~self.transform
+        pixel_geometries = shapely.transform(
+            geometries[overlapping],
+            lambda coords: np.column_stack(
+                [
+                    coords[:, 0] * inverse.a + coords[:, 1] * inverse.b + inverse.c,
+                    coords[:, 0] * inverse.d + coords[:, 1] * inverse.e + inverse.f,
+                ]
+            ),
+        )
+
+        # One strip per pixel row of every geometry window
+        row_counts = windows[overlapping, 1] - windows[overlapping, 0]
+        strip_farms = np.repeat(np.arange(len(overlapping)), row_counts)
+        strip_rows = (
+            np.arange(row_counts.sum())
+            - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+            + np.repeat(windows[overlapping, 0], row_counts)
+        )
+        strips = shapely.box(
+            np.repeat(windows[overlapping, 2], row_counts) - 1,
+            strip_rows,
+            np.repeat(windows[overlapping, 3], row_counts) + 1,
+            strip_rows + 1,
+        )
+        pieces, strip_indexes = shapely.get_parts(
+            shapely.intersection(pixel_geometries[strip_farms], strips),
+            return_index=True,
+        )
+        bounds = shapely.bounds(pieces)
+        valid = ~np.isnan(bounds).any(axis=1)
+        strip_indexes, bounds = strip_indexes[valid], bounds[valid]
+
+        col_starts = np.floor(bounds[:, 0]).astype(np.int64)
+        col_stops = np.maximum(np.ceil(bounds[:, 2]).astype(np.int64), col_starts + 1)
+        col_starts = col_starts.clip(0, self.width)
+        col_stops = col_stops.clip(0, self.width)
+
+        # Merge the column ranges of the pieces of the same strip, so pixels
+        # touched by several pieces are counted once
+        order = np.lexsort((col_starts, strip_indexes))
+        strip_indexes = strip_indexes[order]
+        col_starts, col_stops = col_starts[order], col_stops[order]
+        shift = strip_indexes * (self.width + 1)
+        reach = np.maximum.accumulate(col_stops + shift) - shift
+        same_strip = np.concatenate([[False], strip_indexes[1:] == strip_indexes[:-1]])
+        previous_reach = np.where(same_strip, np.concatenate([[0], reach[:-1]]), 0)
+        col_starts = np.maximum(col_starts, previous_reach)
+        col_stops = np.maximum(col_stops, col_starts)
+
+        span_counts = self.count_spans(strip_rows[strip_indexes], col_starts, col_stops)
+        farm_counts = np.bincount(
+            strip_farms[strip_indexes],
+            weights=span_counts,
+            minlength=len(overlapping),
+        )
+        for i, count in zip(overlapping.tolist(), farm_counts.tolist()):
+            counts[i] = int(count)
+        return counts
+
+
+def get_run_length_raster(src: DatasetReader, raster_path: str) -> RunLengthRaster:
+    """
+    Return the run-length encoded mask of a raster, encoding it on first use.
+
+    The encoded mask is kept in the memory of the current process and encoded
+    again when the raster file changes.
+    """
+    fingerprint = get_raster_fingerprint(raster_path)
+    raster = _rasters.get(raster_path)
+    if raster is None or raster.fingerprint != fingerprint:
+        raster = RunLengthRaster.from_raster(src, fingerprint)
+        _rasters[raster_path] = raster
+        logger.info(
+            "Loaded %d runs of '%s' in memory (%d bytes)",
+            len(raster.keys),
+            raster_path,
+            raster.nbytes,
+        )
+    return raster
@@ -0,0 +1,311 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Iterator
+import mercantile
+from rasterio import open as rasterio_open
+from rasterio.warp import transform_bounds
+from app.config.logger import get_logger
+from app.helpers.RasterRegistry import raster_registry
+from app.modules.deforestation_analysis.helpers import (
+    EMPTY_TILES,
+    encode_tile,
+    render_tile,
+)
+from app.modules.deforestation_analysis.tile_cache import (
+    get_raster_tiles_fingerprint,
+)
+from app.utils.process_pool import get_process_pool
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.tile_archive")
+
+# Number of tiles rendered by a worker process in a single task
+RENDER_CHUNK_SIZE = 256
+
+# Web Mercator latitude limits of the tile pyramid
+MAX_LATITUDE = 85.0511287798
+
+# Archives opened by the current process, by raster path: (stamp, archive)
+_archives: dict[str, tuple[tuple, "TileArchive | None"]] = {}
+_archives_lock = threading.Lock()
+
+
+def get_tile_archive_path(raster_path: str) -> str:
+    return f"{raster_path}.mbtiles"
+
+
+class TileArchive:
+    """
+    Pre-rendered tile pyramid of a map, in a single MBTiles file.
+
+    Tiles are stored in the deduplicated MBTiles layout: the `images` table
+    holds every distinct encoded tile once, keyed by its hash, and the `map`
+    table points every tile to its image. Empty tiles are not stored: any tile
+    missing from an archive within its zoom range is empty.
+
+    Args:
+        path: Path of the MBTiles file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._closed = False
+        self.metadata = dict(
+            self._connection.execute("SELECT name, value FROM metadata").fetchall()
+        )
+        self.min_zoom = int(self.metadata["minzoom"])
+        self.max_zoom = int(self.metadata["maxzoom"])
+        self.fingerprint = self.metadata.get("fingerprint", "")
+        self.empty_tile = EMPTY_TILES["png"]
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        """
+        Read a pre-rendered tile.
+
+        Returns:
+            bytes | None: Encoded tile, or None if the zoom level was not
+            pre-rendered or the archive was closed
+        """
+        if not self.min_zoom <= z <= self.max_zoom:
+            return None
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._connection.execute(
+                "SELECT images.tile_data FROM map "
+                "JOIN images ON images.tile_id = map.tile_id "
+                "WHERE map.zoom_level = ? AND map.tile_column = ? "
+                "AND map.tile_row = ?",
+                # MBTiles rows are numbered from the south (TMS scheme)
+                (z, x, (1 << z) - 1 - y),
+            ).fetchone()
+        return self.empty_tile if row is None else bytes(row[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._connection.close()
+
+
+def get_tile_archive(raster_path: str) -> TileArchive | None:
+    """
+    Return the tile archive of a raster, opening it on first use.
+
+    Returns:
+        TileArchive | None: The archive, or None if it was not written or is
+        outdated (the raster file or the tile rendering changed after it was
+        written)
+    """
+    fingerprint = get_raster_tiles_fingerprint(raster_path)
+    path = get_tile_archive_path(raster_path)
+    stamp = (fingerprint, os.stat(path).st_mtime_ns if os.path.exists(path) else None)
+    with _archives_lock:
+        loaded = _archives.get(raster_path)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+        # Reads hold the lock of the archive, so a replaced archive is closed
+        # between them. Threads still holding it read None from it and render
+        # the tile instead
+        if loaded is not None and loaded[1] is not None:
+            loaded[1].close()
+        archive = None
+        if stamp[1] is not None:
+            try:
+                archive = TileArchive(path)
+            except Exception as e:
+                logger.warning("Cannot open tile archive '%s': %s", path, e)
+            if archive is not None and archive.fingerprint != fingerprint:
+                logger.warning("Ignoring outdated tile archive '%s'", path)
+                archive.close()
+                archive = None
+        _archives[raster_path] = (stamp, archive)
+        return archive
+
+
+def get_archived_tile(map_id: int, z: int, x: int, y: int) -> bytes | None:
+    """
+    Read a tile of a map from its tile archive.
+
+    Returns:
+        bytes | None: Encoded tile, or None if the map has no up to date archive
+        or the zoom level of the tile was not pre-rendered
+    """
+    try:
+        archive = get_tile_archive(raster_registry.get_raster_path(map_id))
+    except OSError:
+        return None
+    return None if archive is None else archive.get(z, x, y)
+
+
+def render_tiles(
+    map_id: int, raster_path: str, tiles: list[tuple[int, int, int]]
+) -> list[tuple[int, int, int, bytes]]:
+    """
+    Render and encode tiles of a map, leaving out the empty ones.
+
+    This is the unit of work executed by the pool workers.
+
+    Returns:
+        list[tuple[int, int, int, bytes]]: z, x, y and encoded tile of every
+        non-empty tile
+    """
+    rendered = []
+    for z, x, y in tiles:
+        data = encode_tile(render_tile(map_id, z, x, y, raster_path))
+        if data != EMPTY_TILES["png"]:
+            rendered.append((z, x, y, data))
+    return rendered
+
+
+def _plan_render_tasks(
+    bounds: tuple[float, float, float, float], min_zoom: int, max_zoom: int
+) -> Iterator[list[tuple[int, int, int]]]:
+    """Split the tiles of a zoom range over WGS84 bounds into render tasks."""
+    tiles = mercantile.tiles(*bounds, zooms=range(min_zoom, max_zoom + 1))
+    chunk = []
+    for tile in tiles:
+        chunk.append((tile.z, tile.x, tile.y))
+        if len(chunk) == RENDER_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _create_archive(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT);"
+        "CREATE TABLE map ("
+        "zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT, "
+        "PRIMARY KEY (zoom_level, tile_column, tile_row));"
+        "CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);"
+        "CREATE VIEW tiles AS SELECT map.zoom_level, map.tile_column, "
+        "map.tile_row, images.tile_data FROM map "
+        "JOIN images ON images.tile_id = map.tile_id;"
+    )
+    return connection
+
+
+def _write_tiles(
+    connection: sqlite3.Connection, tiles: list[tuple[int, int, int, bytes]]
+) -> None:
+    """Store rendered tiles, every distinct image once."""
+    rows, images = [], {}
+    for z, x, y, data in tiles:
+        tile_id = hashlib.sha1(data).hexdigest()
+        images[tile_id] = data
+        rows.append((z, x, (1 << z) - 1 - y, tile_id))
+    connection.executemany(
+        "INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)",
+        images.items(),
+    )
+    connection.executemany(
+        "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) "
+        "VALUES (?, ?, ?, ?)",
+        rows,
+    )
+
+
+def write_tile_archive(
+    map_data: dict,
+    raster_path: str,
+    min_zoom: int,
+    max_zoom: int,
+    max_workers: int,
+) -> str:
+    """
+    Pre-render the tiles of a map over a zoom range into its tile archive.
+
+    The tiles covering the bounds of the raster are rendered as
+    `serve_tile` would, in the worker pool, and written to a new archive that
+    replaces the previous one once complete.
+
+    Args:
+        map_data: Entry of the map in the maps index
+        raster_path: Path of the raster of the map
+        min_zoom: First zoom level to pre-render
+        max_zoom: Last zoom level to pre-render
+        max_workers: Number of worker processes rendering the tiles
+
+    Returns:
+        str: Path of the tile archive
+    """
+    map_id = map_data["id"]
+    with rasterio_open(raster_path) as src:
+        west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+    bounds = (
+        west,
+        max(south, -MAX_LATITUDE),
+        east,
+        min(north, MAX_LATITUDE),
+    )
+    fingerprint = get_raster_tiles_fingerprint(raster_path)
+
+    path = get_tile_archive_path(raster_path)
+    partial_path = f"{path}.partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    connection = _create_archive(partial_path)
+    try:
+        tasks = _plan_render_tasks(bounds, min_zoom, max_zoom)
+        if max_workers <= 1:
+            for tiles in tasks:
+                _write_tiles(connection, render_tiles(map_id, raster_path, tiles))
+        else:
+            pool = get_process_pool(max_workers)
+            running: set[Future] = set()
+            try:
+                # At most two tasks per worker are in flight, so the rendered
+                # tiles do not pile up in memory
+                while True:
+                    while len(running) < 2 * max_workers:
+                        tiles = next(tasks, None)
+                        if tiles is None:
+                            break
+                        running.add(
+                            pool.submit(render_tiles, map_id, raster_path, tiles)
+                        )
+                    if not running:
+                        break
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _write_tiles(connection, future.result())
+            finally:
+                for future in running:
+                    future.cancel()
+
+        metadata = {
+            "name": map_data.get("name", str(map_id)),
+            "type": "overlay",
+            "format": "png",
+            "minzoom": str(min_zoom),
+            "maxzoom": str(max_zoom),
+            "bounds": ",".join(str(value) for value in bounds),
+            "fingerprint": fingerprint,
+        }
+        connection.executemany(
+            "INSERT INTO metadata (name, value) VALUES (?, ?)", metadata.items()
+        )
+        connection.commit()
+    except BaseException:
+        # A failed rendering leaves no incomplete archive behind
+        connection.close()
+        os.remove(partial_path)
+        raise
+    connection.close()
+
+    # The raster must not have changed while its tiles were rendered
+    if get_raster_tiles_fingerprint(raster_path) != fingerprint:
+        os.remove(partial_path)
+        raise RuntimeError(f"Raster '{raster_path}' changed while rendering tiles")
+    os.replace(partial_path, path)
+    return path
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+from app.config.env import TILE_CACHE_MEMORY_BYTES, TILE_CACHE_PATH
+from app.config.logger import get_logger
+from app.helpers.BitPackedRaster import get_bitpacked_stamp
+from app.helpers.RasterRegistry import raster_registry
+from app.helpers.WebMercatorRaster import get_web_mercator_stamp
+from app.utils.cache import LRUCache
+from app.utils.maps import get_raster_fingerprint
+
+# Get logger for this module
+logger = get_logger("modules.deforestation_analysis.tile_cache")
+
+# Bump when the way tiles are rendered changes, so tiles cached by previous
+# versions are not served anymore
+TILE_CACHE_VERSION = 3
+
+
+def get_raster_tiles_fingerprint(raster_path: str) -> str:
+    """
+    Fingerprint of everything a rendered tile of a raster depends on: the tile
+    cache version, the raster file (including its overviews, which are written
+    inside it) and the bit-packed mask and Web Mercator copy the tiles are
+    read from.
+    """
+    return (
+        f"v{TILE_CACHE_VERSION}:{get_raster_fingerprint(raster_path)}"
+        f":{get_bitpacked_stamp(raster_path)}:{get_web_mercator_stamp(raster_path)}"
+    )
+
+
+def get_tile_fingerprint(map_id: int) -> str | None:
+    """
+    Fingerprint of the rendered tiles of a map (see
+    `get_raster_tiles_fingerprint`).
+
+    Returns:
+        str | None: Fingerprint of the tiles of the map, or None if the raster
+        file of the map cannot be found
+    """
+    try:
+        return get_raster_tiles_fingerprint(raster_registry.get_raster_path(map_id))
+    except OSError:
+        return None
+
+
+class TileCache:
+    """
+    Two-tier cache of rendered map tiles.
+
+    Encoded tiles are addressed by (map id, map fingerprint, z, x, y, format).
+    An in-memory LRU tier bounded by the total size of the tiles sits in front
+    of an SQLite database that survives restarts. When the fingerprint of a map
+    changes (e.g. its raster file was replaced) the tiles of the previous
+    fingerprint are not served anymore and are deleted from the database.
+
+    Args:
+        path: Path of the SQLite database. An empty value keeps the cache in
+            memory only
+        memory_bytes: Maximum total size of the tiles kept in memory
+    """
+
+    def __init__(
+        self,
+        path: str = TILE_CACHE_PATH,
+        memory_bytes: int = TILE_CACHE_MEMORY_BYTES,
+    ):
+        self.path = path
+        self.memory = LRUCache(memory_bytes, sizeof=len)
+        self.disk_hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+        self._fingerprints: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """Open the database on first use. Must be called holding the lock."""
+        if self._connection is None and self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                # Databases of previous versions did not store the tile format
+                columns = [
+                    row[1] for row in connection.execute("PRAGMA table_info(tiles)")
+                ]
+                if columns and "format" not in columns:
+                    connection.execute("DROP TABLE tiles")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS tiles ("
+                    "map_id INTEGER NOT NULL, "
+                    "z INTEGER NOT NULL, "
+                    "x INTEGER NOT NULL, "
+                    "y INTEGER NOT NULL, "
+                    "format TEXT NOT NULL, "
+                    "fingerprint TEXT NOT NULL, "
+                    "data BLOB NOT NULL, "
+                    "PRIMARY KEY (map_id, z, x, y, format))"
+                )
+                connection.commit()
+                self._connection = connection
+            except sqlite3.Error as e:
+                logger.warning("Tile cache database disabled: %s", e)
+                self.path = ""
+        return self._connection
+
+    def _invalidate(self, connection: sqlite3.Connection, map_id: int, fingerprint):
+        """Delete the tiles of a map rendered from another fingerprint."""
+        if self._fingerprints.get(map_id) == fingerprint:
+            return
+        deleted = connection.execute(
+            "DELETE FROM tiles WHERE map_id = ? AND fingerprint <> ?",
+            (map_id, fingerprint),
+        ).rowcount
+        connection.commit()
+        if deleted:
+            logger.info("Invalidated %d cached tiles of map %s", deleted, map_id)
+        self._fingerprints[map_id] = fingerprint
+
+    def get(
+        self,
+        map_id: int,
+        fingerprint: str,
+        z: int,
+        x: int,
+        y: int,
+        tile_format: str = "png",
+    ):
+        """
+        Look up a rendered tile.
+
+        Returns:
+            bytes | None: Encoded tile, or None if it is not cached
+        """
+        key = (map_id, fingerprint, z, x, y, tile_format)
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            connection = self._connect()
+            if connection is not None:
+                try:
+                    self._invalidate(connection, map_id, fingerprint)
+                    row = connection.execute(
+                        "SELECT data FROM tiles WHERE map_id = ? AND z = ? "
+                        "AND x = ? AND y = ? AND format = ? AND fingerprint = ?",
+                        (map_id, z, x, y, tile_format, fingerprint),
+                    ).fetchone()
+                    if row is not None:
+                        data = bytes(row[0])
+                except sqlite3.Error as e:
+                    logger.warning("Error reading the tile cache: %s", e)
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.memory.put(key, data)
+        return data
+
+    def put(
+        self,
+        map_id: int,
+        fingerprint: str,
+        z: int,
+        x: int,
+        y: int,
+        data: bytes,
+        tile_format: str = "png",
+    ):
+        """Store a rendered tile."""
+        self.memory.put((map_id, fingerprint, z, x, y, tile_format), data)
+
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                return
+            try:
+                self._invalidate(connection, map_id, fingerprint)
+                connection.execute(
+                    "INSERT OR REPLACE INTO tiles "
+                    "(map_id, z, x, y, format, fingerprint, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (map_id, z, x, y, tile_format, fingerprint, data),
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error writing the tile cache: %s", e)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        requests = memory["hits"] + self.disk_hits + self.misses
+        disk_entries, disk_bytes = 0, 0
+        with self._lock:
+            connection = self._connect()
+            if connection is not None:
+                try:
+                    disk_entries, disk_bytes = connection.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM tiles"
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning("Error reading the tile cache: %s", e)
+        return {
+            "memoryHits": memory["hits"],
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "hitRatio": (
+                (memory["hits"] + self.disk_hits) / requests if requests else 0.0
+            ),
+            "memoryEntries": memory["entries"],
+            "memoryBytes": memory["size"],
+            "diskEntries": disk_entries,
+            "diskBytes": disk_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._fingerprints.clear()
+
+
+# Shared tile cache of the API process
+tile_cache = TileCache()
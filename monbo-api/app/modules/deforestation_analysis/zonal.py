@@ -0,0 +1,412 @@
+import numpy as np
+import shapely
+from affine import Affine
+from rasterio.features import rasterize
+from rasterio.io import DatasetReader
+from rasterio.windows import Window
+from shapely.geometry.base import BaseGeometry
+from app.helpers.BitPackedRaster import BitPackedRaster
+from app.helpers.GeometryCalculator import GeometryCalculator
+from app.helpers.PreparedFarms import PreparedFarms
+from app.modules.deforestation_analysis.occupancy import OccupancyPyramid
+from app.modules.deforestation_analysis.read_planner import BlockReadPlanner, ReadStats
+from app.utils.projections import get_crs, transform_geometries
+
+
+def project_polygons(polygons: list[BaseGeometry] | PreparedFarms, crs) -> np.ndarray:
+    """
+    Project WGS84 polygons to a CRS, reusing the projections of prepared farms.
+
+    Returns:
+        np.ndarray: Array of projected shapely geometries (None for the prepared
+        farms without a polygon)
+    """
+    if isinstance(polygons, PreparedFarms):
+        return polygons.projected(crs)
+    geometries = np.empty(len(polygons), dtype=object)
+    geometries[:] = polygons
+    return transform_geometries(geometries, "EPSG:4326", crs)
+
+
+def get_pixel_windows(
+    geometries: np.ndarray,
+    src: DatasetReader,
+) -> np.ndarray:
+    """
+    Compute the raster window of every geometry, as `rasterio.mask` does.
+
+    The window is the outermost pixel indices that contain the geometry bounds,
+    clipped to the raster extent.
+
+    Args:
+        geometries (np.ndarray): Array of shapely geometries in the raster CRS
+        src (DatasetReader): Raster dataset
+
+    Returns:
+        np.ndarray: Integer array of shape (n, 4) with (row_start, row_stop,
+        col_start, col_stop) per geometry. Geometries that do not overlap the
+        raster get an empty window (start == stop).
+    """
+    inverse = ~src.transform
+    bounds = shapely.bounds(geometries)
+    lefts, bottoms, rights, tops = bounds.T
+
+    corners_x = np.stack([lefts, rights, rights, lefts])
+    corners_y = np.stack([tops, tops, bottoms, bottoms])
+    cols = corners_x * inverse.a + corners_y * inverse.b + inverse.c
+    rows = corners_x * inverse.d + corners_y * inverse.e + inverse.f
+
+    windows = np.zeros((len(geometries), 4), dtype=np.int64)
+    valid = ~np.isnan(bounds).any(axis=1)
+    if valid.any():
+        windows[valid, 0] = np.floor(rows[:, valid].min(axis=0))
+        windows[valid, 1] = np.ceil(rows[:, valid].max(axis=0))
+        windows[valid, 2] = np.floor(cols[:, valid].min(axis=0))
+        windows[valid, 3] = np.ceil(cols[:, valid].max(axis=0))
+
+    windows[:, 0:2] = windows[:, 0:2].clip(0, src.height)
+    windows[:, 2:4] = windows[:, 2:4].clip(0, src.width)
+    empty = (windows[:, 1] <= windows[:, 0]) | (windows[:, 3] <= windows[:, 2])
+    windows[empty] = 0
+    return windows
+
+
+def get_raster_circles(
+    polygons: list[BaseGeometry] | PreparedFarms,
+    src: DatasetReader | BitPackedRaster,
+) -> np.ndarray | None:
+    """
+    Return the circles of the point farms, when they can be rasterized in
+    closed form on the grid of a raster (a north-up WGS84 grid).
+
+    Returns:
+        np.ndarray | None: Array of shape (n, 3) with the longitude, latitude
+        and radius (in degrees) of every point farm, NaN for the other farms. None
+        when there are no circles or the raster grid is not supported
+    """
+    if not isinstance(polygons, PreparedFarms) or not polygons.is_circle.any():
+        return None
+    transform = src.transform
+    if transform.b != 0 or transform.d != 0 or transform.a <= 0:
+        return None
+    if not get_crs(src.crs).equals(
+        GeometryCalculator.WGS84_CRS, ignore_axis_order=True
+    ):
+        return None
+    return np.where(polygons.is_circle[:, None], polygons.circles, np.nan)
+
+
+def get_circle_spans(
+    circles: np.ndarray, transform: Affine, windows: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cut circles into the spans of pixels they touch, one per pixel row.
+
+    Pixels are selected as with `all_touched=True`: a pixel is touched when
+    the circle intersects its square. The circle crosses the band of a pixel
+    row along the chord at the latitude of the band closest to its center, so
+    the touched pixels of the row are those overlapping that chord.
+
+    Args:
+        circles (np.ndarray): Array of shape (n, 3) with the center and radius
+            of every circle, in the raster CRS
+        transform (Affine): Transform of the raster grid (north-up)
+        windows (np.ndarray): Raster window of every circle (see
+            `get_pixel_windows`), spans are clipped to it
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Circle index,
+        row, first column and column stop of every non-empty span
+    """
+    row_counts = windows[:, 1] - windows[:, 0]
+    indexes = np.repeat(np.arange(len(circles)), row_counts)
+    rows = (
+        np.arange(row_counts.sum())
+        - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+        + np.repeat(windows[:, 0], row_counts)
+    )
+    centers_x, centers_y, radii = circles[indexes].T
+
+    # Distance from the center of the circle to the band of every row
+    edges = transform.f + np.stack([rows, rows + 1]) * transform.e
+    distances = np.maximum(
+        np.maximum(edges.min(axis=0) - centers_y, centers_y - edges.max(axis=0)), 0
+    )
+    half_chords = np.sqrt(np.clip(radii**2 - distances**2, 0, None))
+
+    col_starts = np.ceil(
+        (centers_x - half_chords - transform.c) / transform.a - 1
+    ).astype(np.int64)
+    col_stops = (
+        np.floor((centers_x + half_chords - transform.c) / transform.a).astype(np.int64)
+        + 1
+    )
+    col_starts = np.maximum(col_starts, windows[indexes, 2])
+    col_stops = np.minimum(col_stops, windows[indexes, 3])
+
+    touched = (distances <= radii) & (col_stops > col_starts)
+    return indexes[touched], rows[touched], col_starts[touched], col_stops[touched]
+
+
+def get_label_layers(windows: np.ndarray) -> np.ndarray:
+    """
+    Assign every window to a label layer so that no two windows of the same
+    layer share a pixel.
+
+    A label grid holds a single farm per pixel, so farms whose windows overlap
+    (including neighbours sharing an edge pixel) are rasterized on different
+    layers. Most farms do not overlap, so this usually yields one or two layers.
+
+    Args:
+        windows (np.ndarray): Array of (row_start, row_stop, col_start, col_stop)
+
+    Returns:
+        np.ndarray: Layer index of every window
+    """
+    layers = np.zeros(len(windows), dtype=np.int64)
+    if len(windows) < 2:
+        return layers
+
+    # Shrink the boxes so windows that only touch along an edge do not intersect
+    boxes = shapely.box(
+        windows[:, 2] + 0.25,
+        windows[:, 0] + 0.25,
+        windows[:, 3] - 0.25,
+        windows[:, 1] - 0.25,
+    )
+    first, second = shapely.STRtree(boxes).query(boxes, predicate="intersects")
+    pairs = first < second
+    if not pairs.any():
+        return layers
+
+    neighbours: dict[int, list[int]] = {}
+    for i, j in zip(first[pairs].tolist(), second[pairs].tolist()):
+        neighbours.setdefault(i, []).append(j)
+        neighbours.setdefault(j, []).append(i)
+
+    layers[:] = -1
+    for i in range(len(windows)):
+        used = {layers[j] for j in neighbours.get(i, []) if layers[j] >= 0}
+        layer = 0
+        while layer in used:
+            layer += 1
+        layers[i] = layer
+    return layers
+
+
+def count_pixels_in_window(
+    masks: list[np.ndarray],
+    window: Window,
+    geometries: np.ndarray,
+    src: DatasetReader | BitPackedRaster,
+    windows: np.ndarray,
+    circles: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Count the deforested pixels of many geometries over a single window of one
+    or more grid-aligned rasters.
+
+    The geometries are burned into integer label grids (one per label layer)
+    with `all_touched=True`, and the deforested pixels of every geometry are
+    counted with a single `np.bincount` pass per layer and raster. The label
+    grids are shared by all the rasters. Circles are not rasterized: their
+    pixel spans (see `get_circle_spans`) are counted from the cumulative sums
+    of the rows of the masks.
+
+    Args:
+        masks (list[np.ndarray]): Boolean array of the window of every raster,
+            True where the raster value is 1
+        window (Window): Window of the masks within the rasters
+        geometries (np.ndarray): Geometries in the raster CRS, inside the window
+        src (DatasetReader | BitPackedRaster): Raster dataset of the grid
+        windows (np.ndarray): Raster window of every geometry
+        circles (np.ndarray | None): Circle of every geometry kept as a circle
+            (see `get_raster_circles`), NaN for the others
+
+    Returns:
+        np.ndarray: Array of shape (rasters, geometries) with the number of
+        deforested pixels of every geometry in every raster
+    """
+    counts = np.zeros((len(masks), len(geometries)), dtype=np.int64)
+    is_circle = np.zeros(len(geometries), dtype=bool)
+    if circles is not None:
+        is_circle = ~np.isnan(circles[:, 2])
+
+    polygons = np.flatnonzero(~is_circle)
+    if len(polygons):
+        transform = src.window_transform(window)
+        layers = get_label_layers(windows[polygons])
+        for layer in range(int(layers.max()) + 1):
+            indexes = polygons[layers == layer]
+            labels = rasterize(
+                [(geometries[i], label + 1) for label, i in enumerate(indexes)],
+                out_shape=masks[0].shape,
+                transform=transform,
+                fill=0,
+                all_touched=True,
+                dtype="int32",
+            )
+            for counts_row, deforested in zip(counts, masks):
+                layer_counts = np.bincount(
+                    labels[deforested], minlength=len(indexes) + 1
+                )
+                counts_row[indexes] = layer_counts[1:]
+
+    circular = np.flatnonzero(is_circle)
+    if len(circular):
+        indexes, rows, col_starts, col_stops = get_circle_spans(
+            circles[circular], src.transform, windows[circular]
+        )
+        rows = rows - int(window.row_off)
+        col_starts = col_starts - int(window.col_off)
+        col_stops = col_stops - int(window.col_off)
+        for counts_row, deforested in zip(counts, masks):
+            cumulative = np.zeros(
+                (deforested.shape[0], deforested.shape[1] + 1), dtype=np.int32
+            )
+            np.cumsum(deforested, axis=1, out=cumulative[:, 1:])
+            span_counts = cumulative[rows, col_stops] - cumulative[rows, col_starts]
+            counts_row[circular] = np.bincount(
+                indexes, weights=span_counts, minlength=len(circular)
+            )
+    return counts
+
+
+def get_grid_key(src: DatasetReader | BitPackedRaster) -> tuple:
+    """
+    Key of the pixel grid of a raster: its CRS, transform, size and block shape.
+
+    Rasters with the same key are grid-aligned, so the same windows and label
+    grids are valid for all of them (see `count_deforested_pixels_stack`).
+    """
+    return (
+        src.crs.to_wkt(),
+        tuple(round(value, 12) for value in tuple(src.transform)[:6]),
+        src.width,
+        src.height,
+        tuple(src.block_shapes[0]),
+    )
+
+
+def count_deforested_pixels(
+    polygons: list[BaseGeometry] | PreparedFarms,
+    src: DatasetReader | BitPackedRaster,
+    stats: ReadStats | None = None,
+    pyramid: OccupancyPyramid | None = None,
+) -> list[int | None]:
+    """
+    Count the deforested pixels (value 1) inside many polygons at once.
+
+    This is the zonal statistics counterpart of calling
+    `get_map_pixels_inside_polygon` for every polygon: pixels are selected with
+    the same `all_touched` rule over the same raster grid, but the raster is
+    read once per block-aligned region of nearby farms (see BlockReadPlanner)
+    instead of once per farm. When the occupancy pyramid of the raster is
+    available, farms whose blocks have no deforestation get a count of 0
+    without reading the raster, and only the blocks with deforestation are
+    read for the rest.
+
+    Args:
+        polygons (list[BaseGeometry] | PreparedFarms): Polygons in WGS84
+            (EPSG:4326), or the prepared farms of the request
+        src (DatasetReader | BitPackedRaster): Raster dataset, or its bit-packed
+            deforestation mask
+        stats (ReadStats | None): Optional counters updated with the reads done
+        pyramid (OccupancyPyramid | None): Occupancy pyramid of the raster
+
+    Returns:
+        list[int | None]: Deforested pixel count of every polygon, or None when
+        the polygon does not overlap the raster or its window cannot be read
+    """
+    return count_deforested_pixels_stack(polygons, [src], stats, [pyramid])[0]
+
+
+def count_deforested_pixels_stack(
+    polygons: list[BaseGeometry] | PreparedFarms,
+    sources: list[DatasetReader | BitPackedRaster],
+    stats: ReadStats | None = None,
+    pyramids: list[OccupancyPyramid | None] | None = None,
+) -> list[list[int | None]]:
+    """
+    Count the deforested pixels inside many polygons in several grid-aligned
+    rasters (see `get_grid_key`) with a single pass over the polygons.
+
+    The polygons are reprojected, planned into read regions and rasterized once;
+    every raster then only pays for reading its own blocks and a `np.bincount`
+    pass. Farms get a count of 0 without reading any raster when the occupancy
+    pyramids of all the rasters have no deforestation in their blocks.
+
+    Args:
+        polygons (list[BaseGeometry] | PreparedFarms): Polygons in WGS84
+            (EPSG:4326), or the prepared farms of the request
+        sources (list[DatasetReader | BitPackedRaster]): Grid-aligned rasters
+        stats (ReadStats | None): Optional counters updated with the reads done
+        pyramids (list[OccupancyPyramid | None] | None): Occupancy pyramid of
+            every raster, if available
+
+    Returns:
+        list[list[int | None]]: Deforested pixel counts of every polygon, for
+        every raster, as returned by `count_deforested_pixels`
+    """
+    if pyramids is None:
+        pyramids = [None] * len(sources)
+    counts: list[list[int | None]] = [[None] * len(polygons) for _ in sources]
+    if not polygons:
+        return counts
+
+    src = sources[0]
+    geometries = project_polygons(polygons, src.crs)
+    windows = get_pixel_windows(geometries, src)
+    overlapping = np.flatnonzero(windows[:, 1] > windows[:, 0])
+    circles = get_raster_circles(polygons, src)
+
+    planners = [
+        BlockReadPlanner(source, pyramid=pyramid)
+        for source, pyramid in zip(sources, pyramids)
+    ]
+    if all(pyramid is not None for pyramid in pyramids) and len(overlapping):
+        block_bounds = planners[0].get_block_bounds(windows[overlapping])
+        empty = np.logical_and.reduce(
+            [pyramid.count_windows(block_bounds) == 0 for pyramid in pyramids]
+        )
+        for source_counts in counts:
+            for i in overlapping[empty].tolist():
+                source_counts[i] = 0
+        for planner in planners:
+            planner.stats.farms_skipped += int(empty.sum())
+        overlapping = overlapping[~empty]
+
+    # The farms are planned once; every raster reads its own blocks of the
+    # regions, skipping those without deforestation in its pyramid
+    regions = planners[0].plan(windows, overlapping)
+    plans = [regions] + [planner.share(regions) for planner in planners[1:]]
+    for regions in zip(*plans):
+        window = planners[0].get_region_window(regions[0])
+        members = regions[0].members
+        try:
+            masks = [
+                planner.read_region(region)
+                for planner, region in zip(planners, regions)
+            ]
+            region_counts = count_pixels_in_window(
+                masks,
+                window,
+                geometries[members],
+                src,
+                windows[members],
+                None if circles is None else circles[members],
+            )
+        except Exception as e:
+            print(f"Error reading window {window}: {e}")
+            continue
+        finally:
+            for planner, region in zip(planners, regions):
+                planner.release(region)
+        for source_counts, values in zip(counts, region_counts.tolist()):
+            for i, count in zip(members.tolist(), values):
+                source_counts[i] = count
+
+    if stats is not None:
+        for planner in planners:
+            stats.merge(planner.stats)
+    return counts
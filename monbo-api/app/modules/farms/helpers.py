@@ -1,6 +1,6 @@
-from app.utils.farms import parse_base_information
+from app.utils.farms import parse_farms_base_information
 from app.models.farms import PreProcessedFarmData, FarmData
 
 
 def generate_farms(preprocessed_farms: list[PreProcessedFarmData]) -> list[FarmData]:
-    return [parse_base_information(farm) for farm in preprocessed_farms]
+    return parse_farms_base_information(preprocessed_farms)
@@ -1,23 +1,142 @@
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Iterator, List
 
 from app.models.polygons import Point
+import numpy as np
+import shapely
 from shapely import STRtree
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry import Polygon
 from app.helpers.GeometryCalculator import GeometryCalculator
-from app.config.env import OVERLAP_THRESHOLD_PERCENTAGE
-from app.models.farms import FarmPolygonDetailDataWithPolygon
+from app.config.env import (
+    ANALYSIS_MAX_WORKERS,
+    OVERLAP_THRESHOLD_PERCENTAGE,
+    VALIDATION_CHUNK_SIZE,
+)
+from app.helpers.PreparedFarms import PreparedFarms
 from shapely.validation import explain_validity
+from app.utils.graphs import connected_components
+from app.utils.process_pool import get_process_pool
 
 
-def detect_overlaps(polygons: List[Polygon]):
+def get_candidate_pairs(geometries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find every pair of polygons whose bounding boxes intersect, with a single
+    bulk `STRtree.query`.
+
+    Args:
+        geometries (np.ndarray): Polygons to check for overlaps. None entries
+            are ignored.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Index of the first and of the second
+        polygon of every pair (first < second), sorted
+    """
+    candidates = np.flatnonzero(np.not_equal(geometries, None))
+    tree = STRtree(geometries[candidates])
+    first, second = tree.query(geometries[candidates])
+    # Every pair is found twice (and every polygon intersects itself)
+    keep = first < second
+    first, second = candidates[first[keep]], candidates[second[keep]]
+    order = np.lexsort((second, first))
+    return first[order], second[order]
+
+
+def filter_overlapping_pairs(
+    geometries: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    circles: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Keep the candidate pairs of valid polygons that actually intersect.
+
+    Point farms kept as circles are tested in closed form: two circles
+    intersect when their centers are at most the sum of their radii apart, and
+    a circle intersects a polygon when its center is within its radius of the
+    polygon.
+
+    Args:
+        geometries (np.ndarray): Polygons
+        first (np.ndarray): Index of the first polygon of every candidate pair
+        second (np.ndarray): Index of the second polygon of every candidate pair
+        circles (np.ndarray | None): Longitude, latitude and radius (in degrees)
+            of every polygon kept as a circle (see `PreparedFarms.circles`)
+
+    Returns:
+        np.ndarray: Positions of the intersecting pairs in the candidate arrays
+    """
+    is_circle = np.zeros(len(geometries), dtype=bool)
+    if circles is not None:
+        is_circle = ~np.isnan(circles[:, 2])
+
+    # Circles are always valid
+    involved = np.unique(np.concatenate([first, second]))
+    involved = involved[~is_circle[involved]]
+    valid = is_circle.copy()
+    valid[involved] = shapely.is_valid(geometries[involved])
+    positions = np.flatnonzero(valid[first] & valid[second])
+    first, second = first[positions], second[positions]
+
+    intersects = np.zeros(len(positions), dtype=bool)
+    both = is_circle[first] & is_circle[second]
+    if both.any():
+        centers_distances = np.hypot(
+            circles[first[both], 0] - circles[second[both], 0],
+            circles[first[both], 1] - circles[second[both], 1],
+        )
+        intersects[both] = (
+            centers_distances <= circles[first[both], 2] + circles[second[both], 2]
+        )
+    one = is_circle[first] != is_circle[second]
+    if one.any():
+        circle = np.where(is_circle[first], first, second)[one]
+        polygon = np.where(is_circle[first], second, first)[one]
+        intersects[one] = shapely.dwithin(
+            geometries[polygon],
+            shapely.points(circles[circle, :2]),
+            circles[circle, 2],
+        )
+    neither = ~(both | one)
+    intersects[neither] = shapely.intersects(
+        geometries[first[neither]], geometries[second[neither]]
+    )
+    return positions[intersects]
+
+
+def get_overlapping_pairs(
+    polygons: List[Polygon | None] | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find every pair of intersecting valid polygons and their intersections.
+
+    Args:
+        polygons (List[Polygon | None] | np.ndarray): Polygons to check for
+            overlaps. None entries and invalid polygons are ignored.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Index of the first and of the
+        second polygon of every pair (first < second, sorted), and the
+        intersection geometry of every pair
+    """
+    geometries = np.empty(len(polygons), dtype=object)
+    geometries[:] = polygons
+    first, second = get_candidate_pairs(geometries)
+    positions = filter_overlapping_pairs(geometries, first, second)
+    first, second = first[positions], second[positions]
+    intersections = shapely.intersection(geometries[first], geometries[second])
+    return first, second, intersections
+
+
+def detect_overlaps(polygons: List[Polygon | None]):
     """
     Check for overlapping polygons and return the intersections.
     This function takes a list of polygons and checks for any overlaps between them.
     If overlaps are found, it returns a list of dictionaries containing the intersection
     polygons and the indices of the overlapping polygons.
     Args:
-        polygons (List[Polygon]): A list of Polygon objects to check for overlaps.
+        polygons (List[Polygon | None]): A list of Polygon objects to check for
+            overlaps. None entries are ignored.
     Returns:
         List[Dict[str, Union[Polygon, int]]]: A list of dictionaries, each containing:
             - "intersection_polygon" (Polygon): The polygon representing the
@@ -25,29 +144,15 @@ def detect_overlaps(polygons: List[Polygon]):
             - "polygon1_idx" (int): The index of the first polygon in the overlap.
             - "polygon2_idx" (int): The index of the second polygon in the overlap.
     """
-    tree = STRtree(polygons)
-
-    overlaps = []
-    polygons_intersections_index = []
-
-    for i in range(0, len(polygons)):
-        for idx in tree.query(polygons[i]):
-            if idx == i or f"{idx}-{i}" in polygons_intersections_index:
-                continue
-            if not polygons[i].is_valid or not polygons[idx].is_valid:
-                continue
-
-            if polygons[i].intersects(polygons[idx]):
-                polygons_intersections_index.append(f"{i}-{idx}")
-                overlaps.append(
-                    {
-                        "intersection_polygon": polygons[i].intersection(polygons[idx]),
-                        "polygon1_idx": i,
-                        "polygon2_idx": int(idx),
-                    }
-                )
-
-    return overlaps
+    first, second, intersections = get_overlapping_pairs(polygons)
+    return [
+        {
+            "intersection_polygon": intersection,
+            "polygon1_idx": i,
+            "polygon2_idx": j,
+        }
+        for i, j, intersection in zip(first.tolist(), second.tolist(), intersections)
+    ]
 
 
 def get_geometry_paths(geometry: BaseGeometry) -> list[list[Point]]:
@@ -79,85 +184,559 @@ def get_geometry_paths(geometry: BaseGeometry) -> list[list[Point]]:
     raise ValueError(f"Unsupported geometry type: {geometry.geom_type}")
 
 
-def get_overlap_inconsistencies(farms: list[FarmPolygonDetailDataWithPolygon]):
-    polygons = list(map(lambda x: x.polygon, farms))
+def get_duplicate_labels(farms: PreparedFarms) -> np.ndarray:
+    """
+    Group the farms with the same polygon, comparing their fingerprints in a
+    single pass.
+
+    Args:
+        farms (PreparedFarms): Prepared farms
+
+    Returns:
+        np.ndarray: Index of the first farm with the same polygon of every farm
+        (its own index if it is the first one, or if it has no polygon or an
+        empty one)
+    """
+    labels = np.arange(len(farms))
+    first_indexes: dict[bytes, int] = {}
+    empty = shapely.is_empty(farms.geometries)
+    for i, fingerprint in enumerate(farms.fingerprints.tolist()):
+        if fingerprint is not None and not empty[i]:
+            labels[i] = first_indexes.setdefault(fingerprint, i)
+    return labels
+
+
+def get_duplicate_inconsistencies(
+    farms: PreparedFarms, request_size: int | None = None
+) -> list[dict]:
+    """
+    Find the farms with the same polygon (up to ~1 cm), in linear time.
+
+    Args:
+        farms (PreparedFarms): Prepared farms
+        request_size (int | None): Number of farms of the request, at the start
+            of `farms`. Groups of duplicates made only of the farms after them
+            are not reported. All the groups are reported by default
 
-    overlaps = detect_overlaps(polygons)
+    Returns:
+        list: Duplicate inconsistency of every group of farms with the same
+        polygon
+    """
+    labels = get_duplicate_labels(farms)
+    groups: dict[int, list[int]] = {}
+    for i, label in enumerate(labels.tolist()):
+        groups.setdefault(label, []).append(i)
 
     inconsistencies = []
-    for overlap in overlaps:
-        overlap_area = GeometryCalculator.calculate_polygon_area(
-            overlap["intersection_polygon"]
+    for first_index, indexes in groups.items():
+        # Request farms come first, so groups with one of them start with it
+        if len(indexes) < 2 or (
+            request_size is not None and first_index >= request_size
+        ):
+            continue
+        polygon = farms.geometries[first_index]
+        centroid = polygon.centroid
+        inconsistencies.append(
+            {
+                "type": "duplicate_polygon",
+                "farmIds": [farms.ids[i] for i in indexes],
+                "data": {
+                    "area": float(farms.areas[first_index]),
+                    "center": {"lng": centroid.x, "lat": centroid.y},
+                    "paths": get_geometry_paths(polygon),
+                },
+            }
         )
+    return inconsistencies
 
-        overlap_farms_ids = [
-            farms[overlap["polygon1_idx"]].id,
-            farms[overlap["polygon2_idx"]].id,
-        ]
 
-        overlap_polygons = [
-            polygons[overlap["polygon1_idx"]],
-            polygons[overlap["polygon2_idx"]],
-        ]
-        overlap_polygons_area = sum(
-            [
-                GeometryCalculator.calculate_polygon_area(polygon)
-                for polygon in overlap_polygons
-            ]
+def _get_farm_areas(
+    farms: PreparedFarms, indexes: np.ndarray, exact: np.ndarray
+) -> np.ndarray:
+    """
+    Areas of farms to compare with their overlaps: the closed-form areas where
+    the overlaps are computed in closed form (`exact`), and the areas of the
+    polygons the overlaps are computed from elsewhere.
+    """
+    return np.where(exact, farms.areas[indexes], farms.polygon_areas[indexes])
+
+
+def _get_pair_overlaps(
+    farms: PreparedFarms, first: np.ndarray, second: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the overlap of pairs of intersecting farms.
+
+    The overlaps of two circles are computed in closed form, and their
+    intersection polygon is not built (its entry is None).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Intersection, overlap area
+        and overlap ratio (overlap area over union area) of every pair
+    """
+    geometries, circles = farms.geometries, farms.circles
+    both = farms.is_circle[first] & farms.is_circle[second]
+    intersections = np.full(len(first), None, dtype=object)
+    intersections[~both] = shapely.intersection(
+        geometries[first[~both]], geometries[second[~both]]
+    )
+    overlap_areas = np.empty(len(first))
+    overlap_areas[~both] = GeometryCalculator.calculate_polygon_areas(
+        intersections[~both]
+    )
+    overlap_areas[both] = GeometryCalculator.calculate_circle_overlap_areas(
+        circles[first[both]], circles[second[both]]
+    )
+    # Farm areas are computed once, not once per overlap. The union area is
+    # the total area minus the double-counted overlap. Overlaps computed from
+    # the polygons are compared with the areas of the same polygons
+    areas = _get_farm_areas(farms, np.column_stack([first, second]), both[:, None])
+    union_areas = areas.sum(axis=1) - overlap_areas
+
+    # Handle the case where polygons are identical or nearly identical
+    # Using a small epsilon for floating point comparison. Ratios are capped
+    # at 100%
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overlap_ratios = np.where(
+            np.abs(overlap_areas - union_areas) < 1e-10,
+            1.0,
+            np.minimum(1.0, overlap_areas / union_areas),
         )
+    return intersections, overlap_areas, overlap_ratios
 
-        # Calculate the union area (total area minus the double-counted overlap)
-        union_area = overlap_polygons_area - overlap_area
 
-        # Handle the case where polygons are identical or nearly identical
-        # Using a small epsilon for floating point comparison
-        if abs(overlap_area - union_area) < 1e-10:
-            overlap_ratio = 1.0  # 100% overlap
-        else:
-            overlap_ratio = min(1.0, overlap_area / union_area)  # Cap at 100%
+def get_pairs_overlap_inconsistencies(
+    farms: PreparedFarms, first: np.ndarray, second: np.ndarray
+) -> tuple[np.ndarray, list[dict]]:
+    """
+    Compute the overlap inconsistencies of candidate pairs of farms.
 
-        if 100 * overlap_ratio > OVERLAP_THRESHOLD_PERCENTAGE:
-            inconsistencies.append(
-                {
-                    "type": "overlap",
-                    "farmIds": overlap_farms_ids,
-                    "data": {
-                        "percentage": overlap_ratio,
-                        "criticality": "HIGH" if overlap_ratio > 0.8 else "MEDIUM",
-                        "area": overlap_area,
-                        "center": {
-                            "lng": overlap["intersection_polygon"].centroid.x,
-                            "lat": overlap["intersection_polygon"].centroid.y,
-                        },
-                        "paths": get_geometry_paths(overlap["intersection_polygon"]),
-                    },
-                }
+    This is the unit of work executed by the pool workers, on the farms of a
+    few connected components of the candidate pairs.
+
+    Args:
+        farms (PreparedFarms): Prepared farms
+        first (np.ndarray): Index in `farms` of the first farm of every pair
+        second (np.ndarray): Index in `farms` of the second farm of every pair
+
+    Returns:
+        tuple[np.ndarray, list[dict]]: Position in the candidate arrays of the
+        pair of every inconsistency, and the inconsistencies
+    """
+    geometries = farms.geometries
+    positions = filter_overlapping_pairs(geometries, first, second, farms.circles)
+    first, second = first[positions], second[positions]
+    intersections, overlap_areas, overlap_ratios = _get_pair_overlaps(
+        farms, first, second
+    )
+
+    reported = np.flatnonzero(100 * overlap_ratios > OVERLAP_THRESHOLD_PERCENTAGE)
+    pending = reported[np.equal(intersections[reported], None)]
+    intersections[pending] = shapely.intersection(
+        geometries[first[pending]], geometries[second[pending]]
+    )
+    inconsistencies = []
+    for k in reported:
+        overlap_ratio = float(overlap_ratios[k])
+        intersection = intersections[k]
+        centroid = intersection.centroid
+        inconsistencies.append(
+            {
+                "type": "overlap",
+                "farmIds": [farms.ids[first[k]], farms.ids[second[k]]],
+                "data": {
+                    "percentage": overlap_ratio,
+                    "criticality": "HIGH" if overlap_ratio > 0.8 else "MEDIUM",
+                    "area": float(overlap_areas[k]),
+                    "center": {"lng": centroid.x, "lat": centroid.y},
+                    "paths": get_geometry_paths(intersection),
+                },
+            }
+        )
+    return positions[reported], inconsistencies
+
+
+def _plan_overlap_tasks(
+    farms: PreparedFarms,
+    first: np.ndarray,
+    second: np.ndarray,
+    chunk_size: int,
+    split_components: bool = True,
+    labels: np.ndarray | None = None,
+) -> Iterator[tuple[np.ndarray, tuple]]:
+    """
+    Split the candidate pairs into tasks of about `chunk_size` pairs.
+
+    Pairs are grouped by connected component of the candidate graph, so the
+    farms of a component are sent to as few tasks as possible. Every pair is
+    processed by exactly one task, wherever it lies. With `split_components`
+    disabled, tasks are extended to the end of their last component, so every
+    component is processed whole by a single task. With duplicate `labels`
+    (see `get_duplicate_labels`), the duplicates of the farms of a task are
+    sent with them, and the task gets their labels as a last argument.
+
+    Yields:
+        tuple[np.ndarray, tuple]: Position of the pairs of the task in the
+        candidate arrays, and the arguments of the task
+    """
+    components = connected_components(len(farms), first, second)
+    order = np.argsort(components[first], kind="stable")
+    # Position after the last pair of every component
+    ends = np.append(np.flatnonzero(np.diff(components[first][order])) + 1, len(order))
+    start = 0
+    while start < len(order):
+        stop = min(start + chunk_size, len(order))
+        if not split_components:
+            stop = int(ends[np.searchsorted(ends, stop)])
+        pairs = order[start:stop]
+        start = stop
+        indexes, local = np.unique(
+            np.concatenate([first[pairs], second[pairs]]), return_inverse=True
+        )
+        if labels is None:
+            yield pairs, (
+                farms.subset(indexes.tolist()),
+                local[: len(pairs)],
+                local[len(pairs) :],
             )
-    return inconsistencies
+            continue
+        indexes = np.flatnonzero(np.isin(labels, indexes))
+        local = np.searchsorted(indexes, np.concatenate([first[pairs], second[pairs]]))
+        yield pairs, (
+            farms.subset(indexes.tolist()),
+            local[: len(pairs)],
+            local[len(pairs) :],
+            np.searchsorted(indexes, labels[indexes]),
+        )
+
+
+def get_overlap_inconsistencies(
+    farms: PreparedFarms,
+    max_workers: int = ANALYSIS_MAX_WORKERS,
+    chunk_size: int = VALIDATION_CHUNK_SIZE,
+    request_size: int | None = None,
+):
+    """
+    Find the farms whose polygons overlap.
+
+    Candidate pairs are found with a single bulk spatial index query, then
+    their intersections and areas are computed in the worker pool, a chunk of
+    connected components of the candidate pairs per task. Inconsistencies are
+    returned in the order of the pairs, whatever the number of workers.
+
+    Args:
+        farms (PreparedFarms): Prepared farms of the request
+        max_workers (int): Number of worker processes of the pool
+        chunk_size (int): Number of candidate pairs of every task
+        request_size (int | None): Number of farms of the request, at the start
+            of `farms`. The farms after them (e.g. their neighbours in the farm
+            registry) are only checked against the request farms. All the farms
+            are checked against each other by default
+
+    Returns:
+        list: Overlap inconsistency of every pair of overlapping farms
+    """
+    first, second = get_candidate_pairs(farms.geometries)
+    # Pairs of duplicate polygons are reported by `get_duplicate_inconsistencies`
+    labels = get_duplicate_labels(farms)
+    keep = labels[first] != labels[second]
+    if request_size is not None:
+        keep &= first < request_size
+    first, second = first[keep], second[keep]
+    if max_workers <= 1 or len(first) <= chunk_size:
+        return get_pairs_overlap_inconsistencies(farms, first, second)[1]
+
+    tasks = _plan_overlap_tasks(farms, first, second, chunk_size)
+    return _run_overlap_tasks(get_pairs_overlap_inconsistencies, tasks, max_workers)
+
+
+def _run_overlap_tasks(
+    function: Callable[..., tuple[np.ndarray, list[dict]]],
+    tasks: Iterator[tuple[np.ndarray, tuple]],
+    max_workers: int,
+) -> list[dict]:
+    """
+    Run overlap tasks (see `_plan_overlap_tasks`) in the worker pool.
+
+    Returns:
+        list: Inconsistencies of every task, in the order of the pairs they
+        were found from
+    """
+    pool = get_process_pool(max_workers)
+    running: dict[Future, np.ndarray] = {}
+    results = []
+    try:
+        # At most two tasks per worker are in flight, so the subsets of farms
+        # sent to the workers do not pile up in memory
+        while True:
+            while len(running) < 2 * max_workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pairs, arguments = task
+                future = pool.submit(function, *arguments)
+                running[future] = pairs
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                pairs = running.pop(future)
+                positions, inconsistencies = future.result()
+                results.extend(zip(pairs[positions].tolist(), inconsistencies))
+    finally:
+        for future in running:
+            future.cancel()
+
+    results.sort(key=lambda result: result[0])
+    return [inconsistency for _, inconsistency in results]
+
+
+def get_overlap_cluster(
+    farms: PreparedFarms, members: np.ndarray
+) -> tuple[BaseGeometry, float, np.ndarray]:
+    """
+    Compute the overlapped region of a cluster of overlapping farms at once.
+
+    The boundaries of the farms are noded and polygonized into the faces of
+    their overlay. Every face is covered by the farms containing a point of
+    its interior, and the faces covered by two or more farms form the
+    overlapped region. Its cost grows with the size of the overlay, not with
+    the number of overlapping pairs. The shares are relative to the areas of
+    the same polygons, including the ones approximating circle farms.
+
+    Args:
+        farms (PreparedFarms): Prepared farms
+        members (np.ndarray): Index of the farms of the cluster
+
+    Returns:
+        tuple[BaseGeometry, float, np.ndarray]: Overlapped region, its area, and
+        the share of the area of every farm overlapped by other farms
+    """
+    polygons = farms.geometries[members]
+    faces = shapely.get_parts(
+        shapely.polygonize(
+            shapely.get_parts(shapely.union_all(shapely.boundary(polygons)))
+        )
+    )
+    # Points of the interior of the faces, tested against the (prepared)
+    # polygons of the farms
+    polygon_indexes, face_indexes = STRtree(shapely.point_on_surface(faces)).query(
+        polygons, predicate="contains_properly"
+    )
+    coverage = np.bincount(face_indexes, minlength=len(faces))
+    overlapped = coverage[face_indexes] > 1
+    face_areas = np.zeros(len(faces))
+    face_areas[coverage > 1] = GeometryCalculator.calculate_polygon_areas(
+        faces[coverage > 1]
+    )
+    overlap_areas = np.bincount(
+        polygon_indexes[overlapped],
+        weights=face_areas[face_indexes[overlapped]],
+        minlength=len(members),
+    )
+    # Faces do not overlap each other, so they are merged as a coverage
+    region = shapely.coverage_union_all(faces[coverage > 1])
+    return (
+        region,
+        float(face_areas.sum()),
+        _get_overlap_shares(overlap_areas, farms.polygon_areas[members]),
+    )
+
+
+def _get_overlap_shares(overlap_areas: np.ndarray, areas: np.ndarray) -> np.ndarray:
+    """Share of the areas that is overlapped, capped at 100%."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = np.minimum(1.0, overlap_areas / areas)
+    return np.nan_to_num(shares, nan=1.0)
+
+
+def get_pairs_overlap_clusters(
+    farms: PreparedFarms,
+    first: np.ndarray,
+    second: np.ndarray,
+    labels: np.ndarray | None = None,
+) -> tuple[np.ndarray, list[dict]]:
+    """
+    Compute the overlap clusters of candidate pairs of farms: the connected
+    components of the graph of their pairs overlapping above the threshold of
+    `get_pairs_overlap_inconsistencies`.
+
+    The overlapped region of a cluster of two farms is their intersection, and
+    those clusters are computed together as in
+    `get_pairs_overlap_inconsistencies`. Larger clusters are computed one by
+    one with `get_overlap_cluster`.
+
+    This is the unit of work executed by the pool workers, on whole connected
+    components of the candidate pairs.
+
+    Args:
+        farms (PreparedFarms): Prepared farms
+        first (np.ndarray): Index in `farms` of the first farm of every pair
+        second (np.ndarray): Index in `farms` of the second farm of every pair
+        labels (np.ndarray | None): Duplicate label of every farm (see
+            `get_duplicate_labels`). The pairs are made of the first farm of
+            every group of duplicates, and the other farms of the group are
+            listed in its clusters with the same share
+
+    Returns:
+        tuple[np.ndarray, list[dict]]: Position in the candidate arrays of the
+        first pair of every reported cluster, and the cluster inconsistencies
+    """
+    geometries = farms.geometries
+    positions = filter_overlapping_pairs(geometries, first, second, farms.circles)
+    first, second = first[positions], second[positions]
+    intersections, overlap_areas, overlap_ratios = _get_pair_overlaps(
+        farms, first, second
+    )
+    # Farms are clustered by the overlaps reported in pairwise mode, so farms
+    # that only touch (or barely overlap) are not chained into a cluster
+    keep = np.flatnonzero(100 * overlap_ratios > OVERLAP_THRESHOLD_PERCENTAGE)
+    positions, first, second = positions[keep], first[keep], second[keep]
+    intersections, overlap_areas = intersections[keep], overlap_areas[keep]
+    components = connected_components(len(farms), first, second)
+    sizes = np.bincount(components)
+
+    # Clusters are reported at their first pair, the pair of their lowest farm
+    clusters: list[tuple[int, np.ndarray, BaseGeometry, float, np.ndarray]] = []
+
+    # Clusters of two farms (made of a single pair)
+    pairs = np.flatnonzero(sizes[components[first]] == 2)
+    pending = pairs[np.equal(intersections[pairs], None)]
+    intersections[pending] = shapely.intersection(
+        geometries[first[pending]], geometries[second[pending]]
+    )
+    members = np.column_stack([first[pairs], second[pairs]])
+    areas = _get_farm_areas(
+        farms, members, farms.is_circle[members].all(axis=1)[:, None]
+    )
+    shares = _get_overlap_shares(overlap_areas[pairs, None], areas).reshape(-1, 2)
+    for k, pair_members, pair_shares in zip(pairs, members, shares):
+        clusters.append(
+            (k, pair_members, intersections[k], overlap_areas[k], pair_shares)
+        )
+
+    # Larger clusters
+    larger = np.flatnonzero(sizes[components[first]] > 2)
+    larger = larger[np.unique(components[first[larger]], return_index=True)[1]]
+    for k in larger:
+        members = np.flatnonzero(components == components[first[k]])
+        clusters.append((k, members, *get_overlap_cluster(farms, members)))
+
+    clusters.sort(key=lambda cluster: cluster[0])
+    cluster_positions, inconsistencies = [], []
+    for k, members, region, area, shares in clusters:
+        if labels is not None:
+            # Members are sorted, and their duplicates are listed with them
+            duplicates = np.flatnonzero(np.isin(labels, members))
+            shares = shares[np.searchsorted(members, labels[duplicates])]
+            members = duplicates
+        max_share = float(shares.max())
+        centroid = region.centroid
+        cluster_positions.append(positions[k])
+        inconsistencies.append(
+            {
+                "type": "overlap_cluster",
+                "farmIds": [farms.ids[i] for i in members.tolist()],
+                "data": {
+                    "percentages": shares.tolist(),
+                    "criticality": "HIGH" if max_share > 0.8 else "MEDIUM",
+                    "area": float(area),
+                    "center": {"lng": centroid.x, "lat": centroid.y},
+                    "paths": get_geometry_paths(region),
+                },
+            }
+        )
+    return np.array(cluster_positions, dtype=np.int64), inconsistencies
 
 
-def get_geometry_inconsistencies(farms: list[FarmPolygonDetailDataWithPolygon]):
+def get_overlap_cluster_inconsistencies(
+    farms: PreparedFarms,
+    max_workers: int = ANALYSIS_MAX_WORKERS,
+    chunk_size: int = VALIDATION_CHUNK_SIZE,
+    request_size: int | None = None,
+):
+    """
+    Find the clusters of overlapping farms, reporting one inconsistency per
+    cluster instead of one per overlapping pair (see
+    `get_overlap_inconsistencies`).
+
+    A cluster of n mutually overlapping farms is reported once, with the
+    overlapped region computed once, instead of in n * (n - 1) / 2 pairs.
+    Clusters are processed in the worker pool, whole clusters per task.
+
+    Args:
+        farms (PreparedFarms): Prepared farms of the request
+        max_workers (int): Number of worker processes of the pool
+        chunk_size (int): Number of candidate pairs of every task
+        request_size (int | None): Number of farms of the request, at the start
+            of `farms`. Only the overlaps with the request farms are checked
+
+    Returns:
+        list: Overlap cluster inconsistency of every cluster with an overlap
+        above the threshold, in the order of their lowest farm
+    """
+    first, second = get_candidate_pairs(farms.geometries)
+    # Pairs of duplicate polygons are reported by
+    # `get_duplicate_inconsistencies`. The other pairs of a duplicate are
+    # clustered as pairs of the first farm with the same polygon, and the
+    # duplicate is listed in its cluster
+    labels = get_duplicate_labels(farms)
+    keep = labels[first] != labels[second]
+    if request_size is not None:
+        keep &= first < request_size
+    first, second = labels[first[keep]], labels[second[keep]]
+    pairs = np.unique(
+        np.column_stack([np.minimum(first, second), np.maximum(first, second)]),
+        axis=0,
+    )
+    first, second = pairs[:, 0], pairs[:, 1]
+    if np.array_equal(labels, np.arange(len(farms))):
+        labels = None
+    if max_workers <= 1 or len(first) <= chunk_size:
+        return get_pairs_overlap_clusters(farms, first, second, labels)[1]
+
+    tasks = _plan_overlap_tasks(
+        farms, first, second, chunk_size, split_components=False, labels=labels
+    )
+    return _run_overlap_tasks(get_pairs_overlap_clusters, tasks, max_workers)
+
+
+def get_geometry_inconsistencies(farms: PreparedFarms):
     """
     Check for other types of polygon inconsistencies:
-    - Invalid polygons (not valid geometry)
+    - Empty polygons
+    - Invalid polygons (not valid geometry, or a polygon that cannot be built)
 
     Args:
-        farms (list[FarmWithPolygon]): List of farms with polygon data
+        farms (PreparedFarms): Prepared farms of the request
 
     Returns:
         list: List of inconsistency dictionaries for other types of issues
     """
     inconsistencies = []
 
-    for farm in farms:
-        polygon: BaseGeometry = farm.polygon
+    for i, farm_id in enumerate(farms.ids):
+        polygon: BaseGeometry | None = farms.geometries[i]
+
+        # The polygon of the farm could not be built
+        if polygon is None:
+            inconsistencies.append(
+                {
+                    "type": "invalid_geometry",
+                    "farmIds": [farm_id],
+                    "data": {
+                        "reason": farms.errors.get(i, "Invalid geometry"),
+                    },
+                }
+            )
+            continue
 
         # Check if the polygon is empty
         if polygon.is_empty:
             inconsistencies.append(
                 {
                     "type": "empty_polygon",
-                    "farmIds": [farm.id],
+                    "farmIds": [farm_id],
                     "data": None,
                 }
             )
@@ -167,7 +746,7 @@ def get_geometry_inconsistencies(farms: list[FarmPolygonDetailDataWithPolygon]):
             inconsistencies.append(
                 {
                     "type": "invalid_geometry",
-                    "farmIds": [farm.id],
+                    "farmIds": [farm_id],
                     "data": {
                         "reason": explain_validity(polygon),
                     },
@@ -12,6 +12,20 @@ class OverlapData(BaseModel):
     criticality: Literal["HIGH", "MEDIUM"]
 
 
+class OverlapClusterData(BaseModel):
+    area: float
+    center: Coordinates
+    paths: list[list[Coordinates]]
+    percentages: list[float]
+    criticality: Literal["HIGH", "MEDIUM"]
+
+
+class DuplicatePolygonData(BaseModel):
+    area: float
+    center: Coordinates
+    paths: list[list[Coordinates]]
+
+
 class InvalidGeometryInconsistencyData(BaseModel):
     reason: str
 
@@ -19,7 +33,13 @@ class InvalidGeometryInconsistencyData(BaseModel):
 class PolygonInconsistency(BaseModel):
     type: str
     farmIds: list[str]
-    data: OverlapData | InvalidGeometryInconsistencyData | None
+    data: (
+        OverlapData
+        | OverlapClusterData
+        | DuplicatePolygonData
+        | InvalidGeometryInconsistencyData
+        | None
+    )
 
 
 class PolygonError(BaseModel):
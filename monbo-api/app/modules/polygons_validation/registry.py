@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import shapely
+from app.config.env import FARM_REGISTRY_PATH
+from app.config.logger import get_logger
+from app.helpers.PreparedFarms import PreparedFarms
+
+# Get logger for this module
+logger = get_logger("modules.polygons_validation.registry")
+
+
+class FarmRegistry:
+    """
+    Persisted registry of validated farm polygons.
+
+    Farms are stored in an SQLite database, as WKB, together with an R*Tree
+    index of their bounds. New batches of farms are validated against their
+    spatial neighbours in the registry only, so the cost of a validation
+    depends on the size of the batch, not on the size of the registry.
+
+    Args:
+        path: Path of the SQLite database. An empty value disables the registry
+    """
+
+    def __init__(self, path: str = FARM_REGISTRY_PATH):
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """Open the database on first use. Must be called holding the lock."""
+        if self._connection is None and self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS farms ("
+                    "id INTEGER PRIMARY KEY, "
+                    "farm_id TEXT NOT NULL UNIQUE, "
+                    "geometry BLOB NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS farm_bounds "
+                    "USING rtree(id, min_x, max_x, min_y, max_y)"
+                )
+                # Bounds of the farms of a batch, looked up in a single query
+                connection.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS batch_bounds ("
+                    "min_x REAL, max_x REAL, min_y REAL, max_y REAL)"
+                )
+                connection.commit()
+                self._connection = connection
+            except sqlite3.Error as e:
+                logger.warning("Farm registry disabled: %s", e)
+                self.path = ""
+        return self._connection
+
+    def get_neighbours(self, farms: PreparedFarms) -> PreparedFarms:
+        """
+        Return the registered farms whose bounds intersect those of a batch.
+
+        Registered farms with the id of a farm of the batch are left out: the
+        batch holds their new version.
+
+        Args:
+            farms (PreparedFarms): Prepared farms of the batch
+
+        Returns:
+            PreparedFarms: Registered neighbours of the batch, sorted by id
+        """
+        rows = {}
+        with self._lock:
+            connection = self._connect()
+            if connection is not None:
+                try:
+                    connection.executemany(
+                        "INSERT INTO batch_bounds (min_x, max_x, min_y, max_y) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (min_x, max_x, min_y, max_y)
+                            for min_x, min_y, max_x, max_y in farms.bounds[
+                                farms.valid
+                            ].tolist()
+                        ],
+                    )
+                    # Every batch farm is looked up in the R*Tree index, in the
+                    # inner loop of the join
+                    rows = dict(
+                        connection.execute(
+                            "SELECT farm_id, geometry FROM farms WHERE id IN ("
+                            "SELECT farm_bounds.id FROM batch_bounds "
+                            "CROSS JOIN farm_bounds "
+                            "WHERE farm_bounds.min_x <= batch_bounds.max_x "
+                            "AND farm_bounds.max_x >= batch_bounds.min_x "
+                            "AND farm_bounds.min_y <= batch_bounds.max_y "
+                            "AND farm_bounds.max_y >= batch_bounds.min_y)"
+                        ).fetchall()
+                    )
+                except sqlite3.Error as e:
+                    logger.warning("Error reading the farm registry: %s", e)
+                finally:
+                    # The bounds of the batch are not kept
+                    connection.rollback()
+
+        for farm_id in farms.ids:
+            rows.pop(farm_id, None)
+        ids = sorted(rows)
+        geometries = np.empty(len(ids), dtype=object)
+        geometries[:] = shapely.from_wkb([rows[farm_id] for farm_id in ids])
+        return PreparedFarms(ids, geometries)
+
+    def add(self, farms: PreparedFarms) -> int:
+        """
+        Register the farms of a batch, replacing the farms with the same id.
+        Farms without a polygon are not registered, and the last farm of the
+        batch with a given id is registered.
+
+        Returns:
+            int: Number of registered farms
+        """
+        last_indexes = {farms.ids[i]: i for i in np.flatnonzero(farms.valid).tolist()}
+        valid = np.array(sorted(last_indexes.values()), dtype=np.int64)
+        with self._lock:
+            connection = self._connect()
+            if connection is None or len(valid) == 0:
+                return 0
+            try:
+                ids = [farms.ids[i] for i in valid.tolist()]
+                wkbs = shapely.to_wkb(farms.geometries[valid])
+                connection.executemany(
+                    "DELETE FROM farm_bounds WHERE id = "
+                    "(SELECT id FROM farms WHERE farm_id = ?)",
+                    [(farm_id,) for farm_id in ids],
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO farms (farm_id, geometry) VALUES (?, ?)",
+                    zip(ids, wkbs.tolist()),
+                )
+                connection.executemany(
+                    "INSERT INTO farm_bounds (id, min_x, max_x, min_y, max_y) "
+                    "SELECT id, ?, ?, ?, ? FROM farms WHERE farm_id = ?",
+                    [
+                        (min_x, max_x, min_y, max_y, farm_id)
+                        for farm_id, (min_x, min_y, max_x, max_y) in zip(
+                            ids, farms.bounds[valid].tolist()
+                        )
+                    ],
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                connection.rollback()
+                logger.warning("Error writing the farm registry: %s", e)
+                return 0
+        return len(ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                return 0
+            return connection.execute("SELECT COUNT(*) FROM farms").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Shared farm registry of the API process
+farm_registry = FarmRegistry()
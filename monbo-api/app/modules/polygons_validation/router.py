@@ -1,15 +1,14 @@
-from app.models.farms import (
-    FarmPolygonDetailData,
-    FarmPolygonDetailDataWithPolygon,
-)
-from app.utils.polygons import generate_polygon
+from app.helpers.PreparedFarms import PreparedFarms
+from app.models.farms import FarmPolygonDetailData
 from fastapi import APIRouter
 from .helpers import (
+    get_duplicate_inconsistencies,
     get_geometry_inconsistencies,
+    get_overlap_cluster_inconsistencies,
     get_overlap_inconsistencies,
 )
 from .models import PolygonInconsistenciesResponse
-
+from .registry import farm_registry
 
 router = APIRouter()
 
@@ -21,6 +20,8 @@ router = APIRouter()
 )
 def get_polygon_inconsistencies(
     body: list[FarmPolygonDetailData],
+    register: bool = False,
+    clusters: bool = False,
 ) -> PolygonInconsistenciesResponse:
     """
     Validates a list of farm polygons by checking for overlaps and geometry
@@ -28,6 +29,12 @@ def get_polygon_inconsistencies(
 
     Args:
         body (list[FarmPolygon]): List of farm polygons to validate.
+        register (bool): Whether to add the farms accepted by the validation
+            (VALID) to the farm registry, so later requests are validated
+            against them.
+        clusters (bool): Whether to report every cluster of overlapping farms
+            as a single "overlap_cluster" inconsistency, with the overlapped
+            share of every farm, instead of one "overlap" per pair of farms.
 
     Returns:
         PolygonInconsistenciesResponse: A response object containing:
@@ -37,33 +44,15 @@ def get_polygon_inconsistencies(
               inconsistencies, which can be overlaps or geometry issues
 
     The function performs the following validations:
-    1. Converts the input FarmPolygons into Shapely geometry objects
-    2. Checks for overlapping polygons between farms
+    1. Converts the input FarmPolygons into prepared Shapely geometry objects
+    2. Checks for duplicate and overlapping polygons between farms, and with
+       the farms of the farm registry (if enabled) around them
     3. Validates the geometry of each polygon (e.g. self-intersections)
     4. Marks farms as "NOT_VALID" if they are involved in any inconsistency
     """
-    farms_polygons = []
-    for farm in body:
-        # Determine coordinates based on polygon type
-        if farm.type == "polygon":
-            coords = farm.details.path if farm.details else []
-            radius = None
-        else:
-            # Points always have farm.details
-            coords = [farm.details.center]
-            radius = farm.details.radius
-
-        polygon = generate_polygon(coords, radius)
-
-        # Create farm polygon object with all details
-        farms_polygons.append(
-            FarmPolygonDetailDataWithPolygon(
-                id=farm.id,
-                type=farm.type,
-                details=farm.details,
-                polygon=polygon,
-            )
-        )
+    # Build the farm polygons and their areas once, for every validation
+    farms = PreparedFarms.from_farms(body)
+    farms.prepare()
 
     # Initialize results with VALID status
     results = list(map(lambda x: {"farmId": x.id, "status": "VALID"}, body))
@@ -71,11 +60,27 @@ def get_polygon_inconsistencies(
     # Create a lookup dictionary for results for O(1) access
     results_lookup = {result["farmId"]: result for result in results}
 
-    # Get inconsistencies
-    overlap_inconsistencies = get_overlap_inconsistencies(farms_polygons)
-    geometry_inconsistencies = get_geometry_inconsistencies(farms_polygons)
+    # Get inconsistencies. Only the registered farms around the request farms
+    # are loaded, whatever the size of the registry
+    checked_farms = farms
+    if farm_registry.enabled:
+        checked_farms = farms.concatenate(farm_registry.get_neighbours(farms))
+    duplicate_inconsistencies = get_duplicate_inconsistencies(
+        checked_farms, request_size=len(farms)
+    )
+    if clusters:
+        overlap_inconsistencies = get_overlap_cluster_inconsistencies(
+            checked_farms, request_size=len(farms)
+        )
+    else:
+        overlap_inconsistencies = get_overlap_inconsistencies(
+            checked_farms, request_size=len(farms)
+        )
+    geometry_inconsistencies = get_geometry_inconsistencies(farms)
 
-    all_inconsistencies = overlap_inconsistencies + geometry_inconsistencies
+    all_inconsistencies = (
+        overlap_inconsistencies + duplicate_inconsistencies + geometry_inconsistencies
+    )
 
     # Create a set of farm IDs involved in inconsistencies for O(1) lookup
     invalid_farm_ids = {
@@ -84,9 +89,22 @@ def get_polygon_inconsistencies(
         for farm_id in inconsistency["farmIds"]
     }
 
-    # Update status for invalid farms
+    # Update status for invalid farms (registered farms have no result)
     for farm_id in invalid_farm_ids:
-        results_lookup[farm_id]["status"] = "NOT_VALID"
+        if farm_id in results_lookup:
+            results_lookup[farm_id]["status"] = "NOT_VALID"
+
+    # Only the farms accepted by the validation are registered
+    if register and farm_registry.enabled:
+        farm_registry.add(
+            farms.subset(
+                [
+                    i
+                    for i, farm_id in enumerate(farms.ids)
+                    if farm_id not in invalid_farm_ids
+                ]
+            )
+        )
 
     return {
         "farmResults": results,
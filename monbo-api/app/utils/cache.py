@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used entry.
+
+    Args:
+        maxsize: Maximum number of entries kept, or maximum total size of the
+            entries when `sizeof` is given. A value of 0 disables the cache
+        sizeof: Size of an entry value (e.g. `len` to bound the total number of
+            bytes of `bytes` values). Every entry counts as 1 by default
+    """
+
+    def __init__(self, maxsize: int, sizeof: Callable[[Any], int] | None = None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._sizeof = sizeof or (lambda value: 1)
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= self._sizeof(previous)
+            self._entries[key] = value
+            self.size += self._sizeof(value)
+            while self.size > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._sizeof(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self.size,
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -7,6 +7,7 @@ from app.utils.polygons import (
     get_point_area_and_radius,
 )
 from fastapi import HTTPException
+from shapely.geometry import Polygon
 import re
 
 
@@ -53,6 +54,43 @@ def parse_base_information(farm: PreProcessedFarmData) -> FarmData:
         HTTPException: If there is an error parsing the farm coordinates or generating
                       the polygon. Returns a 400 status code with error details.
     """
+    return parse_farms_base_information([farm])[0]
+
+
+def parse_farms_base_information(farms: list[PreProcessedFarmData]) -> list[FarmData]:
+    """
+    Parses the base information of many farms, see `parse_base_information`.
+
+    The areas of all the polygon farms are computed with a single
+    `GeometryCalculator.calculate_polygon_areas` call.
+    """
+    parsed_farms = []
+    polygons = []
+    for farm in farms:
+        base_information, polygon = _parse_base_information(farm)
+        parsed_farms.append(base_information)
+        if polygon is not None:
+            polygons.append((base_information, polygon))
+
+    areas = GeometryCalculator.calculate_polygon_areas(
+        [polygon for _, polygon in polygons]
+    )
+    for (base_information, _), area in zip(polygons, areas.tolist()):
+        base_information.polygon.area = area
+    return parsed_farms
+
+
+def _parse_base_information(
+    farm: PreProcessedFarmData,
+) -> tuple[FarmData, Polygon | None]:
+    """
+    Parses the base information of a farm, leaving the area of polygon farms
+    to be computed in batch.
+
+    Returns:
+        tuple[FarmData, Polygon | None]: The parsed farm, and its polygon when its
+        area is still to be computed
+    """
     base_information = FarmData(
         id=farm.id,
         producer=farm.producerName,
@@ -71,6 +109,7 @@ def parse_base_information(farm: PreProcessedFarmData) -> FarmData:
         poly_type = determine_polygon_type(farm.farmCoordinates)
         details: PolygonDetails | PointDetails | None = None
         area = None
+        pending_polygon = None
 
         if poly_type == "polygon":
             polygon = generate_polygon(farm.farmCoordinates)
@@ -82,10 +121,9 @@ def parse_base_information(farm: PreProcessedFarmData) -> FarmData:
                     ),
                     path=farm.farmCoordinates,
                 )
-                area = GeometryCalculator.calculate_polygon_area(polygon)
+                pending_polygon = polygon
         elif poly_type == "point":
             area, radius = get_point_area_and_radius(float(farm.area))
-            polygon = generate_polygon(farm.farmCoordinates, radius)
             details = PointDetails(
                 center=Coordinates(
                     lng=farm.farmCoordinates[0].lng,
@@ -99,7 +137,7 @@ def parse_base_information(farm: PreProcessedFarmData) -> FarmData:
             details=details,
             area=area,
         )
-        return base_information
+        return base_information, pending_polygon
 
     except Exception as e:
         print(e)
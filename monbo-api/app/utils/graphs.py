@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def connected_components(
+    count: int,
+    first: np.ndarray,
+    second: np.ndarray,
+) -> np.ndarray:
+    """
+    Label the connected components of an undirected graph given as edge arrays.
+
+    Uses vectorized root hooking and pointer jumping, so large graphs (millions
+    of nodes) are processed without Python loops over the edges.
+
+    Args:
+        count (int): Number of nodes of the graph
+        first (np.ndarray): First node index of every edge
+        second (np.ndarray): Second node index of every edge
+
+    Returns:
+        np.ndarray: Component label of every node, numbered from 0 in order of
+        the smallest node index of each component
+    """
+    labels = np.arange(count)
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+
+    while True:
+        previous = labels.copy()
+        lowest = np.minimum(labels[first], labels[second])
+        np.minimum.at(labels, labels[first], lowest)
+        np.minimum.at(labels, labels[second], lowest)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            break
+
+    _, components = np.unique(labels, return_inverse=True)
+    return components.ravel()
@@ -1,7 +1,6 @@
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry import shape
 from shapely.geometry import Point
-from pyproj import Transformer
 from PIL import Image, ImageDraw
 from typing import Optional, Tuple
 from app.utils.image_generation.GeoHelper import GeoHelper
@@ -16,6 +15,7 @@ from app.utils.image_generation.ImageManipulationHelper import (
     ImageManipulationHelper,
 )
 from app.config.logger import get_logger
+from app.utils.projections import get_transformer
 
 
 # Get logger for this module
@@ -162,8 +162,8 @@ class GeometryHelper:
         # Validate geometry type and parameters
         GeometryHelper.validate_geometry_parameters(geom.geom_type, point_radius_meters)
 
-        # Create transformer for the coordinate transformation
-        transformer = Transformer.from_crs(source_crs, target_crs, always_xy=True)
+        # Get the shared transformer for the coordinate transformation
+        transformer = get_transformer(source_crs, target_crs)
 
         if geom.geom_type == "Polygon":
             # For Polygon geometries, transform all coordinates
@@ -54,7 +54,7 @@ class MapImageGenerator:
     @staticmethod
     async def generate(
         geometry: BaseGeometry,
-        tif_path: str,
+        map_id: int,
         point_radius_meters: float = None,
         output_size: Tuple[int, int] = MapDefaults.OUTPUT_SIZE,
         include_satelital_background: bool = True,
@@ -66,8 +66,8 @@ class MapImageGenerator:
         Args:
             geometry: Shapely geometry object (Polygon or Point). Must be in WGS84
                 coordinate system (EPSG:4326).
-            tif_path: Optional path to TIF file with deforestation data. If provided,
-                will attempt to overlay deforestation data from this file.
+            map_id: Id of the map with deforestation data. Will attempt to overlay
+                deforestation data from the map raster.
             point_radius_meters: Radius for Point geometries in meters. Required if
                 geometry is a Point, must be None for Polygon geometries.
             output_size: Output image dimensions as (width, height) tuple in pixels.
@@ -118,7 +118,7 @@ class MapImageGenerator:
                 await (
                     RasterManipulationHelper.generate_deforestation_image_from_bounds(
                         geometry,
-                        tif_path,
+                        map_id,
                         zoom_level,
                         output_size,
                     )
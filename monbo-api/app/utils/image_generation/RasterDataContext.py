@@ -1,7 +1,6 @@
 from types import TracebackType
-from typing import Optional, Type
-from rasterio import open as rasterio_open
-from rasterio.vrt import WarpedVRT
+from typing import Optional, Tuple, Type
+from app.helpers.RasterRegistry import RasterHandle, raster_registry
 import asyncio
 
 
@@ -9,31 +8,52 @@ class RasterDataContext:
     """
     Context manager for handling raster data operations.
 
-    Provides safe handling of raster file resources by automatically closing
-    file handles when exiting the context.
+    Leases an open handle of the map raster from the process-wide raster
+    registry and gives it back when exiting the context, so the file and its
+    warped VRT are not reopened on every request. Web Mercator reads use the
+    pre-warped copy of the raster instead of a VRT when it was ingested.
+
+    When the bounds and size of the image to read are given, the dataset is the
+    overview of the raster matching the resolution of the image.
 
     Args:
-        tif_path: Path to the TIFF file to open
+        map_id: Id of the map whose raster is read
         target_crs: Target coordinate reference system. Defaults to Web Mercator
             projection (EPSG:3857)
+        bounds: (left, bottom, right, top) of the image in the target CRS
+        size: (width, height) of the image in pixels
     """
 
-    def __init__(self, tif_path: str, target_crs: str = "EPSG:3857"):
-        self.tif_path = tif_path
+    def __init__(
+        self,
+        map_id: int,
+        target_crs: str = "EPSG:3857",
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+        size: Optional[Tuple[int, int]] = None,
+    ):
+        self.map_id = map_id
         self.target_crs = target_crs
-        self.src = None
-        self.vrt = None
+        self.bounds = bounds
+        self.size = size
+        self.handle: Optional[RasterHandle] = None
 
     async def __aenter__(self):
         """
-        Opens the raster file and creates a virtual warped copy in the target CRS.
+        Leases the raster and returns its copy in the target CRS.
 
         Returns:
-            WarpedVRT: Virtual warped raster dataset in the target CRS
+            DatasetReader | WarpedVRT: Pre-warped or virtual warped raster
+            dataset in the target CRS
         """
-        self.src = await asyncio.to_thread(rasterio_open, self.tif_path)
-        self.vrt = await asyncio.to_thread(WarpedVRT, self.src, crs=self.target_crs)
-        return self.vrt
+        self.handle = await asyncio.to_thread(raster_registry.acquire, self.map_id)
+        try:
+            return await asyncio.to_thread(
+                self.handle.warped, self.target_crs, self.bounds, self.size
+            )
+        except BaseException:
+            raster_registry.release(self.handle)
+            self.handle = None
+            raise
 
     async def __aexit__(
         self,
@@ -42,14 +62,13 @@ class RasterDataContext:
         exc_tb: Optional[TracebackType],
     ):
         """
-        Closes all open file handles when exiting the context.
+        Gives the raster handle back to the registry when exiting the context.
 
         Args:
             exc_type: Type of exception that occurred, if any
             exc_val: Exception instance that occurred, if any
             exc_tb: Traceback of exception that occurred, if any
         """
-        if self.vrt:
-            await asyncio.to_thread(self.vrt.close)
-        if self.src:
-            await asyncio.to_thread(self.src.close)
+        if self.handle:
+            raster_registry.release(self.handle)
+            self.handle = None
@@ -3,13 +3,12 @@ from shapely.geometry.base import BaseGeometry
 import numpy as np
 import asyncio
 from PIL import Image
-from pyproj import Transformer
-from rasterio.transform import from_bounds
 from app.utils.image_generation.constants import MapColors, MapDefaults
 from app.utils.image_generation.errors import NoRasterDataOverlapError
 from app.utils.image_generation.RasterDataContext import RasterDataContext
 from app.utils.image_generation.GoogleMapsAPIHelper import GoogleMapsAPIHelper
 from app.helpers.GeometryCalculator import GeometryCalculator
+from app.utils.projections import get_transformer
 
 
 class RasterManipulationHelper:
@@ -20,7 +19,7 @@ class RasterManipulationHelper:
     @staticmethod
     async def generate_deforestation_image_from_bounds(
         geometry: BaseGeometry,
-        tif_path: str,
+        map_id: int,
         zoom_level: int,
         output_size: Tuple[int, int] = MapDefaults.OUTPUT_SIZE,
     ) -> Image.Image:
@@ -28,9 +27,9 @@ class RasterManipulationHelper:
         Generate a deforestation mask image aligned with Google Maps viewport bounds.
 
         Args:
-            tif_path: Path to the TIF file containing deforestation data
-            bounds: Tuple of (min_lat, min_lon, max_lat, max_lon) defining
-                the viewport bounds
+            geometry: Shapely geometry the image is centered on
+            map_id: Id of the map containing deforestation data
+            zoom_level: Google Maps zoom level of the viewport
             output_size: Tuple of (width, height) for the output image size.
                 Defaults to MapDefaults.OUTPUT_SIZE.
 
@@ -49,23 +48,27 @@ class RasterManipulationHelper:
             center_lat, center_lon, zoom_level, output_size
         )
 
-        async with RasterDataContext(tif_path) as vrt:
-            # Convert lat/lon bounds to the VRT's CRS (Web Mercator)
-            transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+        # Convert lat/lon bounds to the VRT's CRS (Web Mercator)
+        transformer = get_transformer("EPSG:4326", "EPSG:3857")
 
-            # Transform bounds from WGS84 to Web Mercator
-            # For Web Mercator, the coordinates should be (x=longitude, y=latitude)
-            min_x, min_y = transformer.transform(min_lon, min_lat)
-            max_x, max_y = transformer.transform(max_lon, max_lat)
+        # Transform bounds from WGS84 to Web Mercator
+        # For Web Mercator, the coordinates should be (x=longitude, y=latitude)
+        min_x, min_y = transformer.transform(min_lon, min_lat)
+        max_x, max_y = transformer.transform(max_lon, max_lat)
 
-            # Define the web mercator bounds for clipping - ensure correct ordering
-            web_mercator_bounds = (
-                min(min_x, max_x),  # minx
-                min(min_y, max_y),  # miny
-                max(min_x, max_x),  # maxx
-                max(min_y, max_y),  # maxy
-            )
+        # Define the web mercator bounds for clipping - ensure correct ordering
+        web_mercator_bounds = (
+            min(min_x, max_x),  # minx
+            min(min_y, max_y),  # miny
+            max(min_x, max_x),  # maxx
+            max(min_y, max_y),  # maxy
+        )
 
+        # Read from the Web Mercator copy of the raster when it was ingested, and
+        # from the overview matching the image resolution
+        async with RasterDataContext(
+            map_id, bounds=web_mercator_bounds, size=output_size
+        ) as vrt:
             # Check if the bounds intersect with the VRT's bounds
             vrt_bounds = vrt.bounds
             if (
@@ -78,27 +81,14 @@ class RasterManipulationHelper:
                     "The requested viewport does not overlap with the map's raster data"
                 )
 
-            # Get transform that maps between webmerc and image pixels
-            # This ensures exact pixel alignment with Google Maps tiles
-            dst_transform = from_bounds(
-                web_mercator_bounds[0],
-                web_mercator_bounds[1],
-                web_mercator_bounds[2],
-                web_mercator_bounds[3],
-                output_size[0],
-                output_size[1],
-            )
-
-            # Read the raster window
+            # Read the raster window, resampled to the image pixels: the window
+            # and the image share the same Web Mercator bounds
             data = await asyncio.to_thread(
                 vrt.read,
                 1,
                 window=vrt.window(*web_mercator_bounds),
                 out_shape=output_size[::-1],  # (height, width)
                 resampling=MapDefaults.RASTER_RESAMPLING,
-                # Use Google Maps alignment transform
-                # This maps from destination pixels to web mercator space
-                dst_transform=dst_transform,
             )
 
             # Create deforestation mask using the defined colors
@@ -27,3 +27,26 @@ def get_map_raster_path(raster_filename: str) -> str:
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Raster file not found at '{filepath}'")
     return filepath
+
+
+def get_map_raster_path_by_id(map_id: int) -> str:
+    """
+    Resolve the raster file path of a map from the maps index.
+
+    Raises:
+        FileNotFoundError: If the map does not exist or its raster file is missing
+    """
+    maps = read_json_file("app/maps/index.json") or []
+    map_data = next(filter(lambda x: x["id"] == map_id, maps), None)
+    if map_data is None:
+        raise FileNotFoundError(f"Map {map_id} not found")
+    return get_map_raster_path(map_data["raster_filename"])
+
+
+def get_raster_fingerprint(filepath: str) -> str:
+    """
+    Return a fingerprint of a raster file that changes whenever the file is
+    replaced or modified (based on its size, modification time and inode).
+    """
+    stat = os.stat(filepath)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}-{stat.st_ino:x}"
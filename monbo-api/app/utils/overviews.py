@@ -0,0 +1,207 @@
+import os
+import shutil
+import tempfile
+from xml.sax.saxutils import escape
+import numpy as np
+from affine import Affine
+from rasterio import open as rasterio_open
+from rasterio.dtypes import dtype_rev, typename_fwd
+from rasterio.io import DatasetReader
+from rasterio.shutil import copy as rasterio_copy
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+
+# Overviews are built until the largest side of the coarsest one fits in this
+# number of pixels (a single tile)
+MIN_OVERVIEW_SIZE = 256
+
+# Number of pixel rows of a level reduced at once when building the overviews
+OVERVIEW_CHUNK_ROWS = 512
+
+
+def get_overview_factors(width: int, height: int) -> list[int]:
+    """
+    Decimation factors (2, 4, 8...) of the overviews of a raster, down to the
+    first overview fitting in `MIN_OVERVIEW_SIZE` pixels.
+    """
+    factors = []
+    factor = 2
+    while -(-max(width, height) // (factor // 2)) > MIN_OVERVIEW_SIZE:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def reduce_deforestation(data: np.ndarray) -> np.ndarray:
+    """
+    Halve the resolution of deforestation values: every output pixel is 1
+    (deforested) when any pixel of its 2x2 block is, and the highest value of
+    the block otherwise.
+    """
+    data = np.pad(data, ((0, data.shape[0] % 2), (0, data.shape[1] % 2)))
+    blocks = data.reshape(data.shape[0] // 2, 2, data.shape[1] // 2, 2)
+    reduced = blocks.max(axis=(1, 3))
+    reduced[(blocks == 1).any(axis=(1, 3))] = 1
+    return reduced
+
+
+def _write_overview(previous_path: str, path: str) -> None:
+    """Write the next overview level of a raster, reducing it by row chunks."""
+    with rasterio_open(previous_path) as src:
+        profile = {
+            "driver": "GTiff",
+            "width": -(-src.width // 2),
+            "height": -(-src.height // 2),
+            "count": 1,
+            "dtype": src.dtypes[0],
+            "crs": src.crs,
+            "transform": src.transform * Affine.scale(2),
+            "tiled": True,
+            "compress": "lzw",
+        }
+        with rasterio_open(path, "w", **profile) as dst:
+            for row_off in range(0, src.height, OVERVIEW_CHUNK_ROWS):
+                height = min(OVERVIEW_CHUNK_ROWS, src.height - row_off)
+                data = src.read(1, window=Window(0, row_off, src.width, height))
+                reduced = reduce_deforestation(data)
+                dst.write(
+                    reduced,
+                    1,
+                    window=Window(0, row_off // 2, dst.width, reduced.shape[0]),
+                )
+
+
+def _get_overviews_vrt(raster_path: str, src: DatasetReader, levels: list[str]):
+    """
+    VRT of the first band of a raster (with its tags, nodata value and color
+    table) declaring the given overview files.
+    """
+
+    def source(path: str) -> str:
+        return (
+            f'<SourceFilename relativeToVRT="0">{escape(os.path.abspath(path))}'
+            "</SourceFilename><SourceBand>1</SourceBand>"
+        )
+
+    def metadata(tags: dict, domain: str = "") -> str:
+        items = "".join(
+            f'<MDI key="{escape(str(key))}">{escape(str(value))}</MDI>'
+            for key, value in tags.items()
+        )
+        return f'<Metadata domain="{domain}">{items}</Metadata>'
+
+    band = ""
+    if src.nodata is not None:
+        band += f"<NoDataValue>{src.nodata!r}</NoDataValue>"
+    try:
+        colormap = src.colormap(1)
+    except ValueError:
+        colormap = None
+    if colormap:
+        entries = "".join(
+            '<Entry c1="{}" c2="{}" c3="{}" c4="{}"/>'.format(*colormap[value])
+            for value in range(max(colormap) + 1)
+        )
+        band += f"<ColorInterp>Palette</ColorInterp><ColorTable>{entries}</ColorTable>"
+    band += f"<SimpleSource>{source(raster_path)}</SimpleSource>"
+    band += "".join(f"<Overview>{source(path)}</Overview>" for path in levels)
+
+    data_type = typename_fwd[dtype_rev[src.dtypes[0]]]
+    geotransform = ", ".join(repr(value) for value in src.transform.to_gdal())
+    return (
+        f'<VRTDataset rasterXSize="{src.width}" rasterYSize="{src.height}">'
+        f"<SRS>{escape(src.crs.to_wkt())}</SRS>"
+        f"<GeoTransform>{geotransform}</GeoTransform>"
+        f"{metadata(src.tags())}"
+        f'{metadata({"resampling": "any"}, "rio_overview")}'
+        f'<VRTRasterBand dataType="{data_type}" band="1">{band}</VRTRasterBand>'
+        "</VRTDataset>"
+    )
+
+
+def build_raster_overviews(raster_path: str) -> list[int]:
+    """
+    Rewrite a GeoTIFF with internal overviews, replacing the existing ones.
+
+    GDAL has no overview resampling keeping any deforested pixel of a block, so
+    every level is reduced from the previous one with `reduce_deforestation`
+    into a temporary file, and the raster is copied with those levels as its
+    overviews. The copy replaces the raster once complete.
+
+    Returns:
+        list[int]: Decimation factors of the overviews
+    """
+    with rasterio_open(raster_path) as src:
+        factors = get_overview_factors(src.width, src.height)
+        if not factors:
+            return factors
+        profile = src.profile
+        directory = tempfile.mkdtemp(dir=os.path.dirname(raster_path) or ".")
+        partial_path = f"{raster_path}.partial"
+        try:
+            levels = []
+            previous_path = raster_path
+            for factor in factors:
+                path = os.path.join(directory, f"overview_{factor}.tif")
+                _write_overview(previous_path, path)
+                levels.append(path)
+                previous_path = path
+
+            vrt_path = os.path.join(directory, "overviews.vrt")
+            with open(vrt_path, "w") as f:
+                f.write(_get_overviews_vrt(raster_path, src, levels))
+            rasterio_copy(
+                vrt_path,
+                partial_path,
+                driver="GTiff",
+                COPY_SRC_OVERVIEWS="YES",
+                TILED="YES",
+                BLOCKXSIZE=profile.get("blockxsize", 256),
+                BLOCKYSIZE=profile.get("blockysize", 256),
+                COMPRESS=profile.get("compress", "lzw"),
+            )
+        except BaseException:
+            # A failed copy leaves no incomplete raster behind
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            shutil.rmtree(directory)
+    os.replace(partial_path, raster_path)
+    return factors
+
+
+def get_overview_level(
+    src: DatasetReader,
+    bounds: tuple[float, float, float, float],
+    crs: str,
+    size: tuple[int, int],
+) -> int | None:
+    """
+    Choose the overview of a raster to read a grid from: the coarsest overview
+    whose pixels are not larger than the pixels of the grid.
+
+    Args:
+        src: Raster dataset
+        bounds: (left, bottom, right, top) of the grid in `crs`
+        crs: Coordinate reference system of the grid
+        size: (width, height) of the grid in pixels
+
+    Returns:
+        int | None: Index of the overview (as the `overview_level` open option
+        of rasterio), or None to read the full resolution
+    """
+    factors = src.overviews(1)
+    if not factors:
+        return None
+    try:
+        left, bottom, right, top = transform_bounds(crs, src.crs, *bounds)
+    except Exception:
+        return None
+    resolution = min((right - left) / size[0], (top - bottom) / size[1])
+
+    level = None
+    for index, factor in enumerate(factors):
+        if max(src.res) * factor <= resolution:
+            level = index
+    return level
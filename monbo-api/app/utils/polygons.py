@@ -1,5 +1,6 @@
 import math
 from typing import Tuple, Literal
+from app.models.farms import FarmPolygonDetailData
 from app.models.polygons import Coordinates
 from shapely.geometry import Point as SPoint, Polygon
 from app.utils.image_generation.GeoHelper import GeoHelper
@@ -90,6 +91,13 @@ def generate_polygon(
     return Polygon(points)
 
 
+def get_farm_polygon(farm: FarmPolygonDetailData) -> Polygon:
+    """Build the shapely polygon of a farm (a circular buffer for point farms)."""
+    coords = farm.details.path if farm.type == "polygon" else [farm.details.center]
+    radius = farm.details.radius if farm.type == "point" else None
+    return generate_polygon(coords, radius)
+
+
 def get_point_area_and_radius(area: float) -> Tuple[float, float]:
     """
     Calculate the area and radius of a point, assuming a circular shape.
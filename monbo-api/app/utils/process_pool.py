@@ -0,0 +1,44 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker pools of the current process, by number of workers
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Return the process-wide worker pool of a number of workers, creating it on
+    first use.
+
+    Every number of workers gets its own pool, so a caller asking for another
+    size never shuts down a pool other requests are still submitting to.
+
+    Workers are started with the "spawn" method: GDAL dataset handles are not
+    fork-safe, so every worker imports the app and opens its own rasters.
+
+    Args:
+        max_workers: Number of worker processes of the pool
+
+    Returns:
+        ProcessPoolExecutor: The shared executor
+    """
+    with _pool_lock:
+        pool = _pools.get(max_workers)
+        # A worker that died (e.g. killed by the OOM killer) breaks the whole pool
+        if pool is None or getattr(pool, "_broken", False):
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pools[max_workers] = pool
+        return pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the shared worker pools, if they were started."""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
@@ -0,0 +1,94 @@
+from typing import Any, Hashable
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+from app.config.env import PROJECTION_CACHE_SIZE
+from app.utils.cache import LRUCache
+
+# CRS and transformers built by the current process. Both are immutable and
+# thread-safe in pyproj, so a single instance is shared by every thread
+_crs_cache = LRUCache(PROJECTION_CACHE_SIZE)
+_transformer_cache = LRUCache(PROJECTION_CACHE_SIZE)
+
+
+def _get_crs_key(crs: Any) -> Hashable:
+    """Hashable key of a CRS given in any form accepted by pyproj."""
+    if isinstance(crs, str):
+        return crs
+    if isinstance(crs, CRS):
+        return crs.srs
+    if isinstance(crs, int):
+        return f"EPSG:{crs}"
+    # rasterio CRS and any other object exporting WKT
+    return crs.to_wkt()
+
+
+def get_crs(crs: Any) -> CRS:
+    """
+    Return the pyproj CRS of a CRS definition, building it on first use.
+
+    Args:
+        crs: CRS in any form accepted by pyproj (e.g. "EPSG:3857", an EPSG code,
+            or the `crs` of a rasterio dataset)
+
+    Returns:
+        CRS: The shared pyproj CRS
+    """
+    key = _get_crs_key(crs)
+    cached = _crs_cache.get(key)
+    if cached is None:
+        cached = CRS.from_user_input(crs)
+        _crs_cache.put(key, cached)
+    return cached
+
+
+def get_transformer(source_crs: Any, target_crs: Any) -> Transformer:
+    """
+    Return the transformer between two CRS, building it on first use.
+
+    Coordinates are always given and returned in (x, y) order, i.e.
+    (longitude, latitude) for geographic CRS.
+
+    Args:
+        source_crs: CRS of the input coordinates, in any form accepted by pyproj
+        target_crs: CRS of the output coordinates, in any form accepted by pyproj
+
+    Returns:
+        Transformer: The shared pyproj transformer
+    """
+    key = (_get_crs_key(source_crs), _get_crs_key(target_crs))
+    cached = _transformer_cache.get(key)
+    if cached is None:
+        cached = Transformer.from_crs(
+            get_crs(source_crs), get_crs(target_crs), always_xy=True
+        )
+        _transformer_cache.put(key, cached)
+    return cached
+
+
+def transform_geometries(
+    geometries: np.ndarray, source_crs: Any, target_crs: Any
+) -> np.ndarray:
+    """
+    Project many shapely geometries with a single transformer call.
+
+    Args:
+        geometries: Array of shapely geometries (None entries are kept)
+        source_crs: CRS of the geometries
+        target_crs: CRS to project them to
+
+    Returns:
+        np.ndarray: Array of projected geometries
+    """
+    transformer = get_transformer(source_crs, target_crs)
+    return shapely.transform(
+        geometries,
+        lambda coords: np.column_stack(
+            transformer.transform(coords[:, 0], coords[:, 1])
+        ),
+    )
+
+
+def get_projection_cache_stats() -> dict:
+    """Hit and miss counters of the CRS and transformer caches."""
+    return {"crs": _crs_cache.stats(), "transformers": _transformer_cache.stats()}
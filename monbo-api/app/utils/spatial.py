@@ -0,0 +1,65 @@
+import numpy as np
+
+# Number of bits of the grid coordinates of the Hilbert curve
+HILBERT_ORDER = 16
+
+
+def get_hilbert_indexes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Position along the Hilbert curve of points of the grid of side
+    `2 ** HILBERT_ORDER`.
+
+    Args:
+        x (np.ndarray): Integer column of every point
+        y (np.ndarray): Integer row of every point
+
+    Returns:
+        np.ndarray: Hilbert index of every point
+    """
+    x = np.asarray(x, dtype=np.int64).copy()
+    y = np.asarray(y, dtype=np.int64).copy()
+    side = 1 << HILBERT_ORDER
+    indexes = np.zeros(x.shape, dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        indexes += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant, so the curve stays continuous
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    return indexes
+
+
+def get_hilbert_order(bounds: np.ndarray) -> np.ndarray:
+    """
+    Order of bounding boxes along the Hilbert curve of their centers, so
+    consecutive boxes are close to each other.
+
+    Args:
+        bounds (np.ndarray): Array of shape (n, 4) with the (min_x, min_y,
+            max_x, max_y) of every box. Rows of NaN (e.g. farms without a
+            polygon) are placed last
+
+    Returns:
+        np.ndarray: Indexes of the boxes, sorted along the curve
+    """
+    centers = np.column_stack(
+        [(bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2]
+    )
+    valid = np.isfinite(centers).all(axis=1)
+    if not valid.any():
+        return np.arange(len(bounds))
+    low = centers[valid].min(axis=0)
+    extent = np.maximum(centers[valid].max(axis=0) - low, 1e-12)
+    cells = (1 << HILBERT_ORDER) - 1
+    grid = np.zeros(centers.shape, dtype=np.int64)
+    grid[valid] = np.round((centers[valid] - low) / extent * cells)
+
+    indexes = np.full(len(bounds), np.iinfo(np.int64).max)
+    indexes[valid] = get_hilbert_indexes(grid[valid, 0], grid[valid, 1])
+    return np.argsort(indexes, kind="stable")
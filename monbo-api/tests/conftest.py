@@ -0,0 +1,119 @@
+import os
+
+# Keep the result and tile caches of the tests in memory (read when importing
+# the app)
+os.environ.setdefault("RESULT_CACHE_PATH", "")
+os.environ.setdefault("TILE_CACHE_PATH", "")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+import rasterio  # noqa: E402
+import shapely  # noqa: E402
+from rasterio.transform import from_origin  # noqa: E402
+from app.models.farms import FarmPolygonDetailData  # noqa: E402
+
+RASTER_WEST = -79.5
+RASTER_NORTH = -1.0
+PIXEL_SIZE = 0.00025  # ~30 meters
+RASTER_SIZE = 1024
+BLOCK_SIZE = 256
+
+
+def generate_deforestation_data(seed: int = 42) -> np.ndarray:
+    """Sparse binary deforestation mask with some pixels of other classes."""
+    rng = np.random.default_rng(seed)
+    data = np.zeros((RASTER_SIZE, RASTER_SIZE), dtype=np.uint8)
+    for _ in range(250):
+        row, col = rng.integers(0, RASTER_SIZE - 40, 2)
+        height, width = rng.integers(3, 40, 2)
+        patch = rng.random((height, width)) < 0.6
+        data[row : row + height, col : col + width] = patch
+    data[rng.random(data.shape) < 0.01] = 2
+    return data
+
+
+def count_circle_pixels(src, data: np.ndarray, circle) -> int:
+    """Deforested pixels of a raster whose square intersects a circle (lng, lat, r)."""
+    lng, lat, radius = circle
+    rows, cols = np.nonzero(data == 1)
+    west, north = src.transform * (cols, rows)
+    squares = shapely.box(west, north + src.transform.e, west + src.transform.a, north)
+    return int(shapely.dwithin(shapely.Point(lng, lat), squares, radius).sum())
+
+
+def write_raster(path, data: np.ndarray) -> str:
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=data.shape[1],
+        height=data.shape[0],
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4326",
+        transform=from_origin(RASTER_WEST, RASTER_NORTH, PIXEL_SIZE, PIXEL_SIZE),
+        tiled=True,
+        blockxsize=BLOCK_SIZE,
+        blockysize=BLOCK_SIZE,
+        compress="lzw",
+    ) as dst:
+        dst.write(data, 1)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def deforestation_raster(tmp_path_factory) -> str:
+    """Path to a tiled, LZW compressed GeoTIFF similar to the map layers."""
+    path = tmp_path_factory.mktemp("rasters") / "deforestation.tif"
+    return write_raster(path, generate_deforestation_data())
+
+
+@pytest.fixture(scope="session")
+def sample_farms() -> list[FarmPolygonDetailData]:
+    """Polygon and point farms spread over the raster, plus one outside of it."""
+    rng = np.random.default_rng(7)
+    extent = RASTER_SIZE * PIXEL_SIZE
+    farms = []
+    for i in range(60):
+        lng = RASTER_WEST + rng.uniform(0.01, extent - 0.01)
+        lat = RASTER_NORTH - rng.uniform(0.01, extent - 0.01)
+        if i % 3 == 0:
+            farms.append(
+                FarmPolygonDetailData(
+                    id=f"farm-{i}",
+                    type="point",
+                    details={
+                        "center": {"lng": lng, "lat": lat},
+                        "radius": float(rng.uniform(30, 300)),
+                    },
+                )
+            )
+            continue
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 8))
+        radii = rng.uniform(0.0005, 0.005, 8)
+        path = [
+            {"lng": lng + r * np.cos(a), "lat": lat + r * np.sin(a)}
+            for a, r in zip(angles, radii)
+        ]
+        farms.append(
+            FarmPolygonDetailData(
+                id=f"farm-{i}",
+                type="polygon",
+                details={"center": {"lng": lng, "lat": lat}, "path": path},
+            )
+        )
+    farms.append(
+        FarmPolygonDetailData(
+            id="farm-outside",
+            type="polygon",
+            details={
+                "center": {"lng": -70.0, "lat": 5.0},
+                "path": [
+                    {"lng": -70.0, "lat": 5.0},
+                    {"lng": -70.0, "lat": 5.01},
+                    {"lng": -69.99, "lat": 5.01},
+                ],
+            },
+        )
+    )
+    return farms
@@ -0,0 +1,127 @@
+import asyncio
+from unittest.mock import patch
+
+import mercantile
+import numpy as np
+from rasterio import open as rasterio_open
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from app.helpers.BitPackedRaster import (
+    BitPackedRaster,
+    get_bitpacked_raster,
+    write_bitpacked_raster,
+)
+from app.modules.deforestation_analysis.helpers import get_tile
+from app.utils.polygons import get_farm_polygon
+from app.modules.deforestation_analysis.zonal import count_deforested_pixels
+from tests.conftest import generate_deforestation_data, write_raster
+
+
+def test_read_windows(tmp_path):
+    # A width that is not a multiple of 8
+    data = generate_deforestation_data()[:1000, :999]
+    raster_path = write_raster(tmp_path / "map.tif", data)
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+        raster = get_bitpacked_raster(raster_path)
+        assert raster.bits.shape == (1000, 125)
+        assert (raster.read(1) == (data == 1)).all()
+
+        rng = np.random.default_rng(5)
+        for _ in range(100):
+            row, col = rng.integers(0, 990, 2)
+            height, width = rng.integers(1, 300, 2)
+            window = Window(col, row, min(width, 999 - col), min(height, 1000 - row))
+            expected = np.equal(src.read(1, window=window), 1)
+            assert (raster.read(1, window=window) == expected).all()
+
+
+def test_outdated_file_is_ignored(tmp_path):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+    assert isinstance(get_bitpacked_raster(raster_path), BitPackedRaster)
+
+    write_raster(tmp_path / "other.tif", generate_deforestation_data(seed=1))
+    (tmp_path / "other.tif").replace(raster_path)
+    assert get_bitpacked_raster(raster_path) is None
+
+
+def test_counts_match_geotiff(tmp_path, sample_farms):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    polygons = [get_farm_polygon(farm) for farm in sample_farms]
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+        expected = count_deforested_pixels(polygons, src)
+    raster = get_bitpacked_raster(raster_path)
+    assert count_deforested_pixels(polygons, raster) == expected
+
+
+def test_tile_from_bitpacked_mask(tmp_path):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    tile = mercantile.tile(-79.4, -1.1, 14)
+    bounds = mercantile.xy_bounds(tile)
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+        with WarpedVRT(src, crs="EPSG:3857") as vrt:
+            expected = vrt.read(
+                1,
+                out_shape=(256, 256),
+                window=vrt.window(*bounds),
+                resampling=Resampling.nearest,
+            )
+
+    with patch(
+        "app.modules.deforestation_analysis.helpers.raster_registry.get_raster_path",
+        return_value=raster_path,
+    ):
+        image = asyncio.run(get_tile(0, tile.z, tile.x, tile.y))
+    mask = np.asarray(image.convert("RGBA"))[..., 3] == 255
+    # Both sample the nearest pixel, up to rounding at the pixel borders
+    assert (mask == (expected == 1)).mean() > 0.99
+
+
+def test_overviews_keep_any_deforestation(tmp_path):
+    data = generate_deforestation_data()[:1000, :999]
+    raster_path = write_raster(tmp_path / "map.tif", data)
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+    raster = get_bitpacked_raster(raster_path)
+    assert [(width, height) for _, width, height in raster.overviews] == [
+        (500, 500),
+        (250, 250),
+    ]
+
+    mask = data == 1
+    for level, (bits, width, height) in enumerate(raster.overviews):
+        factor = 2 ** (level + 1)
+        blocks = np.pad(mask, ((0, height * factor - 1000), (0, width * factor - 999)))
+        expected = blocks.reshape(height, factor, width, factor).any(axis=(1, 3))
+        assert (np.unpackbits(bits, axis=1, count=width).view(bool) == expected).all()
+
+
+def test_low_zoom_tile_from_overview(tmp_path):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+    raster = get_bitpacked_raster(raster_path)
+    full_resolution = BitPackedRaster(raster.path)
+    full_resolution.overviews = []
+
+    for z in (9, 10, 11):
+        tile = mercantile.tile(-79.4, -1.1, z)
+        bounds = tuple(mercantile.xy_bounds(tile))
+        mask = raster.sample_grid(bounds, "EPSG:3857", (256, 256))
+        nearest = full_resolution.sample_grid(bounds, "EPSG:3857", (256, 256))
+        # The overview block of every sampled pixel includes that pixel, and
+        # shows the deforestation of its other pixels too
+        assert (mask | ~nearest).all()
+        assert mask.sum() > nearest.sum()
+
+    # Tiles of high zoom levels sample the full resolution mask
+    bounds = tuple(mercantile.xy_bounds(mercantile.tile(-79.4, -1.1, 14)))
+    assert (
+        raster.sample_grid(bounds, "EPSG:3857", (256, 256))
+        == full_resolution.sample_grid(bounds, "EPSG:3857", (256, 256))
+    ).all()
@@ -0,0 +1,39 @@
+import numpy as np
+from pyproj import Geod
+from shapely import Polygon, box
+from app.helpers.GeometryCalculator import GeometryCalculator
+
+
+def test_calculate_polygon_areas():
+    rng = np.random.default_rng(11)
+    polygons = []
+    for lat in (-4.7, 35.0, 62.0, -78.0):
+        for _ in range(20):
+            lng = rng.uniform(-180, 180)
+            angles = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+            radii = rng.uniform(0.001, 0.02, 12)
+            polygons.append(
+                Polygon(
+                    np.column_stack(
+                        [lng + radii * np.cos(angles), lat + radii * np.sin(angles)]
+                    )
+                )
+            )
+    # Crossing the antimeridian
+    polygons.append(box(179.9, 10.0, 180.1, 10.1))
+
+    areas = GeometryCalculator.calculate_polygon_areas(polygons)
+    geod = Geod(ellps="WGS84")
+    expected = [abs(geod.geometry_area_perimeter(p)[0]) for p in polygons]
+    assert np.allclose(areas, expected, rtol=1e-5)
+
+    # Geod takes the edges of large polygons as geodesics, not straight lines
+    large = box(-80.0, -2.0, -78.0, 0.0)
+    expected = abs(geod.geometry_area_perimeter(large)[0])
+    assert np.isclose(GeometryCalculator.calculate_polygon_area(large), expected, 1e-3)
+    assert GeometryCalculator.calculate_polygon_area(polygons[0]) == areas[0]
+
+    bowtie = Polygon([(0, 0), (1, 1), (1, 0), (0, 1)])
+    areas = GeometryCalculator.calculate_polygon_areas([None, bowtie, Polygon()])
+    assert np.isnan(areas[0])
+    assert areas[1:].tolist() == [-1, 0]
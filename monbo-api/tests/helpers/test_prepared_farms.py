@@ -0,0 +1,69 @@
+import pickle
+
+import numpy as np
+import pytest
+import shapely
+from app.helpers.GeometryCalculator import GeometryCalculator
+from app.helpers.PreparedFarms import PreparedFarms
+from app.models.farms import FarmPolygonDetailData
+from app.utils.polygons import get_farm_polygon
+
+SQUARE = [
+    {"lng": 0.0, "lat": 0.0},
+    {"lng": 0.0, "lat": 0.01},
+    {"lng": 0.01, "lat": 0.01},
+    {"lng": 0.01, "lat": 0.0},
+]
+
+
+def test_prepare_farms(sample_farms):
+    broken = FarmPolygonDetailData(
+        id="broken",
+        type="polygon",
+        details={"center": SQUARE[0], "path": SQUARE[:1]},
+    )
+    farms = PreparedFarms.from_farms(sample_farms + [broken])
+
+    assert farms.ids[-1] == "broken"
+    assert farms.valid.tolist() == [True] * len(sample_farms) + [False]
+    assert "Radius must be provided" in farms.errors[len(sample_farms)]
+    for farm, geometry, area in zip(sample_farms, farms.geometries, farms.areas):
+        assert geometry.equals(get_farm_polygon(farm))
+        polygon_area = GeometryCalculator.calculate_polygon_area(geometry)
+        if farm.type == "polygon":
+            assert area == polygon_area
+        else:
+            # The circle of a point farm is slightly larger than its polygon
+            assert area == pytest.approx(np.pi * farm.details.radius**2, rel=1e-2)
+            assert polygon_area < area < polygon_area * 1.002
+    assert farms.is_circle.tolist() == [
+        farm.type == "point" for farm in sample_farms
+    ] + [False]
+    assert np.isnan(farms.areas[-1])
+    assert np.isnan(farms.bounds[-1]).all()
+
+
+def test_projections_are_shared(sample_farms):
+    farms = PreparedFarms.from_farms(sample_farms)
+    projected = farms.projected("EPSG:3857")
+    assert farms.projected("epsg:3857") is projected
+    assert projected[0].bounds[0] < -8e6
+
+    # Chunks sent to the workers carry what was computed for the whole request
+    farms.areas
+    subset = pickle.loads(pickle.dumps(farms.subset([3, 1])))
+    assert subset.ids == [sample_farms[3].id, sample_farms[1].id]
+    assert subset.areas.tolist() == farms.areas[[3, 1]].tolist()
+    assert len(subset._projections) == 1
+    assert subset.projected("EPSG:3857")[0].equals(projected[3])
+
+
+def test_prepare_computes_upfront(sample_farms):
+    farms = PreparedFarms.from_farms(sample_farms)
+    farms.prepare(["EPSG:3857"])
+    assert "areas" in farms.__dict__
+    assert len(farms._projections) == 1
+    assert shapely.is_prepared(farms.geometries).all()
+
+    # Prepared farms are still sent to the worker processes
+    assert pickle.loads(pickle.dumps(farms)).areas.tolist() == farms.areas.tolist()
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from app.helpers.RasterRegistry import RasterRegistry
+from tests.conftest import generate_deforestation_data, write_raster
+
+
+def test_acquire_reuses_released_handles(deforestation_raster):
+    registry = RasterRegistry(idle_seconds=300)
+    handle = registry.acquire(0, deforestation_raster)
+    registry.release(handle)
+
+    # The map path is remembered after the first lease
+    reused = registry.acquire(0)
+    assert reused is handle
+    assert not reused.src.closed
+    registry.release(reused)
+    registry.close_all()
+    assert handle.src.closed
+
+
+def test_concurrent_leases_get_distinct_handles(deforestation_raster):
+    registry = RasterRegistry(idle_seconds=300)
+    first = registry.acquire(0, deforestation_raster)
+    second = registry.acquire(0, deforestation_raster)
+    assert first is not second
+    assert first.warped("EPSG:3857") is first.warped("EPSG:3857")
+
+    registry.release(first)
+    registry.release(second)
+    with registry.dataset(0) as src:
+        assert src in (first.src, second.src)
+    registry.close_all()
+
+
+def test_reopens_raster_changed_on_disk(tmp_path):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    registry = RasterRegistry(idle_seconds=300)
+    handle = registry.acquire(0, raster_path)
+    registry.release(handle)
+
+    os.remove(raster_path)
+    with pytest.raises(FileNotFoundError):
+        registry.acquire(0)
+
+    write_raster(raster_path, generate_deforestation_data(seed=1))
+    reopened = registry.acquire(0)
+    assert reopened is not handle
+    assert handle.src.closed
+    registry.release(reopened)
+    registry.close_all()
+
+
+def test_closes_idle_handles(deforestation_raster):
+    registry = RasterRegistry(idle_seconds=0)
+    handle = registry.acquire(0, deforestation_raster)
+    registry.release(handle)
+    assert handle.src.closed
+
+    reopened = registry.acquire(0)
+    assert reopened is not handle
+    registry.release(reopened)
@@ -0,0 +1,56 @@
+import shutil
+
+import mercantile
+import numpy as np
+from rasterio import open as rasterio_open
+from rasterio.vrt import WarpedVRT
+from app.helpers.RasterRegistry import RasterRegistry
+from app.helpers.WebMercatorRaster import (
+    get_web_mercator_raster_path,
+    write_web_mercator_raster,
+)
+from app.modules.deforestation_analysis import helpers
+from app.modules.deforestation_analysis.helpers import render_tile
+from tests.conftest import generate_deforestation_data, write_raster
+
+
+def test_tiles_read_web_mercator_copy(tmp_path, deforestation_raster, monkeypatch):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+    registry = RasterRegistry(idle_seconds=300)
+    monkeypatch.setattr(helpers, "raster_registry", registry)
+
+    tiles = [mercantile.tile(-79.4, -1.1, z) for z in (12, 14)]
+    warped = [render_tile(0, tile.z, tile.x, tile.y, raster_path) for tile in tiles]
+
+    path = write_web_mercator_raster(raster_path)
+    assert path == get_web_mercator_raster_path(raster_path)
+    with rasterio_open(path) as dst:
+        assert dst.crs.to_epsg() == 3857
+        assert dst.block_shapes == [(256, 256)]
+        assert dst.overviews(1) == [2, 4]
+
+    # The handle opened before the copy was written is not reused, and low zoom
+    # levels read the overviews of the copy
+    handle = registry.acquire(0, raster_path)
+    web_mercator = handle.web_mercator()
+    assert web_mercator is not None
+    for z, is_overview in ((14, False), (10, True)):
+        bounds = tuple(mercantile.xy_bounds(mercantile.tile(-79.4, -1.1, z)))
+        dataset = handle.warped("EPSG:3857", bounds, (256, 256))
+        assert not isinstance(dataset, WarpedVRT)
+        assert (dataset is not web_mercator) == is_overview
+    registry.release(handle)
+
+    # Full resolution tiles are the same as the tiles warped on the fly
+    for tile, expected in zip(tiles, warped):
+        image = render_tile(0, tile.z, tile.x, tile.y, raster_path)
+        assert np.array_equal(np.asarray(image), np.asarray(expected))
+
+    # The copy of a previous raster file is not read
+    write_raster(raster_path, generate_deforestation_data(seed=1))
+    handle = registry.acquire(0, raster_path)
+    assert handle.web_mercator() is None
+    assert isinstance(handle.warped("EPSG:3857"), WarpedVRT)
+    registry.release(handle)
+    registry.close_all()
@@ -0,0 +1,103 @@
+import os
+from unittest.mock import patch
+
+from app.models.farms import FarmPolygonDetailData
+from app.modules.deforestation_analysis import engine
+from app.modules.deforestation_analysis.cache import (
+    ResultCache,
+    get_farm_geometry_hash,
+    get_result_fingerprint,
+)
+from tests.conftest import generate_deforestation_data, write_raster
+
+PATH = [
+    {"lng": -79.4, "lat": -1.1},
+    {"lng": -79.39, "lat": -1.1},
+    {"lng": -79.39, "lat": -1.11},
+    {"lng": -79.4, "lat": -1.11},
+]
+
+
+def polygon_farm(path, farm_id="farm"):
+    return FarmPolygonDetailData(
+        id=farm_id,
+        type="polygon",
+        details={"center": path[0], "path": path},
+    )
+
+
+def test_geometry_hash_is_normalized():
+    geometry_hash = get_farm_geometry_hash(polygon_farm(PATH))
+    # Same ring with another starting vertex, orientation and farm id
+    assert get_farm_geometry_hash(polygon_farm(PATH[2:] + PATH[:2])) == geometry_hash
+    assert get_farm_geometry_hash(polygon_farm(PATH[::-1], "other")) == geometry_hash
+
+    moved = [{"lng": c["lng"] + 0.001, "lat": c["lat"]} for c in PATH]
+    assert get_farm_geometry_hash(polygon_farm(moved)) != geometry_hash
+
+    point = FarmPolygonDetailData(
+        id="point",
+        type="point",
+        details={"center": PATH[0], "radius": 100},
+    )
+    bigger = point.model_copy(update={"details": point.details.model_copy()})
+    bigger.details.radius = 200
+    assert get_farm_geometry_hash(point) != get_farm_geometry_hash(bigger)
+    assert get_farm_geometry_hash(polygon_farm(PATH[:2])) is None
+
+
+def test_result_cache_tiers(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path=path, memory_size=10)
+    cache.put_many(0, "a", {"x": 0.5, "y": 0.0})
+    assert cache.get_many(0, "a", ["x", "y", "z"]) == {"x": 0.5, "y": 0.0}
+    assert cache.get_many(1, "a", ["x"]) == {}
+    cache.close()
+
+    # A new process starts with an empty memory tier
+    restarted = ResultCache(path=path, memory_size=10)
+    assert restarted.get_many(0, "a", ["x", "y"]) == {"x": 0.5, "y": 0.0}
+    assert restarted.get_many(0, "a", ["x"]) == {"x": 0.5}
+    assert restarted.stats() == {
+        "memoryHits": 1,
+        "diskHits": 2,
+        "misses": 0,
+        "memoryEntries": 2,
+    }
+
+    # Results of a previous raster file are neither served nor kept
+    assert restarted.get_many(0, "b", ["x"]) == {}
+    assert restarted.get_many(0, "a", ["x"]) == {"x": 0.5}
+    restarted.close()
+    assert ResultCache(path=path).get_many(0, "a", ["x"]) == {}
+
+
+def test_run_analysis_uses_cache(tmp_path, sample_farms):
+    raster_path = write_raster(tmp_path / "map.tif", generate_deforestation_data())
+    map_data = {"id": 0, "raster_filename": "map.tif", "pixel_size": 30}
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"))
+
+    with patch.object(engine, "get_map_raster_path", return_value=raster_path):
+        expected = engine.run_analysis([map_data], sample_farms, 1, cache=cache)
+        with patch.object(
+            engine, "analyze_farms_chunk", wraps=engine.analyze_farms_chunk
+        ) as analyze:
+            assert engine.run_analysis([map_data], sample_farms, 1, cache=cache) == (
+                expected
+            )
+            # Only the farm outside of the raster (a None result) is recomputed
+            analyzed = [
+                farm_id for call in analyze.call_args_list for farm_id in call[0][1].ids
+            ]
+            assert analyzed == ["farm-outside"]
+
+            # Replacing the raster invalidates the cached results
+            fingerprint = get_result_fingerprint(map_data, raster_path)
+            os.remove(raster_path)
+            write_raster(raster_path, generate_deforestation_data(seed=1))
+            assert get_result_fingerprint(map_data, raster_path) != fingerprint
+            analyze.reset_mock()
+            engine.run_analysis([map_data], sample_farms, 1, cache=cache)
+            assert sum(len(call[0][1]) for call in analyze.call_args_list) == len(
+                sample_farms
+            )
@@ -0,0 +1,160 @@
+from operator import itemgetter
+from unittest.mock import patch
+
+from rasterio import open as rasterio_open
+from app.helpers.GeometryCalculator import GeometryCalculator
+from app.helpers.PreparedFarms import PreparedFarms
+from app.modules.deforestation_analysis import engine
+from app.modules.deforestation_analysis.engine import iter_analysis, run_analysis
+from app.modules.deforestation_analysis.helpers import (
+    get_deforestation_ratio,
+    get_deforestation_ratio_from_count,
+    get_map_pixels_inside_polygon,
+)
+from app.utils.polygons import get_farm_polygon
+from app.utils.process_pool import shutdown_process_pool
+from tests.conftest import (
+    count_circle_pixels,
+    generate_deforestation_data,
+    write_raster,
+)
+
+MAPS = [
+    {"id": 1, "raster_filename": "b.tif", "pixel_size": 30},
+    {"id": 0, "raster_filename": "a.tif", "pixel_size": 30},
+]
+
+
+def sequential_results(raster_path, farms):
+    """
+    Reference results computed farm by farm, as the endpoint used to do. Point
+    farms are counted over the exact circle, by brute force.
+    """
+    results = []
+    with rasterio_open(raster_path) as src:
+        data = src.read(1)
+        for farm in farms:
+            try:
+                if farm.type == "point":
+                    circles = PreparedFarms.from_farms([farm]).circles
+                    value = get_deforestation_ratio_from_count(
+                        count_circle_pixels(src, data, circles[0]),
+                        GeometryCalculator.calculate_circle_areas(circles)[0],
+                        30 * 30,
+                    )
+                    results.append({"farmId": farm.id, "value": value})
+                    continue
+                polygon = get_farm_polygon(farm)
+                value = get_deforestation_ratio(
+                    get_map_pixels_inside_polygon(polygon, src),
+                    GeometryCalculator.calculate_polygon_area(polygon),
+                    30 * 30,
+                )
+            except Exception:
+                value = None
+            results.append({"farmId": farm.id, "value": value})
+    return results
+
+
+def test_run_analysis_inline(deforestation_raster, sample_farms):
+    expected = sequential_results(deforestation_raster, sample_farms)
+    with patch(
+        "app.modules.deforestation_analysis.engine.get_map_raster_path",
+        return_value=deforestation_raster,
+    ):
+        results = run_analysis(
+            MAPS, sample_farms, max_workers=1, chunk_size=7, cache=None
+        )
+
+    assert [result["mapId"] for result in results] == [0, 1]
+    for result in results:
+        assert result["farmResults"] == expected
+    assert expected[-1] == {"farmId": "farm-outside", "value": None}
+
+
+def test_run_analysis_process_pool(deforestation_raster, sample_farms):
+    expected = sequential_results(deforestation_raster, sample_farms)
+    try:
+        with patch(
+            "app.modules.deforestation_analysis.engine.get_map_raster_path",
+            return_value=deforestation_raster,
+        ):
+            results = run_analysis(
+                MAPS, sample_farms, max_workers=2, chunk_size=7, cache=None
+            )
+    finally:
+        shutdown_process_pool()
+
+    assert [result["mapId"] for result in results] == [0, 1]
+    for result in results:
+        assert result["farmResults"] == expected
+
+
+def test_run_analysis_missing_raster(sample_farms):
+    results = run_analysis(MAPS[:1], sample_farms[:3], max_workers=1)
+    assert results == [
+        {
+            "mapId": 1,
+            "farmResults": [
+                {"farmId": farm.id, "value": None} for farm in sample_farms[:3]
+            ],
+        }
+    ]
+
+
+def test_iter_analysis(deforestation_raster, sample_farms):
+    with patch(
+        "app.modules.deforestation_analysis.engine.get_map_raster_path",
+        return_value=deforestation_raster,
+    ):
+        expected = run_analysis(MAPS, sample_farms, max_workers=1, cache=None)
+        try:
+            chunks = list(
+                iter_analysis(
+                    MAPS, sample_farms, max_workers=2, chunk_size=7, cache=None
+                )
+            )
+        finally:
+            shutdown_process_pool()
+
+    assert len(chunks) == 2 * 9
+    assert all(len(chunk["farmResults"]) <= 7 for chunk in chunks)
+    for result in expected:
+        farm_results = [
+            farm_result
+            for chunk in chunks
+            if chunk["mapId"] == result["mapId"]
+            for farm_result in chunk["farmResults"]
+        ]
+        assert sorted(farm_results, key=itemgetter("farmId")) == sorted(
+            result["farmResults"], key=itemgetter("farmId")
+        )
+
+
+def test_run_analysis_grid_aligned_maps(tmp_path, sample_farms):
+    raster_paths = {
+        "a.tif": write_raster(tmp_path / "a.tif", generate_deforestation_data()),
+        "b.tif": write_raster(tmp_path / "b.tif", generate_deforestation_data(1)),
+    }
+    with (
+        patch(
+            "app.modules.deforestation_analysis.engine.get_map_raster_path",
+            side_effect=raster_paths.get,
+        ),
+        patch(
+            "app.modules.deforestation_analysis.engine.analyze_farms_chunk",
+            wraps=engine.analyze_farms_chunk,
+        ) as analyze,
+    ):
+        results = run_analysis(MAPS, sample_farms, max_workers=1, cache=None)
+
+    # Both maps share the same grid: every farm is analyzed once for both
+    assert analyze.call_count == 1
+    assert [map_data["id"] for map_data, _ in analyze.call_args[0][0]] == [1, 0]
+    raster_filenames = {
+        map_data["id"]: map_data["raster_filename"] for map_data in MAPS
+    }
+    for result in results:
+        raster_path = raster_paths[raster_filenames[result["mapId"]]]
+        assert result["farmResults"] == sequential_results(raster_path, sample_farms)
+    assert results[0]["farmResults"] != results[1]["farmResults"]
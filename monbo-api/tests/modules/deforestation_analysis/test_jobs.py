@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from app.main import app
+from app.modules.deforestation_analysis import jobs
+from app.modules.deforestation_analysis.jobs import (
+    AnalysisJob,
+    JobManager,
+    JobQueueFullError,
+)
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+MAPS = [{"id": 1, "raster_filename": "deforestation_map_a", "pixel_size": 30}]
+
+
+def wait_until_finished(manager, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job is None or job.status in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(f"Job {job_id} did not finish")
+
+
+@patch("app.modules.deforestation_analysis.engine.get_map_raster_path")
+@patch("app.modules.deforestation_analysis.router.get_all_maps")
+def test_analysis_job_endpoints(
+    mock_get_all_maps, mock_get_map_raster_path, deforestation_raster, sample_farms
+):
+    mock_get_all_maps.return_value = MAPS
+    mock_get_map_raster_path.return_value = deforestation_raster
+    request_data = {
+        "maps": [1],
+        "farms": [farm.model_dump() for farm in sample_farms[:5]],
+    }
+
+    response = client.post("/deforestation_analysis/analize/jobs", json=request_data)
+    assert response.status_code == 202
+    job_id = response.json()["jobId"]
+
+    response = client.get(f"/deforestation_analysis/analize/jobs/{job_id}/events")
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = [
+        json.loads(line.removeprefix("data: "))
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert events[-1]["status"] == "completed"
+    assert events[-1]["progress"] == [{"mapId": 1, "farmsDone": 5, "farmsTotal": 5}]
+
+    response = client.get(f"/deforestation_analysis/analize/jobs/{job_id}")
+    assert response.json() == events[-1]
+
+    response = client.get(f"/deforestation_analysis/analize/jobs/{job_id}/result")
+    assert response.status_code == 200
+    expected = client.post("/deforestation_analysis/analize", json=request_data)
+    assert response.json() == expected.json()
+
+    response = client.get("/deforestation_analysis/analize/jobs/unknown/result")
+    assert response.status_code == 404
+
+
+def test_job_queue_is_bounded():
+    release = threading.Event()
+
+    def blocked_analysis(requested_maps, farms, on_progress):
+        release.wait(10)
+        on_progress(1, len(farms))
+        return [{"mapId": 1, "farmResults": []}]
+
+    manager = JobManager(max_queued=1, ttl_seconds=0)
+    with patch.object(jobs, "run_analysis", side_effect=blocked_analysis):
+        running = manager.submit(MAPS, [])
+        while running.status != "running":
+            time.sleep(0.01)
+        queued = manager.submit(MAPS, [])
+        with pytest.raises(JobQueueFullError):
+            manager.submit(MAPS, [])
+        assert queued.get_status()["status"] == "queued"
+
+        release.set()
+        # Finished jobs are forgotten once their TTL expires
+        assert wait_until_finished(manager, queued.id) is None
+        assert running.status == "completed"
+        assert running.results == [{"mapId": 1, "farmResults": []}]
+    manager.shutdown()
+
+
+def test_listeners_wait_without_threads():
+    job = AnalysisJob(id="job", requested_maps=MAPS, farms=None)
+
+    async def listen():
+        threads = threading.active_count()
+        waiting = [
+            asyncio.create_task(job.wait_for_update(job.version, 30))
+            for _ in range(100)
+        ]
+        await asyncio.sleep(0.05)
+        assert len(job.listeners) == 100
+        assert threading.active_count() == threads
+
+        # A change from the worker thread wakes up every listener
+        worker = threading.Thread(target=job.update, kwargs={"status": "running"})
+        worker.start()
+        versions = await asyncio.wait_for(asyncio.gather(*waiting), 5)
+        worker.join()
+        assert versions == [1] * 100
+        assert job.listeners == []
+
+        # Listeners of an outdated version return at once, others time out
+        assert await job.wait_for_update(0, 30) == 1
+        assert await job.wait_for_update(1, 0.01) == 1
+        assert job.listeners == []
+
+    asyncio.run(listen())
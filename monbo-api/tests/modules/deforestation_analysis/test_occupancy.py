@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+from rasterio import open as rasterio_open
+from app.modules.deforestation_analysis.occupancy import (
+    OccupancyPyramid,
+    build_occupancy_pyramid,
+    get_occupancy_pyramid,
+)
+from app.utils.polygons import get_farm_polygon
+from app.modules.deforestation_analysis.read_planner import ReadStats
+from app.modules.deforestation_analysis.zonal import count_deforested_pixels
+from tests.conftest import BLOCK_SIZE, generate_deforestation_data, write_raster
+
+
+def sparse_deforestation_data() -> np.ndarray:
+    """Deforestation only in the top left quarter of the raster."""
+    data = generate_deforestation_data()
+    data[512:, :] = 0
+    data[:, 512:] = 0
+    return data
+
+
+def test_pyramid_counts(tmp_path):
+    data = generate_deforestation_data()[:1000, :900]
+    raster_path = write_raster(tmp_path / "map.tif", data)
+    with rasterio_open(raster_path) as src:
+        pyramid = OccupancyPyramid.build(src, "fingerprint")
+
+    deforested = data == 1
+    assert pyramid.levels[0].shape == (4, 4)
+    assert [level.shape for level in pyramid.levels[1:]] == [(2, 2), (1, 1)]
+    assert pyramid.levels[-1][0, 0] == deforested.sum()
+    for row_start in range(4):
+        for row_stop in range(row_start + 1, 5):
+            for col_start in range(4):
+                for col_stop in range(col_start + 1, 5):
+                    expected = deforested[
+                        row_start * BLOCK_SIZE : row_stop * BLOCK_SIZE,
+                        col_start * BLOCK_SIZE : col_stop * BLOCK_SIZE,
+                    ].sum()
+                    assert (
+                        pyramid.count(row_start, row_stop, col_start, col_stop)
+                        == expected
+                    )
+
+
+def test_pyramid_file(tmp_path):
+    raster_path = write_raster(tmp_path / "map.tif", sparse_deforestation_data())
+    assert get_occupancy_pyramid(raster_path) is None
+
+    with rasterio_open(raster_path) as src:
+        build_occupancy_pyramid(src, raster_path)
+    pyramid = get_occupancy_pyramid(raster_path)
+    assert pyramid.block_shape == (BLOCK_SIZE, BLOCK_SIZE)
+    assert pyramid.levels[0][2:, :].sum() == 0
+
+    # A pyramid built for a previous version of the raster is ignored
+    os.remove(raster_path)
+    write_raster(raster_path, generate_deforestation_data())
+    assert get_occupancy_pyramid(raster_path) is None
+
+
+def test_count_with_pyramid(tmp_path, sample_farms):
+    raster_path = write_raster(tmp_path / "map.tif", sparse_deforestation_data())
+    polygons = [get_farm_polygon(farm) for farm in sample_farms]
+    with rasterio_open(raster_path) as src:
+        expected_stats = ReadStats()
+        expected = count_deforested_pixels(polygons, src, expected_stats)
+
+        pyramid = OccupancyPyramid.build(src, "fingerprint")
+        stats = ReadStats()
+        assert count_deforested_pixels(polygons, src, stats, pyramid) == expected
+
+    assert stats.farms_skipped > 0
+    assert stats.farms + stats.farms_skipped == expected_stats.farms
+    assert stats.blocks_read <= 4 < expected_stats.blocks_read
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import numpy as np
+from rasterio import open as rasterio_open
+from app.modules.deforestation_analysis.read_planner import (
+    BlockReadPlanner,
+    ReadStats,
+)
+from app.utils.polygons import get_farm_polygon
+from app.modules.deforestation_analysis.zonal import (
+    count_deforested_pixels,
+    get_pixel_windows,
+)
+
+WINDOWS = np.array(
+    [
+        [10, 20, 10, 20],  # block (0, 0)
+        [250, 260, 250, 260],  # blocks (0, 0) to (1, 1)
+        [300, 310, 800, 810],  # block (1, 3), not adjacent to the others
+        [300, 310, 780, 790],  # block (1, 3) too
+        [900, 910, 900, 910],  # block (3, 3)
+        [260, 270, 250, 270],  # blocks (1, 0) and (1, 1)
+    ]
+)
+
+
+def test_plan_coalesces_adjacent_blocks(deforestation_raster):
+    with rasterio_open(deforestation_raster) as src:
+        planner = BlockReadPlanner(src)
+        regions = planner.plan(WINDOWS, np.arange(len(WINDOWS)))
+
+    assert [sorted(region.members.tolist()) for region in regions] == [
+        [0, 1, 5],
+        [2, 3],
+        [4],
+    ]
+    assert regions[0].block_bounds == (0, 2, 0, 2)
+    assert planner.stats.blocks_requested == 1 + 4 + 1 + 1 + 1 + 2
+
+
+def test_read_region_reads_every_block_once(deforestation_raster):
+    with rasterio_open(deforestation_raster) as src:
+        data = np.equal(src.read(1), 1)
+        with patch(
+            "app.modules.deforestation_analysis.read_planner.MAX_REGION_PIXELS",
+            256 * 256,
+        ):
+            planner = BlockReadPlanner(src)
+            regions = planner.plan(WINDOWS, np.arange(len(WINDOWS)))
+
+        # The first cluster is split in two regions sharing blocks (1, 0) and (1, 1)
+        assert len(regions) == 4
+        for region in regions:
+            window = planner.get_region_window(region)
+            deforested = planner.read_region(region)
+            for i in region.members:
+                row_start, row_stop, col_start, col_stop = WINDOWS[i]
+                assert np.array_equal(
+                    deforested[
+                        row_start - window.row_off : row_stop - window.row_off,
+                        col_start - window.col_off : col_stop - window.col_off,
+                    ],
+                    data[row_start:row_stop, col_start:col_stop],
+                )
+            planner.release(region)
+
+    assert planner.stats.blocks_read == 6
+    assert planner.stats.bytes_decompressed == 6 * 256 * 256
+    assert planner._blocks == {}
+
+
+def test_count_deforested_pixels_stats(deforestation_raster, sample_farms):
+    polygons = [get_farm_polygon(farm) for farm in sample_farms]
+    stats = ReadStats()
+    with rasterio_open(deforestation_raster) as src:
+        count_deforested_pixels(polygons, src, stats)
+        windows = get_pixel_windows(np.array(polygons, dtype=object), src)
+
+    assert stats.farms == len(polygons) - 1
+    assert stats.blocks_read <= 16
+    assert stats.blocks_read < stats.blocks_requested
+    assert stats.bytes_decompressed == stats.blocks_read * 256 * 256
+    assert (windows[-1] == 0).all()
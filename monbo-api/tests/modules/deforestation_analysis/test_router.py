@@ -1,3 +1,4 @@
+import json
 from unittest.mock import MagicMock, patch
 
 from app.main import app
@@ -263,3 +264,30 @@ def test_serve_tile(mock_get_tile, mock_get_map_by_id):
     response = client.get("/deforestation_analysis/tiles/1/dynamic/0/0/0.png")
     assert response.status_code == 404
     assert response.json() == {"detail": "Tile not found"}
+
+
+@patch("app.modules.deforestation_analysis.engine.get_map_raster_path")
+@patch("app.modules.deforestation_analysis.router.get_all_maps")
+def test_analize_stream(
+    mock_get_all_maps, mock_get_map_raster_path, deforestation_raster, sample_farms
+):
+    mock_get_all_maps.return_value = [
+        {"id": 1, "raster_filename": "deforestation_map_a", "pixel_size": 30}
+    ]
+    mock_get_map_raster_path.return_value = deforestation_raster
+    request_data = {
+        "maps": [1],
+        "farms": [farm.model_dump() for farm in sample_farms[:3]],
+    }
+
+    response = client.post("/deforestation_analysis/analize", json=request_data)
+    assert response.status_code == 200
+    expected = response.json()
+
+    response = client.post(
+        "/deforestation_analysis/analize?stream=true", json=request_data
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == expected
@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+import numpy as np
+from rasterio import open as rasterio_open
+from shapely import Polygon
+from app.modules.deforestation_analysis import engine
+from app.utils.polygons import get_farm_polygon
+from app.modules.deforestation_analysis.run_length import RunLengthRaster
+from app.modules.deforestation_analysis.zonal import count_deforested_pixels
+from tests.conftest import generate_deforestation_data
+
+
+def test_run_length_spans(deforestation_raster):
+    deforested = generate_deforestation_data() == 1
+    with rasterio_open(deforestation_raster) as src:
+        raster = RunLengthRaster.from_raster(src)
+
+    assert raster.cumulative[-1] == deforested.sum()
+    assert len(raster.keys) < deforested.sum()
+
+    rng = np.random.default_rng(3)
+    rows = rng.integers(0, raster.height, 500)
+    col_starts = rng.integers(0, raster.width, 500)
+    col_stops = np.minimum(col_starts + rng.integers(0, 300, 500), raster.width)
+    expected = [
+        deforested[r, a:b].sum() for r, a, b in zip(rows, col_starts, col_stops)
+    ]
+    assert raster.count_spans(rows, col_starts, col_stops).tolist() == expected
+
+
+def test_run_length_counts(deforestation_raster, sample_farms):
+    polygons = [get_farm_polygon(farm) for farm in sample_farms]
+    # A concave farm whose arms share pixel rows
+    polygons.append(
+        Polygon(
+            [
+                (-79.45, -1.05),
+                (-79.40, -1.05),
+                (-79.40, -1.10),
+                (-79.42, -1.10),
+                (-79.42, -1.06),
+                (-79.43, -1.06),
+                (-79.43, -1.10),
+                (-79.45, -1.10),
+            ]
+        )
+    )
+    with rasterio_open(deforestation_raster) as src:
+        raster = RunLengthRaster.from_raster(src)
+        expected = count_deforested_pixels(polygons, src)
+
+    assert raster.count_deforested_pixels(polygons) == expected
+    assert expected[-2] is None
+
+
+def test_run_analysis_with_run_length(deforestation_raster, sample_farms):
+    maps = [{"id": 0, "raster_filename": "a.tif", "pixel_size": 30}]
+    with patch.object(engine, "get_map_raster_path", return_value=deforestation_raster):
+        expected = engine.run_analysis(maps, sample_farms, 1, cache=None)
+        with (
+            patch.object(engine, "RUN_LENGTH_MAP_IDS", [0]),
+            patch.object(engine, "count_deforested_pixels_stack") as count_from_blocks,
+        ):
+            assert engine.run_analysis(maps, sample_farms, 1, cache=None) == expected
+            count_from_blocks.assert_not_called()
@@ -0,0 +1,81 @@
+import shutil
+import sqlite3
+
+import mercantile
+import pytest
+from app.modules.deforestation_analysis import tile_archive
+from app.modules.deforestation_analysis.helpers import encode_tile, render_tile
+from app.modules.deforestation_analysis.tile_archive import (
+    get_tile_archive,
+    write_tile_archive,
+)
+from tests.conftest import (
+    PIXEL_SIZE,
+    RASTER_NORTH,
+    RASTER_SIZE,
+    RASTER_WEST,
+    generate_deforestation_data,
+    write_raster,
+)
+
+RASTER_BOUNDS = (
+    RASTER_WEST,
+    RASTER_NORTH - RASTER_SIZE * PIXEL_SIZE,
+    RASTER_WEST + RASTER_SIZE * PIXEL_SIZE,
+    RASTER_NORTH,
+)
+
+
+def test_tile_archive(tmp_path, deforestation_raster):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+    map_data = {"id": 7, "name": "Map"}
+
+    path = write_tile_archive(map_data, raster_path, 10, 13, max_workers=1)
+    archive = get_tile_archive(raster_path)
+    tiles = [
+        (tile.z, tile.x, tile.y)
+        for tile in mercantile.tiles(*RASTER_BOUNDS, zooms=range(10, 14))
+    ]
+    empty = 0
+    for tile in tiles:
+        expected = encode_tile(render_tile(7, *tile, raster_path))
+        assert archive.get(*tile) == expected
+        empty += expected == archive.empty_tile
+    assert 0 < empty < len(tiles)
+
+    # Empty tiles are not stored, tiles outside the zoom range are rendered
+    with sqlite3.connect(path) as connection:
+        [(stored,)] = connection.execute("SELECT COUNT(*) FROM tiles").fetchall()
+    assert stored == len(tiles) - empty
+    assert archive.get(10, 0, 0) == archive.empty_tile
+    assert archive.get(9, 0, 0) is None
+    assert archive.get(14, 0, 0) is None
+
+    # The tiles rendered in the worker pool are the same
+    expected = {tile: archive.get(*tile) for tile in tiles if tile[0] == 12}
+    assert write_tile_archive(map_data, raster_path, 12, 12, max_workers=2) == path
+    reopened = get_tile_archive(raster_path)
+    assert reopened is not archive
+    for tile, data in expected.items():
+        assert reopened.get(*tile) == data
+
+    # The replaced archive is closed, and reads from it fall back to rendering
+    assert archive.get(*tiles[0]) is None
+
+    # The archive of a previous raster file is not served
+    write_raster(raster_path, generate_deforestation_data(seed=1))
+    assert get_tile_archive(raster_path) is None
+
+
+def test_failed_tile_archive_is_removed(tmp_path, deforestation_raster, monkeypatch):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+
+    def render_tiles(map_id, raster_path, tiles):
+        raise ValueError("Rendering failed")
+
+    monkeypatch.setattr(tile_archive, "render_tiles", render_tiles)
+    with pytest.raises(ValueError):
+        write_tile_archive({"id": 7}, raster_path, 10, 10, max_workers=1)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["map.tif"]
@@ -0,0 +1,89 @@
+import shutil
+from unittest.mock import patch
+
+from app.helpers.BitPackedRaster import write_bitpacked_raster
+from app.helpers.WebMercatorRaster import write_web_mercator_raster
+from app.main import app
+from app.modules.deforestation_analysis import router
+from app.modules.deforestation_analysis.tile_cache import (
+    TileCache,
+    get_raster_tiles_fingerprint,
+)
+from fastapi.testclient import TestClient
+from PIL import Image
+from rasterio import open as rasterio_open
+
+client = TestClient(app)
+
+
+def test_tile_cache_tiers(tmp_path):
+    path = str(tmp_path / "tiles.sqlite3")
+    cache = TileCache(path=path, memory_bytes=10)
+    cache.put(0, "a", 1, 0, 0, b"tile-1")
+    cache.put(0, "a", 1, 0, 1, b"tile-2")
+    # Only the last tile fits in memory, the first one is read from disk
+    assert cache.memory.stats()["entries"] == 1
+    assert cache.get(0, "a", 1, 0, 0) == b"tile-1"
+    assert cache.get(0, "a", 1, 0, 0) == b"tile-1"
+    assert cache.get(0, "a", 1, 1, 1) is None
+    assert cache.stats() == {
+        "memoryHits": 1,
+        "diskHits": 1,
+        "misses": 1,
+        "hitRatio": 2 / 3,
+        "memoryEntries": 1,
+        "memoryBytes": 6,
+        "diskEntries": 2,
+        "diskBytes": 12,
+    }
+    cache.close()
+
+    # Tiles of a previous raster file are neither served nor kept
+    restarted = TileCache(path=path)
+    assert restarted.get(0, "a", 1, 0, 1) == b"tile-2"
+    assert restarted.get(0, "b", 1, 0, 1) is None
+    assert restarted.stats()["diskEntries"] == 0
+    restarted.close()
+
+
+def test_serve_tile_uses_cache():
+    cache = TileCache(path="")
+    fingerprint = "a"
+    rendered = []
+
+    async def render(map_id, z, x, y):
+        rendered.append((map_id, z, x, y))
+        return Image.new("RGBA", (256, 256), (255, 0, 0, 255))
+
+    with (
+        patch.object(router, "get_map_by_id", return_value={"id": 1}),
+        patch.object(router, "get_tile", side_effect=render),
+        patch.object(router, "tile_cache", cache),
+        patch.object(router, "get_tile_fingerprint", lambda _: fingerprint),
+    ):
+        url = "/deforestation_analysis/tiles/1/dynamic/3/2/1.png"
+        first = client.get(url)
+        second = client.get(url)
+        assert first.status_code == second.status_code == 200
+        assert first.content == second.content
+        assert rendered == [(1, 3, 2, 1)]
+
+        # Tiles are rendered again when the raster file changes
+        fingerprint = "b"
+        assert client.get(url).content == first.content
+        assert len(rendered) == 2
+
+
+def test_tiles_fingerprint_follows_ingestions(tmp_path, deforestation_raster):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+    fingerprints = [get_raster_tiles_fingerprint(raster_path)]
+
+    # Tiles are invalidated once they are read from another file
+    with rasterio_open(raster_path) as src:
+        write_bitpacked_raster(src, raster_path)
+    fingerprints.append(get_raster_tiles_fingerprint(raster_path))
+    write_web_mercator_raster(raster_path)
+    fingerprints.append(get_raster_tiles_fingerprint(raster_path))
+    assert len(set(fingerprints)) == 3
+    assert get_raster_tiles_fingerprint(raster_path) == fingerprints[-1]
@@ -0,0 +1,79 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+from app.main import app
+from app.modules.deforestation_analysis import router
+from app.modules.deforestation_analysis.helpers import (
+    EMPTY_TILES,
+    create_empty_tile,
+    create_mask_tile,
+    encode_tile,
+    get_tile_format,
+)
+from app.modules.deforestation_analysis.tile_cache import TileCache
+from fastapi.testclient import TestClient
+from PIL import Image
+
+client = TestClient(app)
+
+
+def get_mask():
+    rng = np.random.default_rng(0)
+    mask = np.zeros((256, 256), dtype=bool)
+    mask[50:120, 30:200] = rng.random((70, 170)) < 0.6
+    return mask
+
+
+def test_encoded_tiles_keep_pixels():
+    mask = get_mask()
+    expected = np.zeros((256, 256, 4), dtype=np.uint8)
+    expected[mask] = (255, 0, 0, 255)
+
+    png = encode_tile(create_mask_tile(mask))
+    image = Image.open(BytesIO(png))
+    assert image.format == "PNG" and image.mode == "P"
+    assert (np.asarray(image.convert("RGBA")) == expected).all()
+
+    webp = Image.open(BytesIO(encode_tile(create_mask_tile(mask), "webp")))
+    assert webp.format == "WEBP"
+    assert (np.asarray(webp.convert("RGBA")) == expected).all()
+
+    # Empty tiles are not encoded again
+    empty = np.zeros((256, 256), dtype=bool)
+    assert encode_tile(create_mask_tile(empty)) is EMPTY_TILES["png"]
+    assert encode_tile(create_empty_tile(), "webp") is EMPTY_TILES["webp"]
+
+
+def test_tile_format_negotiation():
+    assert get_tile_format(None) == "png"
+    assert get_tile_format("*/*") == "png"
+    assert get_tile_format("image/avif,image/webp,*/*;q=0.8") == "webp"
+    assert get_tile_format("image/webp;q=0, image/png") == "png"
+
+
+def test_serve_tile_negotiates_format():
+    cache = TileCache(path="")
+
+    async def render(map_id, z, x, y):
+        return create_mask_tile(get_mask())
+
+    with (
+        patch.object(router, "get_map_by_id", return_value={"id": 1}),
+        patch.object(router, "get_tile", side_effect=render),
+        patch.object(router, "get_archived_tile", return_value=None),
+        patch.object(router, "tile_cache", cache),
+        patch.object(router, "get_tile_fingerprint", lambda _: "a"),
+    ):
+        url = "/deforestation_analysis/tiles/1/dynamic/3/2/1.png"
+        png = client.get(url)
+        webp = client.get(url, headers={"Accept": "image/webp,*/*"})
+        assert png.headers["Content-Type"] == "image/png"
+        assert webp.headers["Content-Type"] == "image/webp"
+        assert png.headers["Vary"] == webp.headers["Vary"] == "Accept"
+        assert Image.open(BytesIO(webp.content)).format == "WEBP"
+
+        # Both encodings are cached
+        assert cache.stats()["memoryEntries"] == 2
+        assert client.get(url).content == png.content
+        assert cache.stats()["memoryHits"] == 1
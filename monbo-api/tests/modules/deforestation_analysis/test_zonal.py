@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+import numpy as np
+from rasterio import open as rasterio_open
+from shapely import Polygon
+from app.helpers.PreparedFarms import PreparedFarms
+from app.modules.deforestation_analysis.helpers import (
+    get_deforestation_ratio,
+    get_deforestation_ratio_from_count,
+    get_map_pixels_inside_polygon,
+)
+from app.utils.polygons import get_farm_polygon
+from app.modules.deforestation_analysis.zonal import (
+    count_deforested_pixels,
+    get_label_layers,
+)
+from tests.conftest import count_circle_pixels
+
+
+def mask_counts(polygons, src):
+    counts = []
+    for polygon in polygons:
+        try:
+            pixels = get_map_pixels_inside_polygon(polygon, src)
+            counts.append(int(np.sum(np.equal(pixels, 1))))
+        except ValueError:
+            counts.append(None)
+    return counts
+
+
+def test_count_deforested_pixels_matches_mask(deforestation_raster, sample_farms):
+    polygons = [get_farm_polygon(farm) for farm in sample_farms]
+    with rasterio_open(deforestation_raster) as src:
+        expected = mask_counts(polygons, src)
+        assert count_deforested_pixels(polygons, src) == expected
+
+        # Small groups force many shared windows and farms split across them
+        with patch(
+            "app.modules.deforestation_analysis.read_planner.MAX_REGION_PIXELS",
+            256 * 256,
+        ):
+            assert count_deforested_pixels(polygons, src) == expected
+
+    assert expected[-1] is None
+    assert sum(count > 0 for count in expected[:-1]) > 5
+
+
+def test_count_deforested_pixels_overlapping_farms(deforestation_raster):
+    square = Polygon([(-79.45, -1.05), (-79.45, -1.1), (-79.4, -1.1), (-79.4, -1.05)])
+    polygons = [square, square.buffer(0.002), square.buffer(-0.01), square]
+    with rasterio_open(deforestation_raster) as src:
+        assert count_deforested_pixels(polygons, src) == mask_counts(polygons, src)
+
+
+def test_count_deforested_pixels_of_circles(deforestation_raster, sample_farms):
+    farms = PreparedFarms.from_farms(sample_farms)
+    with rasterio_open(deforestation_raster) as src:
+        data = src.read(1)
+        counts = count_deforested_pixels(farms, src)
+        with patch(
+            "app.modules.deforestation_analysis.read_planner.MAX_REGION_PIXELS",
+            256 * 256,
+        ):
+            assert count_deforested_pixels(farms, src) == counts
+        for i in np.flatnonzero(farms.is_circle):
+            assert counts[i] == count_circle_pixels(src, data, farms.circles[i])
+
+
+def test_get_label_layers():
+    windows = np.array(
+        [
+            [0, 10, 0, 10],
+            [5, 15, 5, 15],  # overlaps the first one
+            [0, 10, 10, 20],  # only touches the first one along an edge
+            [20, 30, 20, 30],
+        ]
+    )
+    layers = get_label_layers(windows)
+    assert layers.tolist() == [0, 1, 0, 0]
+
+
+def test_get_deforestation_ratio_from_count():
+    pixels = np.array([1, 0, 3, 1, 0, 2, 0, 0, 1, 3])
+    assert get_deforestation_ratio_from_count(3, 100, 5) == get_deforestation_ratio(
+        pixels, 100, 5
+    )
+    assert get_deforestation_ratio_from_count(3, 0, 5) == 0
+    assert get_deforestation_ratio_from_count(300, 100, 5) == 1.0
@@ -1,9 +1,21 @@
+import importlib
+import numpy as np
+import pytest
+import shapely
+import shapely.affinity
 from app.models.polygons import Coordinates
+from app.modules.polygons_validation.registry import FarmRegistry
 from app.modules.polygons_validation.helpers import (
+    get_geometry_inconsistencies,
     get_geometry_paths,
+    get_duplicate_inconsistencies,
+    get_overlap_cluster_inconsistencies,
+    get_overlap_inconsistencies,
     detect_overlaps,
 )
 from app.helpers.GeometryCalculator import GeometryCalculator
+from app.helpers.PreparedFarms import PreparedFarms
+from app.models.farms import FarmPolygonDetailData
 from app.utils.polygons import (
     determine_polygon_type,
     generate_polygon,
@@ -220,3 +232,359 @@ def test_get_polygon_coordinates():
     ]
 
     assert get_geometry_paths(polygon) == expected_coordinates
+
+
+def test_get_overlap_inconsistencies():
+    square = [
+        {"lng": 0.0, "lat": 0.0},
+        {"lng": 0.0, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.0},
+    ]
+    shifted = [{"lng": c["lng"] + 0.005, "lat": c["lat"]} for c in square]
+    farms = PreparedFarms.from_farms(
+        [
+            FarmPolygonDetailData(
+                id=farm_id,
+                type="polygon",
+                details={"center": path[0], "path": path},
+            )
+            for farm_id, path in [("a", square), ("b", shifted), ("c", square[:1])]
+        ]
+    )
+    farms.prepare()
+
+    [overlap] = get_overlap_inconsistencies(farms)
+    assert overlap["farmIds"] == ["a", "b"]
+    assert abs(overlap["data"]["percentage"] - 1 / 3) < 1e-3
+
+    [invalid] = get_geometry_inconsistencies(farms)
+    assert invalid["type"] == "invalid_geometry"
+    assert invalid["farmIds"] == ["c"]
+
+
+def test_detect_overlaps_matches_pairwise_check():
+    rng = np.random.default_rng(7)
+    corners = rng.uniform(0, 1, (300, 2))
+    polygons = [shapely.box(x, y, x + 0.05, y + 0.05) for x, y in corners]
+    # Invalid (self-intersecting) and missing polygons are ignored
+    polygons[0] = Polygon([(0, 0), (1, 1), (1, 0), (0, 1)])
+    polygons[1] = None
+
+    expected = [
+        (i, j)
+        for i in range(2, len(polygons))
+        for j in range(i + 1, len(polygons))
+        if polygons[i].intersects(polygons[j])
+    ]
+    overlaps = detect_overlaps(polygons)
+    assert [(o["polygon1_idx"], o["polygon2_idx"]) for o in overlaps] == expected
+    for overlap in overlaps:
+        intersection = polygons[overlap["polygon1_idx"]].intersection(
+            polygons[overlap["polygon2_idx"]]
+        )
+        assert overlap["intersection_polygon"].equals(intersection)
+    assert detect_overlaps([None]) == []
+
+
+def test_overlap_inconsistencies_in_worker_pool():
+    rng = np.random.default_rng(11)
+    corners = rng.uniform(0, 0.5, (400, 2))
+    geometries = shapely.box(
+        corners[:, 0], corners[:, 1], corners[:, 0] + 0.01, corners[:, 1] + 0.01
+    )
+    farms = PreparedFarms([f"farm-{i}" for i in range(len(geometries))], geometries)
+
+    expected = get_overlap_inconsistencies(farms, max_workers=1)
+    assert len(expected) > 20
+    # Small tasks split the components, so pairs of the same component are
+    # processed by different workers
+    assert get_overlap_inconsistencies(farms, max_workers=2, chunk_size=7) == expected
+
+
+def test_validate_against_farm_registry(tmp_path):
+    registry = FarmRegistry(str(tmp_path / "registry.sqlite3"))
+    lefts = np.arange(100) * 0.01
+    boxes = shapely.box(lefts, 0, lefts + 0.008, 0.008)
+    assert registry.add(PreparedFarms([f"old-{i}" for i in range(100)], boxes)) == 100
+
+    # A new farm over old-10 and old-11, and the new version of old-50
+    batch = PreparedFarms(
+        ["new", "old-50"],
+        np.array([shapely.box(0.105, 0, 0.115, 0.008), boxes[50]], dtype=object),
+    )
+    neighbours = registry.get_neighbours(batch)
+    assert neighbours.ids == ["old-10", "old-11"]
+
+    overlaps = get_overlap_inconsistencies(
+        batch.concatenate(neighbours), request_size=len(batch)
+    )
+    assert [overlap["farmIds"] for overlap in overlaps] == [
+        ["new", "old-10"],
+        ["new", "old-11"],
+    ]
+
+    # Registering a farm again replaces it
+    moved = PreparedFarms(["old-50"], np.array([shapely.box(5, 5, 6, 6)]))
+    assert registry.add(moved) == 1
+    assert len(registry) == 100
+    assert registry.get_neighbours(PreparedFarms(["x"], boxes[50:51])).ids == []
+    near_moved = PreparedFarms(["x"], np.array([shapely.box(5.5, 5.5, 5.6, 5.6)]))
+    assert registry.get_neighbours(near_moved).ids == ["old-50"]
+
+    # The last farm of a batch with a given id is registered
+    repeated = PreparedFarms(["old-50", "old-50"], boxes[[0, 50]])
+    assert registry.add(repeated) == 1
+    assert len(registry) == 100
+    assert registry.get_neighbours(near_moved).ids == []
+    registry.close()
+
+
+def test_register_accepted_farms(tmp_path, monkeypatch):
+    # The package exports the API router under the name of its module
+    router = importlib.import_module("app.modules.polygons_validation.router")
+    registry = FarmRegistry(str(tmp_path / "registry.sqlite3"))
+    monkeypatch.setattr(router, "farm_registry", registry)
+    square = [
+        {"lng": 0.0, "lat": 0.0},
+        {"lng": 0.0, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.0},
+    ]
+    farms = [
+        FarmPolygonDetailData(
+            id=farm_id,
+            type="polygon",
+            details={
+                "center": path[0],
+                "path": [{"lng": c["lng"] + lng, "lat": c["lat"]} for c in path],
+            },
+        )
+        for farm_id, path, lng in [
+            ("a", square, 0.0),
+            ("b", square, 0.005),
+            ("c", square, 1.0),
+        ]
+    ]
+
+    response = router.get_polygon_inconsistencies(farms, register=True)
+    assert [result["status"] for result in response["farmResults"]] == [
+        "NOT_VALID",
+        "NOT_VALID",
+        "VALID",
+    ]
+    assert len(registry) == 1
+    assert registry.get_neighbours(PreparedFarms.from_farms(farms[:1])).ids == []
+    registry.close()
+
+
+def test_duplicate_polygons_are_not_overlaps():
+    square = Polygon([(0, 0), (0, 0.01), (0.01, 0.01), (0.01, 0)])
+    # The same square with the other orientation, another starting vertex and
+    # sub-centimetre differences
+    redrawn = Polygon(
+        [(0.01, 0.01), (0, 0.01 + 1e-9), (0, 0), (0.01 - 1e-9, 0), (0.01, 0.01)]
+    )
+    shifted = shapely.affinity.translate(square, 0.005)
+    farms = PreparedFarms(
+        ["a", "b", "c", "d"], np.array([square, shifted, redrawn, None], dtype=object)
+    )
+
+    [duplicate] = get_duplicate_inconsistencies(farms)
+    assert duplicate["type"] == "duplicate_polygon"
+    assert duplicate["farmIds"] == ["a", "c"]
+    assert duplicate["data"]["area"] == farms.areas[0]
+
+    overlaps = get_overlap_inconsistencies(farms)
+    assert [overlap["farmIds"] for overlap in overlaps] == [["a", "b"], ["b", "c"]]
+
+
+def test_circle_overlaps_match_polygons():
+    farms = PreparedFarms.from_farms(
+        [
+            FarmPolygonDetailData(
+                id=farm_id,
+                type="point",
+                details={"center": {"lng": lng, "lat": -1.0}, "radius": radius},
+            )
+            for farm_id, lng, radius in [
+                ("a", 0.0, 100.0),
+                ("b", 0.0015, 120.0),
+                ("c", 0.0028, 50.0),
+                ("d", 0.0, 30.0),
+            ]
+        ]
+    )
+    # The same farms drawn as polygons with many vertices
+    polygons = PreparedFarms(
+        farms.ids,
+        shapely.buffer(
+            shapely.points(farms.circles[:, :2]), farms.circles[:, 2], quad_segs=256
+        ),
+    )
+
+    overlaps = get_overlap_inconsistencies(farms)
+    expected = get_overlap_inconsistencies(polygons)
+    assert [overlap["farmIds"] for overlap in overlaps] == [
+        ["a", "b"],
+        ["a", "d"],
+        ["b", "c"],
+    ]
+    assert [overlap["farmIds"] for overlap in overlaps] == [
+        overlap["farmIds"] for overlap in expected
+    ]
+    for overlap, reference in zip(overlaps, expected):
+        assert overlap["data"]["area"] == pytest.approx(
+            reference["data"]["area"], rel=1e-3
+        )
+        assert overlap["data"]["percentage"] == pytest.approx(
+            reference["data"]["percentage"], rel=1e-3
+        )
+
+
+def test_overlap_clusters():
+    # 30 mutually overlapping squares, a pair of overlapping squares and a
+    # lone square
+    corners = [(0.001 * i, 0.0005 * i) for i in range(30)]
+    corners += [(1.0, 1.0), (1.005, 1.0), (2.0, 2.0)]
+    corners = np.array(corners)
+    geometries = shapely.box(
+        corners[:, 0], corners[:, 1], corners[:, 0] + 0.05, corners[:, 1] + 0.05
+    )
+    ids = [f"farm-{i}" for i in range(len(geometries))]
+    farms = PreparedFarms(ids, geometries)
+
+    assert len(get_overlap_inconsistencies(farms)) == 30 * 29 // 2 + 1
+    clusters = get_overlap_cluster_inconsistencies(farms)
+    assert [cluster["type"] for cluster in clusters] == ["overlap_cluster"] * 2
+    assert [cluster["farmIds"] for cluster in clusters] == [ids[:30], ids[30:32]]
+
+    for cluster in clusters:
+        members = [ids.index(farm_id) for farm_id in cluster["farmIds"]]
+        for i, percentage in zip(members, cluster["data"]["percentages"]):
+            others = shapely.union_all(geometries[[j for j in members if j != i]])
+            overlap = GeometryCalculator.calculate_polygon_area(
+                geometries[i].intersection(others)
+            )
+            assert percentage == pytest.approx(overlap / farms.areas[i], rel=1e-6)
+        region = shapely.union_all(
+            [
+                geometries[i].intersection(geometries[j])
+                for i in members
+                for j in members
+                if i < j
+            ]
+        )
+        assert cluster["data"]["area"] == pytest.approx(
+            GeometryCalculator.calculate_polygon_area(region), rel=1e-6
+        )
+
+    # Whole clusters are processed by a single task
+    assert (
+        get_overlap_cluster_inconsistencies(farms, max_workers=2, chunk_size=7)
+        == clusters
+    )
+
+
+def test_overlap_clusters_ignore_touching_farms():
+    # a touches b, which overlaps c; d touches e, which overlaps f and g
+    corners = [(0.0, 0.0), (0.01, 0.0), (0.015, 0.0)]
+    corners += [(1.0, 1.0), (1.01, 1.0), (1.015, 1.0), (1.012, 1.005)]
+    corners = np.array(corners)
+    geometries = shapely.box(
+        corners[:, 0], corners[:, 1], corners[:, 0] + 0.01, corners[:, 1] + 0.01
+    )
+    ids = ["a", "b", "c", "d", "e", "f", "g"]
+    farms = PreparedFarms(ids, geometries)
+
+    overlaps = get_overlap_inconsistencies(farms)
+    assert [overlap["farmIds"] for overlap in overlaps] == [
+        ["b", "c"],
+        ["e", "f"],
+        ["e", "g"],
+        ["f", "g"],
+    ]
+    clusters = get_overlap_cluster_inconsistencies(farms)
+    assert [cluster["farmIds"] for cluster in clusters] == [["b", "c"], ["e", "f", "g"]]
+    for cluster in clusters:
+        assert all(percentage > 0 for percentage in cluster["data"]["percentages"])
+    # A cluster of two farms is the overlap of the pair
+    assert clusters[0]["data"]["area"] == pytest.approx(overlaps[0]["data"]["area"])
+    assert clusters[0]["data"]["percentages"] == pytest.approx([0.5, 0.5], rel=1e-3)
+
+
+def test_overlap_clusters_list_duplicates():
+    # b duplicates a, which overlaps c; d duplicates e, which overlaps f
+    corners = np.array(
+        [(0.0, 0.0), (0.0, 0.0), (0.005, 0.0), (1.0, 1.0), (1.0, 1.0), (1.005, 1.0)]
+    )
+    geometries = shapely.box(
+        corners[:, 0], corners[:, 1], corners[:, 0] + 0.01, corners[:, 1] + 0.01
+    )
+    ids = ["a", "b", "c", "d", "e", "f"]
+    farms = PreparedFarms(ids, geometries)
+
+    overlaps = get_overlap_inconsistencies(farms)
+    assert [overlap["farmIds"] for overlap in overlaps] == [
+        ["a", "c"],
+        ["b", "c"],
+        ["d", "f"],
+        ["e", "f"],
+    ]
+    clusters = get_overlap_cluster_inconsistencies(farms)
+    assert [cluster["farmIds"] for cluster in clusters] == [
+        ["a", "b", "c"],
+        ["d", "e", "f"],
+    ]
+    for cluster in clusters:
+        assert cluster["data"]["percentages"] == pytest.approx([0.5] * 3, rel=1e-3)
+    assert (
+        get_overlap_cluster_inconsistencies(farms, max_workers=2, chunk_size=1)
+        == clusters
+    )
+
+    # Only the overlaps of the request farms are checked
+    assert [
+        cluster["farmIds"]
+        for cluster in get_overlap_cluster_inconsistencies(farms, request_size=2)
+    ] == [["a", "b", "c"]]
+
+
+def test_overlap_shares_of_circles():
+    # A circle (c) inside a square (a), which overlaps another square (b)
+    square = [
+        {"lng": 0.0, "lat": 0.0},
+        {"lng": 0.0, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.01},
+        {"lng": 0.01, "lat": 0.0},
+    ]
+    shifted = [{"lng": c["lng"] + 0.008, "lat": c["lat"]} for c in square]
+    farms = [
+        FarmPolygonDetailData(
+            id=farm_id,
+            type="polygon",
+            details={"center": path[0], "path": path},
+        )
+        for farm_id, path in [("a", square), ("b", shifted)]
+    ]
+    farms.append(
+        FarmPolygonDetailData(
+            id="c",
+            type="point",
+            details={"center": {"lng": 0.003, "lat": 0.005}, "radius": 100.0},
+        )
+    )
+
+    # The whole circle is overlapped, whatever the size of its cluster
+    pair = PreparedFarms.from_farms([farms[0], farms[2]])
+    [cluster] = get_overlap_cluster_inconsistencies(pair)
+    assert cluster["data"]["percentages"][1] == pytest.approx(1.0, rel=1e-9)
+    [overlap] = get_overlap_inconsistencies(pair)
+    assert overlap["data"]["percentage"] == pytest.approx(
+        cluster["data"]["percentages"][1] * pair.polygon_areas[1] / pair.areas[0],
+        rel=1e-9,
+    )
+
+    [cluster] = get_overlap_cluster_inconsistencies(PreparedFarms.from_farms(farms))
+    assert cluster["farmIds"] == ["a", "b", "c"]
+    assert cluster["data"]["percentages"][2] == pytest.approx(1.0, rel=1e-9)
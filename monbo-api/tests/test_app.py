@@ -21,6 +21,24 @@ def test_health_check():
     assert response.json() == {"version": "0.1.0", "status": "OK"}
 
 
+def test_metrics():
+    """
+    Test the metrics endpoint.
+
+    Assertions:
+        - The response status code should be 200.
+        - The response JSON should contain the result cache counters.
+    """
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert set(response.json()["analysisResultCache"]) == {
+        "memoryHits",
+        "diskHits",
+        "misses",
+        "memoryEntries",
+    }
+
+
 def test_download_geojson_with_valid_content():
     """
     Test the /download-geojson endpoint with a valid JSON string as the "content" parameter.
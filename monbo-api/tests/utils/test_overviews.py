@@ -0,0 +1,72 @@
+import shutil
+
+import mercantile
+import numpy as np
+import pytest
+from rasterio import open as rasterio_open
+from app.helpers.RasterRegistry import raster_registry
+from app.utils import overviews
+from app.modules.deforestation_analysis.helpers import render_tile
+from app.utils.overviews import (
+    build_raster_overviews,
+    get_overview_factors,
+    get_overview_level,
+)
+
+
+def test_overview_factors():
+    assert get_overview_factors(1024, 1024) == [2, 4]
+    assert get_overview_factors(300, 1025) == [2, 4, 8]
+    assert get_overview_factors(256, 100) == []
+
+
+def test_low_zoom_tiles_read_overviews(tmp_path, deforestation_raster):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+    assert build_raster_overviews(raster_path) == [2, 4]
+
+    with rasterio_open(raster_path) as src:
+        data = src.read(1)
+        assert src.overviews(1) == [2, 4]
+
+        def level(z):
+            tile = mercantile.tile(-79.4, -1.1, z)
+            return get_overview_level(
+                src, tuple(mercantile.xy_bounds(tile)), "EPSG:3857", (256, 256)
+            )
+
+        # ~30 m pixels: tiles of 76 m and 153 m pixels read the 2x and 4x
+        # overviews, tiles of 38 m pixels or less the full resolution
+        assert [level(z) for z in (10, 11, 12, 14)] == [1, 0, None, None]
+
+    # Every overview pixel is deforested when any pixel it covers is, and keeps
+    # the highest value of the pixels it covers otherwise
+    with rasterio_open(raster_path, overview_level=1) as overview:
+        blocks = data.reshape(256, 4, 256, 4)
+        expected = np.where((blocks == 1).any(axis=(1, 3)), 1, blocks.max(axis=(1, 3)))
+        assert (overview.read(1) == expected).all()
+        assert (overview.read(1) == 2).any()
+
+    tile = mercantile.tile(-79.4, -1.1, 10)
+    image = render_tile(7, tile.z, tile.x, tile.y, raster_path)
+    assert (np.asarray(image.convert("RGBA"))[..., 3] == 255).any()
+    handle = raster_registry.acquire(7, raster_path)
+    try:
+        assert list(handle._datasets) == [(raster_path, 1)]
+    finally:
+        raster_registry.release(handle)
+    raster_registry.close_all()
+
+
+def test_failed_overviews_are_removed(tmp_path, deforestation_raster, monkeypatch):
+    raster_path = str(tmp_path / "map.tif")
+    shutil.copy(deforestation_raster, raster_path)
+
+    def rasterio_copy(src_path, dst_path, **options):
+        open(dst_path, "w").close()
+        raise ValueError("Copy failed")
+
+    monkeypatch.setattr(overviews, "rasterio_copy", rasterio_copy)
+    with pytest.raises(ValueError):
+        build_raster_overviews(raster_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["map.tif"]
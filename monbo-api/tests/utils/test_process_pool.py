@@ -0,0 +1,18 @@
+from app.utils.process_pool import get_process_pool, shutdown_process_pool
+
+
+def test_pools_by_number_of_workers():
+    try:
+        pool = get_process_pool(1)
+        assert get_process_pool(1) is pool
+        future = pool.submit(abs, -1)
+
+        # Another size gets its own pool, and the first one is still usable
+        resized = get_process_pool(2)
+        assert resized is not pool
+        assert resized._max_workers == 2
+        assert get_process_pool(1) is pool
+        assert future.result(timeout=60) == 1
+        assert pool.submit(abs, -2).result(timeout=60) == 2
+    finally:
+        shutdown_process_pool()
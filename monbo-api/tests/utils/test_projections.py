@@ -0,0 +1,30 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+from rasterio.crs import CRS
+from app.utils.projections import (
+    get_crs,
+    get_projection_cache_stats,
+    get_transformer,
+    transform_geometries,
+)
+
+
+def test_transformers_are_shared():
+    transformer = get_transformer("EPSG:4326", "EPSG:3857")
+    hits = get_projection_cache_stats()["transformers"]["hits"]
+    assert get_transformer("EPSG:4326", "EPSG:3857") is transformer
+    assert get_projection_cache_stats()["transformers"]["hits"] == hits + 1
+    assert get_crs(CRS.from_epsg(3857)) is get_crs(CRS.from_epsg(3857))
+
+
+def test_transform_geometries_matches_geopandas():
+    geometries = np.array(
+        [shapely.box(-79.5, -1.2, -79.4, -1.1), None, shapely.Point(-79.3, -1.0)],
+        dtype=object,
+    )
+    projected = transform_geometries(geometries, "EPSG:4326", CRS.from_epsg(32717))
+    expected = gpd.GeoSeries(geometries, crs="EPSG:4326").to_crs(32717).values
+    assert projected[1] is None
+    for geometry, expected_geometry in zip(projected[[0, 2]], expected[[0, 2]]):
+        assert shapely.equals_exact(geometry, expected_geometry, tolerance=1e-6)
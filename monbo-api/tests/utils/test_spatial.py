@@ -0,0 +1,23 @@
+import numpy as np
+from app.utils.spatial import HILBERT_ORDER, get_hilbert_indexes, get_hilbert_order
+
+
+def test_hilbert_curve_visits_neighbour_cells():
+    x, y = np.meshgrid(np.arange(64), np.arange(64))
+    x, y = x.ravel(), y.ravel()
+    # Every cell has its own index, and consecutive indexes are neighbour cells
+    indexes = get_hilbert_indexes(x, y)
+    assert len(np.unique(indexes)) == len(indexes)
+    order = np.argsort(indexes)
+    assert (np.abs(np.diff(x[order])) + np.abs(np.diff(y[order])) == 1).all()
+    assert indexes.max() < (1 << HILBERT_ORDER) ** 2
+
+
+def test_hilbert_order_groups_neighbours():
+    # Two groups of boxes, interleaved, and a missing box
+    lefts = np.array([0.0, 10.0, 0.1, 10.1, np.nan, 0.2, 10.2])
+    bounds = np.column_stack([lefts, lefts * 0, lefts + 0.05, lefts * 0 + 0.05])
+    order = get_hilbert_order(bounds).tolist()
+    assert order[-1] == 4
+    assert sorted(order[:3]) in ([0, 2, 5], [1, 3, 6])
+    assert sorted(order[3:6]) in ([0, 2, 5], [1, 3, 6])
@@ -11,6 +11,10 @@ import { SheetData, loadTemplateHeaders } from "@/utils/excel";
 import { useCallback, useContext } from "react";
 import { flatten } from "lodash";
 import { formatOverlapPercentage } from "@/utils/numbers";
+import {
+  getInconsistencyOverlapPercentage,
+  isMultiFarmInconsistency,
+} from "@/utils/inconsistencies";
 import { getRowCommonDataAsArray } from "@/utils/download";
 import { useValidFarmsDataForValidationPage } from "@/hooks/useValidFarmsDataForValidationPage";
 import { SnackbarContext } from "@/context/SnackbarContext";
@@ -51,8 +55,11 @@ const parseData = async (
         return [
           ...getRowCommonDataAsArray(farm, language),
           t(`polygonValidation:inconsistenciesTypes:${item.type}`),
-          item.type === "overlap"
-            ? formatOverlapPercentage(item.data.percentage, language)
+          isMultiFarmInconsistency(item)
+            ? formatOverlapPercentage(
+                getInconsistencyOverlapPercentage(item),
+                language
+              )
             : "",
         ];
       });
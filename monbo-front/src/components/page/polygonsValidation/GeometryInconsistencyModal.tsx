@@ -5,7 +5,7 @@ import { CircleObject, PolygonObject } from "@/components/reusable/Map";
 import { RowData, Header } from "@/components/reusable/Table";
 import { Text } from "@/components/reusable/Text";
 import { BasePolygonModal } from "./BasePolygonModal";
-import { InconsistentPolygonData } from "@/interfaces/PolygonValidation";
+import { GeometryInconsistencyData } from "@/interfaces/PolygonValidation";
 import { multipleObjectsMapColors } from "@/config/theme";
 import {
   parseLatitude,
@@ -111,12 +111,12 @@ const getFoldedRows = (farm: FarmData) => {
 };
 
 const generateRows = (
-  data: Exclude<InconsistentPolygonData, { type: "overlap" }>,
+  data: GeometryInconsistencyData,
   farmsData: FarmData[],
   openedRows: string[],
   t: TFunction<"translation", undefined>,
   language: string
-): RowData<Exclude<InconsistentPolygonData, { type: "overlap" }>>[] => {
+): RowData<GeometryInconsistencyData>[] => {
   return data.farmIds.map((farmId, idx) => {
     const farm = farmsData.find((farm) => farm.id === farmId);
     if (!farm) return null;
@@ -168,10 +168,10 @@ const generateRows = (
         ...getFoldedRows(farm),
       ],
     };
-  }) as RowData<Exclude<InconsistentPolygonData, { type: "overlap" }>>[];
+  }) as RowData<GeometryInconsistencyData>[];
 };
 const generateMapObjects = (
-  inconsistency: Exclude<InconsistentPolygonData, { type: "overlap" }>,
+  inconsistency: GeometryInconsistencyData,
   farmsData: FarmData[]
 ): (CircleObject | PolygonObject)[] => {
   const objects: (CircleObject | PolygonObject)[] = inconsistency.farmIds.map(
@@ -203,7 +203,7 @@ const generateMapObjects = (
 interface Props {
   isOpen: boolean;
   handleClose: () => void;
-  row: RowData<Exclude<InconsistentPolygonData, { type: "overlap" }>> | null;
+  row: RowData<GeometryInconsistencyData> | null;
 }
 
 export const GeometryInconsistencyModal: React.FC<Props> = ({
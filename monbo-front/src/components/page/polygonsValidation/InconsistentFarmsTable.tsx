@@ -13,6 +13,11 @@ import { useSearchParams } from "next/navigation";
 import { PolygonInconsistencyModal } from "@/components/page/polygonsValidation/PolygonInconsistencyModal";
 import { DataContext } from "@/context/DataContext";
 import { formatOverlapPercentage } from "@/utils/numbers";
+import {
+  getInconsistencyCriticality,
+  getInconsistencyOverlapPercentage,
+  isMultiFarmInconsistency,
+} from "@/utils/inconsistencies";
 import { useTranslation } from "react-i18next";
 import { Box } from "@mui/material";
 import { Text } from "@/components/reusable/Text";
@@ -34,7 +39,7 @@ const getItemInconsistencyCellValue = (
   idx: number,
   t: TFunction<"translation", undefined>
 ): Record<string, CellData> => {
-  if (item.type === "overlap") {
+  if (isMultiFarmInconsistency(item)) {
     if (idx === 0) {
       return {
         inconsistency: {
@@ -64,7 +69,7 @@ const getOverlapColumnsCellsValue = (
   language: string,
   areAllFarmsValidManually: boolean
 ): Record<string, CellData> => {
-  if (item.type !== "overlap")
+  if (!isMultiFarmInconsistency(item))
     return {
       overlapPercentage: {
         value: null,
@@ -77,13 +82,16 @@ const getOverlapColumnsCellsValue = (
 
   return {
     overlapPercentage: {
-      value: formatOverlapPercentage(item.data.percentage, language),
+      value: formatOverlapPercentage(
+        getInconsistencyOverlapPercentage(item),
+        language
+      ),
       rowSpan: item.farmIds.length,
       chipStyle: {
         color: areAllFarmsValidManually ? "#3A3541" : "#fff",
         backgroundColor: areAllFarmsValidManually
           ? "#3A354150"
-          : colorByCritically[item.data.criticality],
+          : colorByCritically[getInconsistencyCriticality(item)],
         width: 80,
       },
       cellStyle: {
@@ -233,11 +241,11 @@ export const InconsistentFarmsTable: React.FC = () => {
               const inconsistency = t(
                 `polygonValidation:inconsistenciesTypes:${item.type}`
               );
-              if (item.type === "overlap") {
+              if (isMultiFarmInconsistency(item)) {
                 return {
                   ...item,
                   inconsistency,
-                  overlapPercentage: item.data.percentage,
+                  overlapPercentage: getInconsistencyOverlapPercentage(item),
                   overlapArea: item.data.area,
                 };
               }
@@ -14,7 +14,7 @@ import { Text } from "@/components/reusable/Text";
 import { BasePolygonModal } from "./BasePolygonModal";
 import {
   FarmValidationStatus,
-  InconsistentPolygonData,
+  MultiFarmInconsistencyData,
 } from "@/interfaces/PolygonValidation";
 import { multipleObjectsMapColors, issueMapColor } from "@/config/theme";
 import {
@@ -122,13 +122,13 @@ const getFoldedRows = (farm: FarmData) => {
 };
 
 const generateRows = (
-  data: Extract<InconsistentPolygonData, { type: "overlap" }>,
+  data: MultiFarmInconsistencyData,
   farmsData: FarmData[],
   selectedRows: string[],
   openedRows: string[],
   t: TFunction<"translation", undefined>,
   language: string
-): RowData<Extract<InconsistentPolygonData, { type: "overlap" }>>[] => {
+): RowData<MultiFarmInconsistencyData>[] => {
   return data.farmIds.map((farmId, idx) => {
     const farm = farmsData.find((farm) => farm.id === farmId);
     if (!farm) return null;
@@ -186,10 +186,10 @@ const generateRows = (
         ...getFoldedRows(farm),
       ],
     };
-  }) as RowData<Extract<InconsistentPolygonData, { type: "overlap" }>>[];
+  }) as RowData<MultiFarmInconsistencyData>[];
 };
 const generateMapObjects = (
-  inconsistency: Extract<InconsistentPolygonData, { type: "overlap" }>,
+  inconsistency: MultiFarmInconsistencyData,
   farmsData: FarmData[]
 ): (CircleObject | PolygonObject | null)[] => {
   const objects: (CircleObject | PolygonObject | null)[] =
@@ -231,7 +231,7 @@ const generateMapObjects = (
 interface Props {
   isOpen: boolean;
   handleClose: () => void;
-  row: RowData<Extract<InconsistentPolygonData, { type: "overlap" }>> | null;
+  row: RowData<MultiFarmInconsistencyData> | null;
 }
 
 export const OverlapInconsistencyModal: React.FC<Props> = ({
@@ -336,7 +336,9 @@ export const OverlapInconsistencyModal: React.FC<Props> = ({
       size="xl"
       title={
         <Text variant="h6" bold>
-          {t("polygonValidation:overlapModal.title")}
+          {row?.data?.type === "duplicate_polygon"
+            ? t("polygonValidation:inconsistenciesTypes:duplicate_polygon")
+            : t("polygonValidation:overlapModal.title")}
         </Text>
       }
       hideCloseButton
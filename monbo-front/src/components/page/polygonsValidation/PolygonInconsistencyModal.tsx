@@ -2,7 +2,12 @@
 
 import React from "react";
 import { RowData } from "@/components/reusable/Table";
-import { InconsistentPolygonData } from "@/interfaces/PolygonValidation";
+import {
+  GeometryInconsistencyData,
+  InconsistentPolygonData,
+  MultiFarmInconsistencyData,
+} from "@/interfaces/PolygonValidation";
+import { isMultiFarmInconsistency } from "@/utils/inconsistencies";
 import { OverlapInconsistencyModal } from "./OverlapInconsistencyModal";
 import { GeometryInconsistencyModal } from "./GeometryInconsistencyModal";
 
@@ -16,21 +21,17 @@ export const PolygonInconsistencyModal: React.FC<PolygonDetailModalProps> = ({
   handleClose,
   row,
 }) => {
-  return row?.data?.type === "overlap" ? (
+  return row?.data && isMultiFarmInconsistency(row.data) ? (
     <OverlapInconsistencyModal
       isOpen={isOpen}
       handleClose={handleClose}
-      row={
-        row as RowData<Extract<InconsistentPolygonData, { type: "overlap" }>>
-      }
+      row={row as RowData<MultiFarmInconsistencyData>}
     />
   ) : (
     <GeometryInconsistencyModal
       isOpen={isOpen}
       handleClose={handleClose}
-      row={
-        row as RowData<Exclude<InconsistentPolygonData, { type: "overlap" }>>
-      }
+      row={row as RowData<GeometryInconsistencyData>}
     />
   );
 };
@@ -9,6 +9,20 @@ export interface OverlapData {
   center: Coordinates;
 }
 
+export interface OverlapClusterData {
+  area: number;
+  percentages: number[];
+  criticality: "HIGH" | "MEDIUM";
+  paths: Coordinates[][];
+  center: Coordinates;
+}
+
+export interface DuplicatePolygonData {
+  area: number;
+  paths: Coordinates[][];
+  center: Coordinates;
+}
+
 interface InvalidGeometryInconsistencyData {
   reason: string;
 }
@@ -19,12 +33,34 @@ export type InconsistentPolygonData =
       farmIds: FarmData["id"][];
       data: OverlapData;
     }
+  | {
+      type: "overlap_cluster";
+      farmIds: FarmData["id"][];
+      data: OverlapClusterData;
+    }
+  | {
+      type: "duplicate_polygon";
+      farmIds: FarmData["id"][];
+      data: DuplicatePolygonData;
+    }
   | {
       type: "invalid_geometry";
       farmIds: FarmData["id"][];
       data: InvalidGeometryInconsistencyData;
     };
 
+// Inconsistencies between several farms, shown with the region they share
+export type MultiFarmInconsistencyData = Extract<
+  InconsistentPolygonData,
+  { type: "overlap" | "overlap_cluster" | "duplicate_polygon" }
+>;
+
+// Inconsistencies of the geometry of a single farm
+export type GeometryInconsistencyData = Exclude<
+  InconsistentPolygonData,
+  MultiFarmInconsistencyData
+>;
+
 export enum FarmValidationStatus {
   VALID = "VALID",
   VALID_MANUALLY = "VALID_MANUALLY",
@@ -0,0 +1,48 @@
+import {
+  InconsistentPolygonData,
+  MultiFarmInconsistencyData,
+  OverlapData,
+} from "@/interfaces/PolygonValidation";
+
+/**
+ * Checks whether an inconsistency involves several farms sharing a region
+ * (overlaps, overlap clusters and duplicate polygons).
+ *
+ * @param item - The inconsistency to check
+ * @returns True if the inconsistency is shown with the region its farms share
+ */
+export const isMultiFarmInconsistency = (
+  item: InconsistentPolygonData
+): item is MultiFarmInconsistencyData =>
+  item.type === "overlap" ||
+  item.type === "overlap_cluster" ||
+  item.type === "duplicate_polygon";
+
+/**
+ * Returns the overlap percentage displayed for a multi-farm inconsistency:
+ * the percentage of an overlap, the highest share of the farms of a cluster,
+ * and 100% for duplicate polygons.
+ *
+ * @param item - The inconsistency
+ * @returns The overlap percentage, between 0 and 1
+ */
+export const getInconsistencyOverlapPercentage = (
+  item: MultiFarmInconsistencyData
+): number => {
+  if (item.type === "overlap") return item.data.percentage;
+  if (item.type === "overlap_cluster")
+    return Math.max(...item.data.percentages);
+  return 1;
+};
+
+/**
+ * Returns the criticality of a multi-farm inconsistency. Duplicate polygons
+ * overlap completely, so they are always highly critical.
+ *
+ * @param item - The inconsistency
+ * @returns The criticality of the inconsistency
+ */
+export const getInconsistencyCriticality = (
+  item: MultiFarmInconsistencyData
+): OverlapData["criticality"] =>
+  item.type === "duplicate_polygon" ? "HIGH" : item.data.criticality;